@@ -1,7 +1,7 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from io import StringIO
+from io import BytesIO, StringIO
 
 st.set_page_config(page_title="🎯 RFM Clustering App", layout="centered", page_icon="📊")
 
@@ -13,6 +13,16 @@ st.markdown("<h2 style='text-align:center; color:#4B8BBE;'>📊 RFM Customer Seg
 st.markdown("<p style='text-align:center; color:gray;'>Phân loại khách hàng dựa trên chỉ số Recency, Frequency, và Monetary.</p>", unsafe_allow_html=True)
 st.markdown("---")
 
+show_diag = st.sidebar.checkbox("🩺 Hiển thị chẩn đoán hiệu năng", value=False)
+
+# Model of the selected store, re-checked on every rerun (changed artifact files are reloaded)
+stores = list_stores()
+store = st.sidebar.selectbox("🏬 Cửa hàng / khu vực", stores) if len(stores) > 1 else DEFAULT_STORE
+model_set = load_model_set_cached(store)
+scorer = model_set.scorer
+cluster_labels = model_set.labels
+model_version = model_set.version
+
 # Allows users to choose between manual input and file upload
 mode = st.radio("Chọn chế độ nhập", ("Nhập thủ công RFM", "Tải file dữ liệu giao dịch"))
 
@@ -38,14 +48,13 @@ if mode == "Nhập thủ công RFM":
     if submitted:
         with st.spinner("🔍 Đang phân tích dữ liệu..."):
             new_customer = pd.DataFrame([[recency, frequency, monetary]], columns=['Recency', 'Frequency', 'Monetary'])
-            X_new = prepare_rfm_features(new_customer)
-            X_scaled = scaler.transform(X_new)
-            cluster = model.predict(X_scaled)[0]
+            X_new = prepare_rfm_features(new_customer, model_set)
+            cell = scorer.cell_index(new_customer)[0]
+            cluster = scorer.cluster_table[cell]
 
             # ==== Tính xác suất gần đúng dựa trên khoảng cách đến tâm cụm ====
-            distances = np.linalg.norm(model.cluster_centers_ - X_scaled, axis=1)
-            inv_distances = 1 / (distances + 1e-6)  # tránh chia cho 0
-            probabilities = inv_distances / inv_distances.sum()
+            # (precomputed for each of the 64 (R, F, M) cells, see lib/scoring.py)
+            probabilities = scorer.proba_table[cell]
 
             
 
@@ -90,27 +99,72 @@ else:
     st.markdown("### 📁 Tải lên file dữ liệu giao dịch")
     expected_columns = {'CustomerID', 'InvoiceDate', 'TotalSales'}
     uploaded_file = st.file_uploader("📁 Tải lên file dữ liệu (.csv)", type=["csv"])
+    streaming = st.checkbox("💾 Đọc file theo từng khối (tiết kiệm bộ nhớ cho file lớn)", value=False)
+    compact = st.checkbox("🗜️ Kiểu dữ liệu gọn (int32/float32/int8, giảm bộ nhớ)", value=False)
+    probabilities = st.checkbox("📊 Thêm xác suất thuộc từng cụm (Confidence / Margin)", value=False)
     
     if uploaded_file is not None:
         try:
-            df = pd.read_csv(uploaded_file)
-            if not expected_columns.issubset(df.columns):
+            raw_bytes = uploaded_file.getvalue()
+            columns = pd.read_csv(BytesIO(raw_bytes), nrows=0).columns
+            if not expected_columns.issubset(columns):
                 st.warning(f"⚠️ File phải chứa các cột: {expected_columns}")
             else:
                 st.success("✅ Dữ liệu đã được tải thành công!")
-                segmentor = CustomerSegmentation()
                 visualizer = SegmentationVisualizer()
-                rfm_df = segmentor.segment_customers(df)
-                if rfm_df is not None and not rfm_df.empty:
-                    visualizer.show_summary_info(rfm_df)
-                    cluster_summary = segmentor.summarize_clusters(rfm_df)
-                    if not cluster_summary.empty:
-                        visualizer.plot_rfm_bar(cluster_summary)
-                        visualizer.plot_cluster_scatter(rfm_df)
-                        visualizer.show_cluster_summary(rfm_df)
-                        visualizer.suggest_actions(cluster_summary, cluster_labels)
-                    
-                    visualizer.show_cluster_table(rfm_df)
+                content_hash = hash_bytes(raw_bytes)
+                # Segmentation runs as a shared background job; reruns from widget
+                # interactions pick up the same job (and its result) instead of re-scoring
+                job = submit_segmentation(content_hash, model_set, raw_bytes, streaming, compact,
+                                          probabilities)
+                if not job.finished:
+                    show_job_progress(job)
+                elif job.state == CANCELLED:
+                    st.warning("⛔ Đã hủy xử lý file.")
+                    if st.button("🔁 Chạy lại"):
+                        submit_segmentation(content_hash, model_set, raw_bytes, streaming, compact,
+                                            probabilities, retry=True)
+                        st.rerun()
+                elif job.state == FAILED:
+                    st.error(f"❌ Lỗi phân tích dữ liệu: {job.error}")
+                else:
+                    result = job.result
+                    rfm_df = result["rfm"]
+                    clean_report = result.get("clean_report") or {}
+                    if clean_report.get("invalid_dates"):
+                        st.warning(f"⚠️ {clean_report['invalid_dates']:,} dòng có InvoiceDate không hợp lệ hoặc bị trống đã bị loại bỏ.")
+                    with recording() as render_recorder:
+                        if rfm_df is not None and not rfm_df.empty:
+                            # Cards, charts and the summary table all render from the cached ClusterStats
+                            stats = result["stats"]
+                            visualizer.show_summary_info(stats)
+                            cluster_summary = result["summary"]
+                            if not cluster_summary.empty:
+                                visualizer.plot_rfm_bar(stats)
+                                visualizer.plot_cluster_scatter(rfm_df)
+                                visualizer.show_cluster_summary(stats)
+                                visualizer.suggest_actions(stats, cluster_labels)
+                                if not result["clean"].empty:
+                                    # Month-end snapshots run as their own background job
+                                    snapshot_job = submit_snapshots(content_hash, model_set, result["clean"])
+                                    if not snapshot_job.finished:
+                                        show_job_progress(snapshot_job)
+                                    elif snapshot_job.state == CANCELLED:
+                                        if st.button("🔁 Tính lại RFM theo tháng"):
+                                            submit_snapshots(content_hash, model_set, result["clean"], retry=True)
+                                            st.rerun()
+                                    elif snapshot_job.state == FAILED:
+                                        st.error(f"❌ Lỗi tính RFM theo tháng: {snapshot_job.error}")
+                                    else:
+                                        visualizer.show_cluster_migration(snapshot_job.result, model_set.segments)
+
+                            visualizer.show_cluster_table(rfm_df, result.get("index"))
+                            visualizer.show_export(rfm_df, f"rfm_segments_{content_hash[:12]}")
+                    render_recorder.log(upload=content_hash[:12], model_version=model_version)
+                    if show_diag:
+                        show_diagnostics(result["diagnostics"], render_recorder.records, model_version=model_version)
+        except JobQueueFull:
+            st.warning("⏳ Máy chủ đang bận xử lý nhiều file, vui lòng thử lại sau ít phút.")
         except Exception as e:
             st.error(f"❌ Đã xảy ra lỗi khi đọc file: {e}")
     else:
@@ -0,0 +1,257 @@
+"""
+Per-stage pipeline benchmark on synthetic transactions.
+
+    python -m benchmarks.bench_pipeline --sizes 10000 100000 1000000 -o bench.json
+    python -m benchmarks.bench_pipeline --sizes 50000000 --no-visualizer --data-dir /data/bench
+    python -m benchmarks.bench_pipeline --sizes 10000000 --no-visualizer --compact
+
+Each size is generated with ``benchmarks.synthetic.TransactionGenerator`` and every
+stage is timed separately (best of ``--repeat`` runs, without any tracing). Memory is
+measured in one more, untimed run of each stage under tracemalloc (``--no-memory``
+skips it), so the reported times never include tracing overhead.
+
+Sizes below ``--stream-from`` rows are generated in memory; a final
+``segment_customers`` record runs clean -> RFM -> clusters end to end, so its peak
+is the working-set cost of the whole in-memory pipeline. Larger sizes are written
+to a CSV with ``TransactionGenerator.write_csv`` (kept in ``--data-dir`` for reuse,
+else a temporary directory) and read back by ``calculate_rfm_streaming``, so neither
+the generator nor the pipeline holds all transactions; the peaks then measure the
+pipeline, not the generator. Compare runs with and without ``--compact`` (low-memory
+dtypes). Results are written as one JSON document (``-o``) and/or appended as JSON
+lines (``--jsonl``) so runs can be compared across commits.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import TransactionGenerator
+from lib.core import SegmentationCore
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+STREAM_FROM_ROWS = 5_000_000
+MAX_VISUAL_CUSTOMERS = 1_000_000
+
+
+def _max_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def time_stage(name, func, repeat, rows_in=None, trace_memory=True):
+    """
+    Run ``func`` ``repeat`` times and keep the fastest wall time, then (with
+    ``trace_memory``) once more under tracemalloc for the peak; that run is not timed.
+
+    Returns:
+        tuple: (stage record dict, result of the last timed run)
+    """
+    best = float("inf")
+    peak = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    record = {
+        "stage": name,
+        "seconds": round(best, 6),
+        "rows_in": rows_in,
+        "rows_out": len(result) if hasattr(result, "__len__") else None,
+        "peak_mb": round(peak / (1024 * 1024), 3) if peak is not None else None,
+        "max_rss_mb": round(_max_rss_mb(), 1),
+    }
+    if rows_in:
+        record["rows_per_s"] = round(rows_in / best) if best > 0 else None
+    return record, result
+
+
+def visualizer_stages(rfm_df, stats, repeat):
+    """
+    Time the SegmentationVisualizer methods in Streamlit bare mode (figures are built, not shown).
+    Summary cards, RFM bars and the segments table render from the shared ClusterStats.
+    """
+    from streamlit import logger as st_logger
+
+    from lib.mylib import SegmentationVisualizer
+
+    # Bare mode logs a warning on every st.* call; keep the benchmark output readable
+    st_logger.set_log_level("error")
+
+    visualizer = SegmentationVisualizer()
+    calls = {
+        "visualizer.show_summary_info": lambda: visualizer.show_summary_info(stats),
+        "visualizer.plot_rfm_bar": lambda: visualizer.plot_rfm_bar(stats),
+        "visualizer.plot_cluster_scatter": lambda: visualizer.plot_cluster_scatter(rfm_df),
+        "visualizer.show_cluster_summary": lambda: visualizer.show_cluster_summary(stats),
+    }
+    records = []
+    for name, call in calls.items():
+        record, _ = time_stage(name, call, repeat, rows_in=len(rfm_df), trace_memory=False)
+        records.append(record)
+    return records
+
+
+def model_stages(core, rfm_df, repeat, trace_memory=True):
+    """
+    Time the per-customer stages after RFM: binning, scale + predict, clusters, summaries.
+
+    Returns:
+        tuple: (stage records, scored rfm_df, ClusterStats)
+    """
+    records = []
+    record, X_RFM = time_stage("prepare_rfm_features",
+                               lambda: core.prepare_rfm_features(rfm_df, core.r_bins, core.f_bins,
+                                                                 core.m_bins),
+                               repeat, len(rfm_df), trace_memory)
+    records.append(record)
+    record, _ = time_stage("scale_predict",
+                           lambda: core.model.predict(core.scaler.transform(X_RFM.to_numpy(np.float64))),
+                           repeat, len(X_RFM), trace_memory)
+    records.append(record)
+    record, rfm_df = time_stage("assign_clusters", lambda: core.assign_clusters(rfm_df), repeat,
+                                len(rfm_df), trace_memory)
+    records.append(record)
+    record, _ = time_stage("summarize_clusters", lambda: core.summarize_clusters(rfm_df),
+                           repeat, len(rfm_df), trace_memory)
+    records.append(record)
+    record, stats = time_stage("cluster_stats", lambda: core.cluster_stats(rfm_df), repeat, len(rfm_df),
+                               trace_memory)
+    record["rows_out"] = stats.n_clusters
+    records.append(record)
+    return records, rfm_df, stats
+
+
+def synthetic_csv(generator, n_rows, data_dir):
+    """
+    Path of the synthetic CSV for ``n_rows``, written chunk by chunk if not there yet.
+    """
+    path = os.path.join(data_dir, f"synthetic_seed{generator.seed}_{n_rows}.csv")
+    if not os.path.exists(path):
+        generator.write_csv(f"{path}.tmp", n_rows)
+        os.replace(f"{path}.tmp", path)
+    return path
+
+
+def run_size(generator, core, n_rows, repeat=1, visualizer=True, trace_memory=True,
+             stream_from=STREAM_FROM_ROWS, data_dir=None):
+    records = []
+    if n_rows >= stream_from:
+        temporary = data_dir is None
+        data_dir = data_dir or tempfile.mkdtemp(prefix="rfm_bench_")
+        try:
+            path = synthetic_csv(generator, n_rows, data_dir)
+            record, rfm_df = time_stage("calculate_rfm_streaming",
+                                        lambda: core.calculate_rfm_streaming(path), repeat, n_rows,
+                                        trace_memory)
+            records.append(record)
+        finally:
+            if temporary:
+                shutil.rmtree(data_dir, ignore_errors=True)
+        stage_records, rfm_df, stats = model_stages(core, rfm_df, repeat, trace_memory)
+        records.extend(stage_records)
+    else:
+        raw = generator.generate(n_rows)
+        record, df_clean = time_stage("clean_data", lambda: core.clean_data(raw.copy()), repeat,
+                                      len(raw), trace_memory)
+        records.append(record)
+        record, rfm_df = time_stage("calculate_rfm", lambda: core.calculate_rfm(df_clean), repeat,
+                                    len(df_clean), trace_memory)
+        records.append(record)
+        stage_records, rfm_df, stats = model_stages(core, rfm_df, repeat, trace_memory)
+        records.extend(stage_records)
+        record, _ = time_stage("segment_customers", lambda: core.segment_customers(raw.copy()), 1,
+                               len(raw), trace_memory)
+        records.append(record)
+
+    if visualizer and len(rfm_df) <= MAX_VISUAL_CUSTOMERS:
+        records.extend(visualizer_stages(rfm_df, stats, repeat))
+
+    for record in records:
+        record["size"] = n_rows
+        record["customers"] = len(rfm_df)
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_pipeline")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-visualizer", action="store_true")
+    parser.add_argument("--compact", action="store_true", help="Low-memory dtypes")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="Skip the untimed tracemalloc run of every stage")
+    parser.add_argument("--stream-from", type=int, default=STREAM_FROM_ROWS,
+                        help="Sizes from this many rows are written to CSV and streamed")
+    parser.add_argument("--data-dir", help="Keep (and reuse) the synthetic CSVs here")
+    parser.add_argument("-o", "--output", help="Write all results as one JSON document")
+    parser.add_argument("--jsonl", help="Append one JSON line per stage")
+    args = parser.parse_args(argv)
+
+    generator = TransactionGenerator(seed=args.seed)
+    core = SegmentationCore.from_paths(compact=args.compact)
+    meta = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "model": type(core.model).__name__,
+        "compact": args.compact,
+        "memory_pass": not args.no_memory,
+        "stream_from": args.stream_from,
+    }
+
+    results = []
+    for n_rows in args.sizes:
+        records = run_size(generator, core, n_rows, args.repeat, visualizer=not args.no_visualizer,
+                           trace_memory=not args.no_memory, stream_from=args.stream_from,
+                           data_dir=args.data_dir)
+        for record in records:
+            print(f"{n_rows:>11,} {record['stage']:<34} {record['seconds']:>10.4f}s "
+                  f"peak {record['peak_mb'] if record['peak_mb'] is not None else '-':>9} MB")
+        results.extend(records)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+    if args.jsonl:
+        with open(args.jsonl, "a", encoding="utf-8") as f:
+            for record in results:
+                f.write(json.dumps({**meta, **record}) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+
+from lib.reference_data import REFERENCE_CSV_PATH, REFERENCE_PATH, load_reference_data, load_reference_rows
+
+
+# ------------------------------
+# Synthetic transactions shaped like data/rfm_data.csv, in the upload schema
+# (CustomerID, InvoiceDate, TotalSales).
+# ------------------------------
+DEFAULT_CHUNK_ROWS = 1_000_000
+
+
+class TransactionGenerator:
+    """
+    Bootstrap generator fitted on the reference dataset.
+
+    Sales amounts and invoice dates are resampled from the reference rows without
+    exact duplicates (``load_reference_rows``). Customers get a purchase weight drawn
+    from the reference per-member transaction counts, and the number of customers
+    grows with the row count so transactions per customer stays close to the
+    reference (about 10). A share of rows is re-emitted as exact duplicates, matching
+    the ~0.6% of reference rows that duplicate another row on every column.
+
+    Args:
+        reference_path (str): Columnar reference file (``lib.reference_data``).
+        csv_path (str): Reference CSV, the fallback when the columnar file is stale.
+        seed (int): Random seed; the same seed and size give the same data.
+        duplicate_rate (float, optional): Defaults to the reference duplicate share.
+    """
+
+    def __init__(self, reference_path=REFERENCE_PATH, seed=0, duplicate_rate=None,
+                 csv_path=REFERENCE_CSV_PATH):
+        ref = load_reference_rows(['Member_number', 'Date', 'Total_Revenue'], reference_path,
+                                  csv_path)
+        self.seed = seed
+        self.sales = ref['Total_Revenue'].to_numpy()
+        self.dates = ref['Date'].dt.strftime('%Y-%m-%d').to_numpy(dtype=object)
+        counts = ref.groupby('Member_number').size().to_numpy()
+        self.tx_per_customer = counts.mean()
+        self.customer_counts = counts
+        if duplicate_rate is None:
+            # Duplicates on full rows, not on the three projected columns
+            n_rows = len(load_reference_data(['Member_number'], reference_path, csv_path))
+            duplicate_rate = 1 - len(ref) / n_rows
+        self.duplicate_rate = duplicate_rate
+
+    def n_customers(self, n_rows):
+        return max(1, int(round(n_rows / self.tx_per_customer)))
+
+    def iter_chunks(self, n_rows, chunk_rows=DEFAULT_CHUNK_ROWS):
+        """
+        Yield DataFrames of at most ``chunk_rows`` rows, ``n_rows`` in total.
+
+        InvoiceDate is emitted as ``YYYY-MM-DD`` text, as it arrives from a CSV upload.
+        """
+        rng = np.random.default_rng(self.seed)
+        n_customers = self.n_customers(n_rows)
+        weights = rng.choice(self.customer_counts, n_customers).astype(np.float64)
+        cdf = np.cumsum(weights / weights.sum())
+        emitted = 0
+        while emitted < n_rows:
+            size = min(chunk_rows, n_rows - emitted)
+            n_dup = int(size * self.duplicate_rate)
+            n_new = size - n_dup
+            customer_idx = np.minimum(np.searchsorted(cdf, rng.random(n_new)), n_customers - 1)
+            chunk = pd.DataFrame({
+                'CustomerID': customer_idx + 1000,
+                'InvoiceDate': self.dates[rng.integers(0, len(self.dates), n_new)],
+                'TotalSales': self.sales[rng.integers(0, len(self.sales), n_new)],
+            })
+            if n_dup:
+                dups = chunk.iloc[rng.integers(0, n_new, n_dup)]
+                chunk = pd.concat([chunk, dups], ignore_index=True)
+            emitted += size
+            yield chunk
+
+    def generate(self, n_rows, chunk_rows=DEFAULT_CHUNK_ROWS):
+        return pd.concat(self.iter_chunks(n_rows, chunk_rows), ignore_index=True)
+
+    def write_csv(self, path, n_rows, chunk_rows=DEFAULT_CHUNK_ROWS):
+        """
+        Stream ``n_rows`` to a CSV without holding them all in memory.
+        """
+        for i, chunk in enumerate(self.iter_chunks(n_rows, chunk_rows)):
+            chunk.to_csv(path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+        return path
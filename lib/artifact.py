@@ -0,0 +1,109 @@
+import hashlib
+import os
+
+import numpy as np
+
+
+# ------------------------------
+# Compact model artifact: KMeans centers, scaler mean/scale and RFM bins in one small
+# uncompressed .npz, loadable with numpy alone (no scikit-learn import at inference).
+# ------------------------------
+ARTIFACT_PATH = "models/rfm_model.npz"
+
+
+class CentroidModel:
+    """
+    Nearest-center predictor holding only ``cluster_centers_`` (KMeans.predict equivalent).
+    """
+
+    def __init__(self, cluster_centers):
+        self.cluster_centers_ = np.asarray(cluster_centers, dtype=np.float64)
+
+    @property
+    def n_clusters(self):
+        return len(self.cluster_centers_)
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        distances = ((X[:, None, :] - self.cluster_centers_[None, :, :]) ** 2).sum(axis=2)
+        return distances.argmin(axis=1).astype(np.int32)
+
+
+class AffineScaler:
+    """
+    ``(X - mean_) / scale_``, the StandardScaler.transform equivalent.
+    """
+
+    def __init__(self, mean, scale):
+        self.mean_ = np.asarray(mean, dtype=np.float64)
+        self.scale_ = np.asarray(scale, dtype=np.float64)
+
+    def transform(self, X):
+        X = np.array(X, dtype=np.float64)
+        X -= self.mean_
+        X /= self.scale_
+        return X
+
+
+def _content_version(arrays):
+    digest = hashlib.sha256()
+    for name in sorted(arrays):
+        digest.update(name.encode())
+        digest.update(np.ascontiguousarray(arrays[name]).tobytes())
+    return digest.hexdigest()[:12]
+
+
+def export_artifact(model, scaler, bins, path=ARTIFACT_PATH, source_version=""):
+    """
+    Write the compact artifact for a fitted KMeans / StandardScaler / bins set.
+
+    Labels of the compact predictor are checked against ``model.predict`` on all 64
+    (R, F, M) cells, the only inputs inference ever sees, before anything is written.
+
+    Args:
+        model: Fitted KMeans model.
+        scaler: Fitted StandardScaler.
+        bins (dict): ``r_bins``, ``f_bins``, ``m_bins``.
+        path (str): Output ``.npz`` path.
+        source_version (str): Version of the pickles this was exported from.
+
+    Returns:
+        str: Content version of the written artifact.
+    """
+    arrays = {
+        "cluster_centers": np.asarray(model.cluster_centers_, dtype=np.float64),
+        "scaler_mean": np.asarray(scaler.mean_, dtype=np.float64),
+        "scaler_scale": np.asarray(scaler.scale_, dtype=np.float64),
+        "r_bins": np.asarray(bins["r_bins"], dtype=np.float64),
+        "f_bins": np.asarray(bins["f_bins"], dtype=np.float64),
+        "m_bins": np.asarray(bins["m_bins"], dtype=np.float64),
+    }
+    grid = np.array([(r, f, m) for r in range(1, 5) for f in range(1, 5) for m in range(1, 5)],
+                    dtype=np.float64)
+    compact = CentroidModel(arrays["cluster_centers"])
+    grid_scaled = AffineScaler(arrays["scaler_mean"], arrays["scaler_scale"]).transform(grid)
+    if not np.array_equal(compact.predict(grid_scaled), model.predict(scaler.transform(grid))):
+        raise ValueError("Compact predictor disagrees with the fitted model on the RFM grid.")
+
+    version = _content_version(arrays)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp.npz"
+    np.savez(tmp_path, version=np.array(version), source_version=np.array(source_version), **arrays)
+    os.replace(tmp_path, path)
+    return version
+
+
+def load_artifact(path=ARTIFACT_PATH):
+    """
+    Load the compact artifact.
+
+    Returns:
+        tuple: (model, scaler, bins, meta) - ``CentroidModel``, ``AffineScaler``, the bins
+        dict and ``{"version", "source_version"}``.
+    """
+    with np.load(path) as data:
+        model = CentroidModel(data["cluster_centers"])
+        scaler = AffineScaler(data["scaler_mean"], data["scaler_scale"])
+        bins = {"r_bins": data["r_bins"], "f_bins": data["f_bins"], "m_bins": data["m_bins"]}
+        meta = {"version": str(data["version"]), "source_version": str(data["source_version"])}
+    return model, scaler, bins, meta
@@ -0,0 +1,533 @@
+"""
+Headless batch scoring, no Streamlit runtime required.
+
+    python -m lib.cli score data/exports/ extra.csv -o segments.parquet --workers 8 [--proba]
+    python -m lib.cli score chain/*.csv -o segments.csv --store-column Store
+    python -m lib.cli append today.csv --state data/rfm_state.npz
+    python -m lib.cli snapshots transactions.csv -o segments_by_month.csv --migrations moves.csv
+    python -m lib.cli export-artifact
+    python -m lib.cli train --k-min 2 --k-max 10 --workers 4 [--minibatch] [--promote] [--store north]
+    python -m lib.cli bins data/exports/ --workers 8 -o models/rfm_bins.pkl --compare
+    python -m lib.cli convert-reference
+
+``score`` runs clean -> RFM -> features -> predict across a process pool:
+
+1. Every input CSV is split into byte ranges on line boundaries (quoted fields must
+   not contain newlines). Each worker parses and cleans one range and spills the
+   rows to ``n_partitions`` files chosen by a hash of CustomerID.
+2. Each worker then takes one partition, drops duplicate rows (all rows of a
+   customer land in the same partition, so this matches ``drop_duplicates`` on the
+   whole input), aggregates RFM against the global latest InvoiceDate and predicts.
+3. The scored partitions are concatenated, sorted by CustomerID and written in
+   row-group chunks as CSV, gzip CSV or Parquet (``lib.export``, by extension).
+
+With ``--store-column`` customers are aggregated per (store, CustomerID) and each
+one is scored by its store's model set (``lib.registry``, ``models/stores/<store>/``).
+
+``bins`` runs the same two phases but each partition only updates a mergeable
+quantile sketch (``lib.sketch``) of its customers' R/F/M; the parent merges the
+sketches into new quartile bins, so no process ever holds all customers.
+"""
+import argparse
+import glob
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from lib.artifact import ARTIFACT_PATH, export_artifact
+from lib.core import (BINS_PATH, CLUSTER_MAP, MODEL_PATH, SCALER_PATH, SegmentationCore, artifact_version,
+                      load_artifacts, load_cluster_labels, segment_map)
+from lib.export import export_path
+from lib.reference_data import (REFERENCE_CSV_PATH, REFERENCE_PATH, convert_reference_data,
+                                 load_reference_rows, reference_transactions)
+from lib.registry import STORES_DIR, VERSIONS_DIRNAME, ModelRegistry
+from lib.rfm import aggregate_rfm, clean_transactions, sample_date_format
+from lib.sketch import DEFAULT_K, RFMBinSketch, compare_bins
+from lib.state_store import DEFAULT_STATE_PATH, RFMStateStore
+
+DEFAULT_SPLIT_BYTES = 64 * 1024 * 1024
+KEY_COLUMNS = ('CustomerID', 'InvoiceDate', 'TotalSales')
+
+
+# ------------------------------
+# Input planning: files/directories -> byte ranges
+# ------------------------------
+def expand_inputs(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.csv"))))
+        else:
+            files.append(path)
+    return files
+
+
+def plan_ranges(files, split_bytes=DEFAULT_SPLIT_BYTES):
+    ranges = []
+    for path in files:
+        size = os.path.getsize(path)
+        for start in range(0, max(size, 1), split_bytes):
+            ranges.append((path, start, min(start + split_bytes, size)))
+    return ranges
+
+
+def read_header(path):
+    return pd.read_csv(path, nrows=0).columns.tolist()
+
+
+def read_range(path, start, end, header):
+    """
+    Parse the lines of ``path`` whose first byte lies in ``[start, end)``.
+
+    Non-key columns are read as text so duplicate detection sees the same values
+    regardless of which range a row came from.
+    """
+    with open(path, "rb") as f:
+        if start == 0:
+            f.readline()  # header
+        else:
+            f.seek(start - 1)
+            f.readline()  # finish the line that straddles ``start``
+        pos = f.tell()
+        if pos >= end:
+            data = b""
+        else:
+            data = f.read(end - pos)
+            if data and not data.endswith(b"\n"):
+                data += f.readline()
+    if not data.strip():
+        return pd.DataFrame(columns=header)
+    text_columns = {c: str for c in header if c not in ('CustomerID', 'TotalSales')}
+    return pd.read_csv(BytesIO(data), header=None, names=header, dtype=text_columns)
+
+
+# ------------------------------
+# Worker tasks
+# ------------------------------
+_core = None
+_registry = None
+
+
+def default_segments(model_path=MODEL_PATH, stores_dir=STORES_DIR):
+    """
+    Segment names of the default store (its labels file), as ``ModelRegistry`` uses them.
+    """
+    registry = ModelRegistry(models_dir=os.path.dirname(model_path) or ".", stores_dir=stores_dir)
+    labels_path = registry.paths()["labels"]
+    return segment_map(load_cluster_labels(labels_path)) if os.path.exists(labels_path) else CLUSTER_MAP
+
+
+def _init_worker(model_path, scaler_path, bins_path, stores_dir=STORES_DIR):
+    global _core, _registry
+    _registry = ModelRegistry(models_dir=os.path.dirname(model_path) or ".", stores_dir=stores_dir)
+    _core = SegmentationCore.from_paths(model_path, scaler_path, bins_path,
+                                        segments=default_segments(model_path, stores_dir))
+
+
+def _partition_range(task):
+    path, start, end, header, date_format, n_partitions, spill_dir, task_id = task
+    df = read_range(path, start, end, header)
+    rows_in = len(df)
+    df = clean_transactions(df, drop_duplicates=False, date_format=date_format)
+    if df.empty:
+        return rows_in, 0, None
+    part = pd.util.hash_array(df['CustomerID'].to_numpy()) % np.uint64(n_partitions)
+    for p in np.unique(part):
+        df[part == p].to_pickle(os.path.join(spill_dir, f"p{int(p)}_r{task_id}.pkl"))
+    return rows_in, len(df), df['InvoiceDate'].max()
+
+
+def _partition_rfm(spill_dir, p, reference_date, store_column=None):
+    parts = sorted(glob.glob(os.path.join(spill_dir, f"p{p}_r*.pkl")))
+    if not parts:
+        return pd.DataFrame()
+    df = pd.concat([pd.read_pickle(f) for f in parts], ignore_index=True).drop_duplicates()
+    if store_column is None:
+        return aggregate_rfm(df, reference_date)
+    frames = []
+    for store, store_df in df.groupby(store_column, dropna=False, sort=True):
+        store_rfm = aggregate_rfm(store_df, reference_date)
+        store_rfm.insert(0, store_column, store)
+        frames.append(store_rfm)
+    return pd.concat(frames, ignore_index=True)
+
+
+def _score_partition(task):
+    spill_dir, p, reference_date, probabilities, store_column = task
+    rfm_df = _partition_rfm(spill_dir, p, reference_date, store_column)
+    if rfm_df.empty:
+        return rfm_df
+    if store_column is not None:
+        return _registry.assign_clusters(rfm_df, store_column)
+    rfm_df = _core.assign_clusters(rfm_df)
+    return _core.cluster_probabilities(rfm_df) if probabilities else rfm_df
+
+
+def _sketch_partition(task):
+    spill_dir, p, reference_date, k, keep_rfm = task
+    rfm_df = _partition_rfm(spill_dir, p, reference_date)
+    sketch = RFMBinSketch(k, seed=p)
+    if not rfm_df.empty:
+        sketch.update(rfm_df)
+    return sketch, (rfm_df[['Recency', 'Frequency', 'Monetary']] if keep_rfm else None)
+
+
+# ------------------------------
+# Batch scoring
+# ------------------------------
+def _input_headers(paths):
+    files = expand_inputs(paths)
+    if not files:
+        raise ValueError("No input CSV files found.")
+    headers = {path: read_header(path) for path in files}
+    for path, header in headers.items():
+        missing = set(KEY_COLUMNS) - set(header)
+        if missing:
+            raise ValueError(f"{path}: missing columns {sorted(missing)}")
+    return headers
+
+
+def _spill_partitions(pool, headers, n_partitions, spill_dir, split_bytes):
+    """
+    Map phase: clean every input range and spill it by CustomerID partition.
+
+    The date format of each file is detected once, from lines sampled over the whole
+    file, and passed to all of its ranges; a range of a date-sorted file may hold
+    only ambiguous days (<= 12) and would otherwise be parsed month-first.
+
+    Returns:
+        pd.Timestamp | None: Latest InvoiceDate of all inputs (None if no valid rows).
+    """
+    date_formats = {path: sample_date_format(path) for path in headers}
+    tasks = [(path, start, end, headers[path], date_formats[path], n_partitions, spill_dir, i)
+             for i, (path, start, end) in enumerate(plan_ranges(list(headers), split_bytes))]
+    stats = list(pool.map(_partition_range, tasks))
+    latest = [s[2] for s in stats if s[2] is not None]
+    return max(latest) if latest else None
+
+
+def score_files(paths, workers=None, n_partitions=None, split_bytes=DEFAULT_SPLIT_BYTES,
+                probabilities=False, store_column=None, stores_dir=STORES_DIR,
+                model_path=MODEL_PATH, scaler_path=SCALER_PATH, bins_path=BINS_PATH):
+    """
+    Score transaction CSVs in parallel.
+
+    Args:
+        paths (list[str]): CSV files and/or directories of CSV files.
+        workers (int, optional): Worker processes (default: CPU count).
+        n_partitions (int, optional): CustomerID hash partitions (default: 4 x workers).
+        split_bytes (int): Target size of one input range.
+        probabilities (bool): Also output P_<Segment> membership probabilities,
+            Confidence and Margin (see ``SegmentationCore.cluster_probabilities``).
+        store_column (str, optional): Column naming the store of each transaction;
+            customers are then aggregated per store and scored by that store's model
+            set under ``stores_dir`` (empty values use the default models).
+
+    Returns:
+        pd.DataFrame: CustomerID, Recency, Frequency, Monetary, Cluster, Segment
+        (plus ``store_column`` first when given).
+    """
+    if store_column is not None and probabilities:
+        raise ValueError("Probabilities are not available with --store-column.")
+    headers = _input_headers(paths)
+    if store_column is not None and any(store_column not in header for header in headers.values()):
+        raise ValueError(f"Column '{store_column}' is missing from an input file.")
+    workers = workers or os.cpu_count() or 1
+    n_partitions = n_partitions or 4 * workers
+    spill_dir = tempfile.mkdtemp(prefix="rfm_spill_")
+    try:
+        # spawn, not fork: forking a parent that already ran sklearn/OpenMP can deadlock
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker,
+                                 initargs=(model_path, scaler_path, bins_path, stores_dir)) as pool:
+            reference_date = _spill_partitions(pool, headers, n_partitions, spill_dir, split_bytes)
+            if reference_date is None:
+                return pd.DataFrame()
+            scored = list(pool.map(_score_partition,
+                                   [(spill_dir, p, reference_date, probabilities, store_column)
+                                    for p in range(n_partitions)]))
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+    scored = [df for df in scored if not df.empty]
+    order = ['CustomerID'] if store_column is None else [store_column, 'CustomerID']
+    rfm_df = pd.concat(scored, ignore_index=True).sort_values(order, ignore_index=True)
+    return rfm_df
+
+
+def sketch_files(paths=(), k=DEFAULT_K, workers=None, n_partitions=None,
+                 split_bytes=DEFAULT_SPLIT_BYTES, compare=False):
+    """
+    Quartile bins of the customers in ``paths`` (or the reference data) from merged sketches.
+
+    Transactions are partitioned by CustomerID as in ``score_files``; every partition
+    aggregates its customers' RFM and returns only an ``RFMBinSketch`` (about
+    ``3 * k`` values per column), so memory stays bounded by one partition.
+
+    Args:
+        k (int): Sketch size; see ``lib.sketch.normalized_rank_error`` for the bound.
+        compare (bool): Also collect every customer's RFM and compare the sketched
+            edges with exact ``np.quantile`` edges (needs memory for all customers).
+
+    Returns:
+        tuple: (RFMBinSketch, comparison DataFrame or None)
+    """
+    if not paths:
+        rfm_df = training_rfm()
+        sketch = RFMBinSketch(k, seed=0).update(rfm_df)
+        return sketch, compare_bins(sketch.bins(), rfm_df) if compare else None
+
+    headers = _input_headers(paths)
+    workers = workers or os.cpu_count() or 1
+    n_partitions = n_partitions or 4 * workers
+    spill_dir = tempfile.mkdtemp(prefix="rfm_spill_")
+    try:
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            reference_date = _spill_partitions(pool, headers, n_partitions, spill_dir, split_bytes)
+            if reference_date is None:
+                raise ValueError("No valid transactions in the input files.")
+            results = list(pool.map(_sketch_partition,
+                                    [(spill_dir, p, reference_date, k, compare)
+                                     for p in range(n_partitions)]))
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+    sketch = RFMBinSketch(k)
+    for partition_sketch, _ in results:
+        sketch.merge(partition_sketch)
+    if not compare:
+        return sketch, None
+    rfm_df = pd.concat([rfm for _, rfm in results if rfm is not None and not rfm.empty],
+                       ignore_index=True)
+    return sketch, compare_bins(sketch.bins(), rfm_df)
+
+
+def append_files(paths, state_path=DEFAULT_STATE_PATH, model_path=MODEL_PATH,
+                 scaler_path=SCALER_PATH, bins_path=BINS_PATH):
+    """
+    Merge new transaction files into the persisted RFM state and re-score changed customers.
+
+    Returns:
+        tuple: (store, customers_changed, customers_rescored)
+    """
+    store = RFMStateStore.load(state_path)
+    changed = 0
+    for path in expand_inputs(paths):
+        changed += store.merge(clean_transactions(pd.read_csv(path)))
+    rescored = store.rescore(SegmentationCore.from_paths(model_path, scaler_path, bins_path))
+    store.save()
+    return store, changed, rescored
+
+
+def snapshot_files(paths, model_path=MODEL_PATH, scaler_path=SCALER_PATH, bins_path=BINS_PATH):
+    """
+    Month-end cluster snapshots of all input transactions (loaded in memory).
+
+    Returns:
+        tuple: (MonthlySnapshots, segments) - ``segments`` maps clusters to the default
+        store's Segment names (``default_segments``).
+    """
+    frames = [pd.read_csv(path, dtype={'InvoiceDate': str}) for path in expand_inputs(paths)]
+    df = clean_transactions(pd.concat(frames, ignore_index=True))
+    core = SegmentationCore.from_paths(model_path, scaler_path, bins_path,
+                                       segments=default_segments(model_path))
+    return core.monthly_snapshots(df), core.segments
+
+
+def training_rfm(paths=()):
+    """
+    Customer RFM to retrain on: the input transaction files, or the reference dataset.
+
+    Input files are deduplicated on all of their columns by ``clean_transactions``. The
+    reference rows are deduplicated on all columns of the reference file first
+    (``load_reference_rows``) and not again on the CustomerID / InvoiceDate / TotalSales
+    projection, which would merge different products bought together.
+    """
+    if paths:
+        frames = [pd.read_csv(path, dtype={'InvoiceDate': str}) for path in expand_inputs(paths)]
+        return aggregate_rfm(clean_transactions(pd.concat(frames, ignore_index=True)))
+    ref = load_reference_rows(['Member_number', 'Date', 'Total_Revenue'])
+    return aggregate_rfm(clean_transactions(reference_transactions(ref), drop_duplicates=False))
+
+
+def train_files(paths=(), k_values=None, k=None, workers=None, sample_size=None, minibatch=False,
+                select="elbow", versions_dir=None, promote_set=False, store=None,
+                stores_dir=STORES_DIR, model_path=MODEL_PATH, scaler_path=SCALER_PATH,
+                bins_path=BINS_PATH):
+    """
+    Retrain on ``paths`` (or the reference data) and write a versioned artifact set.
+
+    With ``store`` the set belongs to that store of the registry: it is aligned to
+    and promoted over ``<stores_dir>/<store>/`` and versioned under its ``versions/``.
+
+    Returns:
+        tuple: (TrainingResult, version, directory)
+    """
+    # scikit-learn is only imported for training; scoring workers stay sklearn-free
+    from lib import training
+
+    if store is not None:
+        registry = ModelRegistry(models_dir=os.path.dirname(model_path) or ".", stores_dir=stores_dir)
+        store_paths = registry.paths(store)
+        model_path, scaler_path, bins_path = store_paths["model"], store_paths["scaler"], store_paths["bins"]
+        versions_dir = versions_dir or os.path.join(registry.store_dir(store), VERSIONS_DIRNAME)
+    reference_model = reference_scaler = None
+    if all(os.path.exists(p) for p in (model_path, scaler_path, bins_path)):
+        reference_model, reference_scaler, _ = load_artifacts(model_path, scaler_path, bins_path)
+    result = training.train(training_rfm(paths), k_values or training.DEFAULT_K_VALUES, k=k,
+                            workers=workers,
+                            sample_size=sample_size or training.DEFAULT_SAMPLE_SIZE,
+                            minibatch=minibatch, select=select, reference_model=reference_model,
+                            reference_scaler=reference_scaler)
+    version, version_dir = training.write_versioned_artifacts(
+        result, versions_dir or training.VERSIONS_DIR, inputs=list(paths) or [REFERENCE_PATH],
+        minibatch=minibatch)
+    if promote_set:
+        training.promote(version_dir, os.path.dirname(model_path) or ".")
+    return result, version, version_dir
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m lib.cli", description="RFM batch segmentation")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--scaler", default=SCALER_PATH)
+    parser.add_argument("--bins", default=BINS_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    score = sub.add_parser("score", help="Score transaction files (CSV files or directories)")
+    score.add_argument("inputs", nargs="+")
+    score.add_argument("-o", "--output", required=True, help="Output file (.csv, .csv.gz or .parquet)")
+    score.add_argument("--workers", type=int, default=None)
+    score.add_argument("--partitions", type=int, default=None)
+    score.add_argument("--split-mb", type=int, default=DEFAULT_SPLIT_BYTES // (1024 * 1024))
+    score.add_argument("--proba", action="store_true",
+                       help="Add per-cluster probabilities, Confidence and Margin columns")
+    score.add_argument("--store-column", default=None,
+                       help="Score each customer with the model set of the store in this column")
+    score.add_argument("--stores-dir", default=STORES_DIR)
+
+    append = sub.add_parser("append", help="Merge new transactions into the RFM state store")
+    append.add_argument("inputs", nargs="+")
+    append.add_argument("--state", default=DEFAULT_STATE_PATH)
+
+    snapshots = sub.add_parser("snapshots", help="Segment of every customer at every month end")
+    snapshots.add_argument("inputs", nargs="+")
+    snapshots.add_argument("-o", "--output", required=True,
+                           help="Customer x month segment matrix (.csv or .csv.gz)")
+    snapshots.add_argument("--migrations", help="Month-to-month migration counts CSV")
+
+    export = sub.add_parser("export-artifact", help="Write the compact sklearn-free model artifact")
+    export.add_argument("-o", "--output", default=ARTIFACT_PATH)
+
+    convert = sub.add_parser("convert-reference",
+                             help="Write the columnar (Feather) copy of the reference dataset")
+    convert.add_argument("csv", nargs="?", default=REFERENCE_CSV_PATH)
+    convert.add_argument("-o", "--output", default=REFERENCE_PATH)
+
+    train = sub.add_parser("train", help="Retrain bins, scaler and KMeans; write a versioned set")
+    train.add_argument("inputs", nargs="*", help="Transaction CSVs (default: reference dataset)")
+    train.add_argument("--k-min", type=int, default=2)
+    train.add_argument("--k-max", type=int, default=10)
+    train.add_argument("--k", type=int, default=None, help="Use this K instead of --select")
+    train.add_argument("--select", choices=["elbow", "silhouette"], default="elbow")
+    train.add_argument("--workers", type=int, default=None)
+    train.add_argument("--sample", type=int, default=None, help="Silhouette sample size")
+    train.add_argument("--minibatch", action="store_true", help="MiniBatchKMeans for large data")
+    train.add_argument("--versions-dir", default=None)
+    train.add_argument("--promote", action="store_true",
+                       help="Also copy the new set over the active model files")
+    train.add_argument("--store", default=None,
+                       help="Train the model set of this store (models/stores/<store>/)")
+    train.add_argument("--stores-dir", default=STORES_DIR)
+
+    bins = sub.add_parser("bins", help="Rebuild the R/F/M quartile bins from merged quantile sketches")
+    bins.add_argument("inputs", nargs="*", help="Transaction CSVs (default: reference dataset)")
+    bins.add_argument("-o", "--output", help="Write the bins pickle (e.g. a new rfm_bins.pkl)")
+    bins.add_argument("--k", type=int, default=DEFAULT_K, help="Sketch size (accuracy)")
+    bins.add_argument("--workers", type=int, default=None)
+    bins.add_argument("--partitions", type=int, default=None)
+    bins.add_argument("--split-mb", type=int, default=DEFAULT_SPLIT_BYTES // (1024 * 1024))
+    bins.add_argument("--compare", action="store_true",
+                      help="Compare with exact quartiles (loads all customers)")
+
+    args = parser.parse_args(argv)
+    artifacts = dict(model_path=args.model, scaler_path=args.scaler, bins_path=args.bins)
+    try:
+        if args.command == "score":
+            rfm_df = score_files(args.inputs, workers=args.workers, n_partitions=args.partitions,
+                                 split_bytes=args.split_mb * 1024 * 1024, probabilities=args.proba,
+                                 store_column=args.store_column, stores_dir=args.stores_dir,
+                                 **artifacts)
+            export_path(rfm_df, args.output)
+            print(f"Scored {len(rfm_df)} customers -> {args.output}")
+            if not rfm_df.empty:
+                print(rfm_df['Segment'].value_counts().to_string())
+        elif args.command == "append":
+            store, changed, rescored = append_files(args.inputs, state_path=args.state, **artifacts)
+            # No reference date until the store holds a valid transaction
+            reference = f"{store.reference_date:%Y-%m-%d}" if store.reference_date is not None else "none"
+            print(f"{changed} customers updated, {rescored} re-scored, "
+                  f"{len(store)} in {args.state} (reference date {reference})")
+        elif args.command == "snapshots":
+            snapshots, segments = snapshot_files(args.inputs, **artifacts)
+            snapshots.segment_matrix(segments).to_csv(args.output)
+            print(f"{len(snapshots.customer_ids)} customers x {len(snapshots.months)} months "
+                  f"-> {args.output}")
+            if args.migrations:
+                snapshots.migration_counts(segments).to_csv(args.migrations, index=False)
+                print(f"Migration counts -> {args.migrations}")
+        elif args.command == "train":
+            result, version, version_dir = train_files(
+                args.inputs, list(range(args.k_min, args.k_max + 1)), k=args.k,
+                workers=args.workers, sample_size=args.sample, minibatch=args.minibatch,
+                select=args.select, versions_dir=args.versions_dir, promote_set=args.promote,
+                store=args.store, stores_dir=args.stores_dir, **artifacts)
+            print(f"{'K':>3} {'inertia':>12} {'silhouette':>11}")
+            for m in result.metrics:
+                print(f"{m['k']:>3} {m['inertia']:>12.1f} {m['silhouette']:>11.4f}"
+                      f"{'  <- selected' if m['k'] == result.k else ''}")
+            print(f"Wrote {version_dir} (K={result.k}, {result.n_customers} customers"
+                  f"{', clusters aligned to the current model' if result.aligned else ''})")
+            if args.promote:
+                print(f"Promoted {version} to the active model files"
+                      f"{f' of store {args.store}' if args.store else ''}")
+        elif args.command == "bins":
+            sketch, comparison = sketch_files(args.inputs, k=args.k, workers=args.workers,
+                                              n_partitions=args.partitions,
+                                              split_bytes=args.split_mb * 1024 * 1024,
+                                              compare=args.compare)
+            new_bins = sketch.bins()
+            for name, edges in new_bins.items():
+                print(f"{name}: {np.round(edges, 3).tolist()}")
+            print(f"{len(sketch)} customers, k={sketch.k}, "
+                  f"rank error <= {sketch.rank_error:.2%} per edge (99% confidence)")
+            if comparison is not None:
+                print(comparison.to_string(index=False))
+            if args.output:
+                joblib.dump(new_bins, args.output)
+                print(f"Wrote {args.output}")
+        elif args.command == "convert-reference":
+            source_version = convert_reference_data(args.csv, args.output)
+            print(f"Wrote {args.output} (from {args.csv}, version {source_version})")
+        else:
+            model, scaler, bins = load_artifacts(args.model, args.scaler, args.bins)
+            source_version = artifact_version((args.model, args.scaler, args.bins))
+            version = export_artifact(model, scaler, bins, args.output, source_version)
+            print(f"Wrote {args.output} (version {version}, from pickles {source_version})")
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
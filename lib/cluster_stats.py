@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+
+# ------------------------------
+# Cluster statistics computed once per segmentation; every summary card, chart and
+# table renders from this object instead of regrouping the customer frame.
+# ------------------------------
+class ClusterStats:
+    """
+    Per-cluster counts, RFM means, revenue sums and shares from a single pass.
+
+    Sums are accumulated with ``np.bincount`` over the Cluster codes, one vectorized
+    pass per column and no copy of the customer frame. Revenue per customer is
+    ``Frequency * Monetary``, as in the segments summary table.
+
+    Attributes:
+        table (pd.DataFrame): Cluster, Count, Recency, Frequency, Monetary (means),
+            Revenue (sum), Share (% of customers), RevenueShare (% of revenue).
+        n_customers (int): Rows of the RFM frame (one per CustomerID).
+        means (dict): Overall Recency / Frequency / Monetary means.
+    """
+
+    def __init__(self, table, n_customers, means):
+        self.table = table
+        self.n_customers = n_customers
+        self.means = means
+
+    @classmethod
+    def from_rfm(cls, rfm_df):
+        codes = rfm_df['Cluster'].to_numpy()
+        n_bins = int(codes.max()) + 1 if len(codes) else 0
+        counts = np.bincount(codes, minlength=n_bins)
+        present = np.flatnonzero(counts)
+        counts = counts[present]
+
+        sums = {}
+        for column in ('Recency', 'Frequency', 'Monetary'):
+            values = rfm_df[column].to_numpy(dtype=np.float64)
+            sums[column] = np.bincount(codes, weights=values, minlength=n_bins)[present]
+        revenue = np.bincount(codes, weights=rfm_df['Frequency'].to_numpy(dtype=np.float64)
+                              * rfm_df['Monetary'].to_numpy(dtype=np.float64),
+                              minlength=n_bins)[present]
+
+        n_customers = len(rfm_df)
+        total_revenue = revenue.sum() if revenue.sum() != 0 else 1
+        table = pd.DataFrame({
+            'Cluster': present,
+            'Count': counts,
+            'Recency': sums['Recency'] / counts,
+            'Frequency': sums['Frequency'] / counts,
+            'Monetary': sums['Monetary'] / counts,
+            'Revenue': revenue,
+            'Share': counts / max(n_customers, 1) * 100,
+            'RevenueShare': revenue / total_revenue * 100,
+        })
+        means = {column: (sums[column].sum() / n_customers if n_customers else float('nan'))
+                 for column in ('Recency', 'Frequency', 'Monetary')}
+        return cls(table, n_customers, means)
+
+    @property
+    def n_clusters(self):
+        return len(self.table)
+
+    def summary(self):
+        """
+        Per-cluster averages in the ``summarize_clusters`` layout.
+        """
+        return self.table[['Cluster', 'Recency', 'Frequency', 'Monetary', 'Count']] \
+                   .rename(columns={'Count': 'Số khách hàng'})
+
+    def counts(self):
+        return self.table[['Cluster', 'Count']].rename(columns={'Count': 'Số khách hàng'})
+
+
+def as_cluster_stats(data):
+    """
+    Accept either a ClusterStats or an RFM frame with a Cluster column.
+    """
+    return data if isinstance(data, ClusterStats) else ClusterStats.from_rfm(data)
@@ -0,0 +1,226 @@
+import hashlib
+import json
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from lib.artifact import ARTIFACT_PATH, load_artifact
+from lib.cluster_stats import ClusterStats
+from lib.instrument import instrumented
+
+from lib.rfm import DEFAULT_CHUNKSIZE, aggregate_rfm, clean_transactions, compact_rfm, stream_rfm
+from lib.scoring import DEFAULT_PROBA_CHUNK, F_LABELS, M_LABELS, R_LABELS, LookupScorer, bin_scores
+from lib.snapshots import MonthlySnapshots
+
+
+# ------------------------------
+# Streamlit-free segmentation core, shared by the app and the batch CLI.
+# Errors are raised; the Streamlit layer (lib/mylib.py) turns them into st.error.
+# ------------------------------
+MODEL_PATH = "models/kmeans_rfm_model.pkl"
+SCALER_PATH = "models/scaler.pkl"
+BINS_PATH = "models/rfm_bins.pkl"
+CLUSTER_LABELS_PATH = "data/cluster_labels.json"
+
+CLUSTER_MAP = {0: 'Loyal', 1: 'Regular', 2: 'At-risk', 3: 'No-Potential'}
+
+
+def segment_dtype(segments):
+    """
+    Categorical dtype of the Segment column: the distinct names in cluster order.
+    """
+    return pd.CategoricalDtype(list(dict.fromkeys(segments[k] for k in sorted(segments))))
+
+
+SEGMENT_DTYPE = segment_dtype(CLUSTER_MAP)
+
+
+def load_artifacts(model_path=MODEL_PATH, scaler_path=SCALER_PATH, bins_path=BINS_PATH):
+    """
+    Load the trained KMeans model, scaler and RFM bins.
+
+    Returns:
+        tuple: (model, scaler, bins) where bins has ``r_bins``, ``f_bins``, ``m_bins``.
+    """
+    model = joblib.load(model_path)
+    scaler = joblib.load(scaler_path)
+    bins = joblib.load(bins_path)
+    return model, scaler, bins
+
+
+def artifact_version(paths=(MODEL_PATH, SCALER_PATH, BINS_PATH)):
+    """
+    Short content hash of the artifact files, used to key cached results.
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def load_model_set(artifact_path=ARTIFACT_PATH, model_path=MODEL_PATH, scaler_path=SCALER_PATH,
+                   bins_path=BINS_PATH):
+    """
+    Load model, scaler and bins, preferring the compact numpy artifact.
+
+    The compact artifact is used when it exists and was exported from the current
+    pickles (or the pickles are absent), so inference never imports scikit-learn;
+    otherwise the joblib pickles are loaded.
+
+    Returns:
+        tuple: (model, scaler, bins, version) - version is the pickles' content hash
+        (or the artifact's own version when only the artifact is shipped).
+    """
+    pickles = (model_path, scaler_path, bins_path)
+    have_pickles = all(os.path.exists(p) for p in pickles)
+    version = artifact_version(pickles) if have_pickles else None
+    if os.path.exists(artifact_path):
+        model, scaler, bins, meta = load_artifact(artifact_path)
+        if not have_pickles:
+            return model, scaler, bins, meta["version"]
+        if meta["source_version"] == version:
+            return model, scaler, bins, version
+    model, scaler, bins = load_artifacts(*pickles)
+    return model, scaler, bins, version
+
+
+def load_cluster_labels(path=CLUSTER_LABELS_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def segment_map(labels):
+    """
+    Segment name per cluster from a labels file: a label's optional ``segment`` field,
+    else the ``CLUSTER_MAP`` name (see ``lib.registry`` for the file format).
+    """
+    names = {int(k): v.get("segment", CLUSTER_MAP.get(int(k), str(k))) for k, v in labels.items()}
+    return {**CLUSTER_MAP, **names}
+
+
+class SegmentationCore:
+    """
+    Transaction data -> RFM -> binned features -> cluster, without any UI dependency.
+
+    Args:
+        model: Fitted KMeans model (or the compact ``CentroidModel``).
+        scaler: Fitted StandardScaler (or the compact ``AffineScaler``).
+        bins (dict): ``r_bins``, ``f_bins``, ``m_bins`` quartile edges.
+        scorer (LookupScorer, optional): Prebuilt 64-cell tables; built from the artifacts if omitted.
+        compact (bool): Low-memory mode - int32 CustomerID / Recency / Frequency, float32
+            sales, int8 R/F/M scores and Cluster, categorical Segment.
+        version (str, optional): Content hash of the artifacts (``load_model_set``);
+            None when unknown.
+        segments (dict, optional): Cluster -> Segment name, also used for the ``P_<Segment>``
+            columns (a store's ``segment_map``); ``CLUSTER_MAP`` if omitted.
+    """
+
+    def __init__(self, model, scaler, bins, scorer=None, compact=False, version=None,
+                 segments=None):
+        self.model = model
+        self.scaler = scaler
+        self.r_bins = bins["r_bins"]
+        self.f_bins = bins["f_bins"]
+        self.m_bins = bins["m_bins"]
+        self.scorer = scorer if scorer is not None else LookupScorer(model, scaler, bins)
+        self.compact = compact
+        self.version = version
+        self.segments = dict(segments) if segments is not None else CLUSTER_MAP
+        self.segment_dtype = segment_dtype(self.segments) if segments is not None else SEGMENT_DTYPE
+        # Cluster -> category code of its Segment (-1 for clusters without a name)
+        self._segment_codes = np.full(max(self.segments) + 1, -1, dtype=np.int8)
+        for k, name in self.segments.items():
+            self._segment_codes[k] = self.segment_dtype.categories.get_loc(name)
+
+    @classmethod
+    def from_paths(cls, model_path=MODEL_PATH, scaler_path=SCALER_PATH, bins_path=BINS_PATH,
+                   artifact_path=ARTIFACT_PATH, compact=False, segments=None):
+        model, scaler, bins, version = load_model_set(artifact_path, model_path, scaler_path, bins_path)
+        return cls(model, scaler, bins, compact=compact, version=version, segments=segments)
+
+    @instrumented("clean_data")
+    def clean_data(self, df):
+        return clean_transactions(df, compact=self.compact)
+
+    @instrumented("calculate_rfm")
+    def calculate_rfm(self, df, reference_date=None):
+        # Vectorized: groupby max/size/sum + datetime arithmetic (see lib/rfm.py)
+        rfm_df = aggregate_rfm(df, reference_date)
+        return compact_rfm(rfm_df) if self.compact else rfm_df
+
+    @instrumented("calculate_rfm_streaming")
+    def calculate_rfm_streaming(self, source, chunksize=DEFAULT_CHUNKSIZE, on_chunk=None):
+        # Chunked read; duplicates removed per spilled CustomerID partition (see lib/rfm.py)
+        rfm_df, accumulator = stream_rfm(source, chunksize=chunksize, on_chunk=on_chunk,
+                                         compact=self.compact)
+        rfm_df.attrs['clean_report'] = accumulator.report()
+        return compact_rfm(rfm_df) if self.compact else rfm_df
+
+    @instrumented("prepare_rfm_features")
+    def prepare_rfm_features(self, rfm_df, r_bins, f_bins, m_bins):
+        # searchsorted binning, same intervals as clip + pd.cut(include_lowest=True)
+        dtype = np.int8 if self.compact else np.int64
+        X_RFM = pd.DataFrame({
+            'R': bin_scores(rfm_df['Recency'], r_bins, R_LABELS, dtype),
+            'F': bin_scores(rfm_df['Frequency'], f_bins, F_LABELS, dtype),
+            'M': bin_scores(rfm_df['Monetary'], m_bins, M_LABELS, dtype),
+        }, index=rfm_df.index)
+        return X_RFM
+
+    @instrumented("assign_clusters")
+    def assign_clusters(self, rfm_df):
+        # One table gather over the 64 precomputed (R, F, M) cells replaces scaler + predict
+        clusters = self.scorer.predict(rfm_df)
+        if self.compact:
+            # int8 codes double as category codes: no per-row label strings are created
+            rfm_df['Cluster'] = clusters.astype(np.int8)
+            named = clusters < len(self._segment_codes)
+            codes = np.where(named, self._segment_codes[np.where(named, clusters, 0)], -1)
+            rfm_df['Segment'] = pd.Categorical.from_codes(codes, dtype=self.segment_dtype)
+            return rfm_df
+        rfm_df['Cluster'] = clusters
+        # Labeling by the store's segment map
+        rfm_df['Segment'] = rfm_df['Cluster'].map(self.segments)
+        return rfm_df
+
+    @instrumented("cluster_probabilities")
+    def cluster_probabilities(self, rfm_df, chunk_size=DEFAULT_PROBA_CHUNK):
+        """
+        Add one ``P_<Segment>`` column per cluster plus ``Confidence`` and ``Margin``.
+
+        Probabilities use the manual-mode inverse-distance formula, gathered per (R, F, M)
+        cell (float32 in compact mode); customers are binned in chunks of ``chunk_size``
+        and columns are added one at a time, so the working set beyond the new columns
+        is one column. Confidence is the top probability, Margin the gap to the second one.
+        """
+        dtype = np.float32 if self.compact else np.float64
+        for key, values in self.scorer.proba_columns(rfm_df, chunk_size, dtype):
+            column = key if isinstance(key, str) else f"P_{self.segments.get(key, key)}"
+            rfm_df[column] = values
+        return rfm_df
+
+    def segment_customers(self, df):
+        df_clean = self.clean_data(df)
+        if df_clean.empty:
+            return pd.DataFrame()
+        rfm_df = self.calculate_rfm(df_clean)
+        if rfm_df.empty:
+            return pd.DataFrame()
+        return self.assign_clusters(rfm_df)
+
+    @instrumented("monthly_snapshots")
+    def monthly_snapshots(self, df):
+        # Every month end from one pass of running per-customer aggregates (see lib/snapshots.py)
+        return MonthlySnapshots.from_transactions(df, self.scorer)
+
+    @instrumented("cluster_stats")
+    def cluster_stats(self, rfm_df):
+        # One pass over the customers; the visualizer renders everything from this
+        return ClusterStats.from_rfm(rfm_df)
+
+    @instrumented("summarize_clusters")
+    def summarize_clusters(self, rfm_df):
+        return ClusterStats.from_rfm(rfm_df).summary()
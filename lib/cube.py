@@ -0,0 +1,195 @@
+import hashlib
+import os
+import tempfile
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from lib.reference_data import (REFERENCE_CSV_PATH, REFERENCE_PATH, load_reference_rows,
+                                 reference_transactions, reference_version)
+from lib.rfm import clean_transactions
+
+
+# ------------------------------
+# Aggregate cube over the reference transactions: Month x weekday x Category x Cluster
+# with revenue, items, transactions and distinct customers, cached on disk.
+# ------------------------------
+CUBE_PATH = "data/rfm_cube.feather"
+CUBE_DIMENSIONS = ['Month', 'weekday', 'Category', 'Cluster']
+CUBE_MEASURES = ['Revenue', 'Items', 'Transactions', 'Customers']
+# Part of the cube key: bump when ``build_reference_cube`` changes so cached cubes are rebuilt
+CUBE_FORMAT = 2
+
+
+def _grouping_id(dimensions):
+    return sum(1 << CUBE_DIMENSIONS.index(d) for d in dimensions)
+
+
+class AggregateCube:
+    """
+    Every grouping set of the four dimensions (16 group-bys, like SQL ``CUBE``).
+
+    Distinct customer counts cannot be summed across cells, so instead of rolling
+    up at query time each combination of grouped dimensions is aggregated up front
+    and a query reads the one matching grouping set. Dimensions that are rolled up
+    in a row are missing (NaT / NaN / -1 for Cluster).
+
+    Attributes:
+        table (pd.DataFrame): ``grouping`` (bitmask over ``CUBE_DIMENSIONS``), the
+            dimensions and the measures.
+        version (str): Hash of the reference data and model version it was built from.
+    """
+
+    def __init__(self, table, version):
+        self.table = table
+        self.version = version
+
+    @classmethod
+    def build(cls, transactions, version=""):
+        """
+        Args:
+            transactions (pd.DataFrame): Date, weekday, Category, Cluster, Member_number,
+                items and Total_Revenue per transaction.
+            version (str): Stored with the cube for invalidation.
+        """
+        df = pd.DataFrame({
+            'Month': transactions['Date'].dt.to_period('M').dt.to_timestamp(),
+            'weekday': transactions['weekday'],
+            'Category': transactions['Category'],
+            'Cluster': transactions['Cluster'].astype(np.int8),
+            'Member_number': transactions['Member_number'],
+            'items': transactions['items'],
+            'Total_Revenue': transactions['Total_Revenue'],
+        })
+        measures = dict(Revenue=('Total_Revenue', 'sum'), Items=('items', 'sum'),
+                        Transactions=('Total_Revenue', 'size'), Customers=('Member_number', 'nunique'))
+        parts = []
+        for n in range(len(CUBE_DIMENSIONS) + 1):
+            for dims in combinations(CUBE_DIMENSIONS, n):
+                if dims:
+                    part = df.groupby(list(dims), observed=True, sort=True).agg(**measures).reset_index()
+                else:
+                    part = pd.DataFrame({'Revenue': [df['Total_Revenue'].sum()],
+                                         'Items': [df['items'].sum()],
+                                         'Transactions': [len(df)],
+                                         'Customers': [df['Member_number'].nunique()]})
+                part.insert(0, 'grouping', np.int8(_grouping_id(dims)))
+                parts.append(part)
+        table = pd.concat(parts, ignore_index=True)
+        table['grouping'] = table['grouping'].astype(np.int8)
+        table['Cluster'] = table['Cluster'].fillna(-1).astype(np.int8)
+        for column in ('weekday', 'Category'):
+            table[column] = table[column].astype(df[column].dtype)
+        table = table[['grouping'] + CUBE_DIMENSIONS + CUBE_MEASURES]
+        return cls(table, version)
+
+    def values(self, dimension):
+        """
+        Distinct values of one dimension, in sort order.
+        """
+        rows = self.table[self.table['grouping'] == _grouping_id([dimension])]
+        return rows[dimension].sort_values().tolist()
+
+    def query(self, group_by=(), **filters):
+        """
+        Measures grouped by ``group_by`` for the rows matching ``filters``.
+
+        Args:
+            group_by (sequence): Dimensions to keep, e.g. ``['Month']``.
+            **filters: One value per filtered dimension, e.g. ``Category='Fresh Food'``;
+                None means no filter.
+
+        Returns:
+            pd.DataFrame: ``group_by`` columns followed by ``CUBE_MEASURES``.
+        """
+        group_by = list(group_by)
+        filters = {k: v for k, v in filters.items() if v is not None}
+        unknown = set(group_by).union(filters) - set(CUBE_DIMENSIONS)
+        if unknown:
+            raise ValueError(f"Unknown cube dimensions: {sorted(unknown)}")
+        mask = self.table['grouping'].to_numpy() == _grouping_id(set(group_by) | set(filters))
+        for dimension, value in filters.items():
+            mask &= (self.table[dimension] == value).to_numpy()
+        result = self.table.loc[mask, group_by + CUBE_MEASURES]
+        return result.sort_values(group_by).reset_index(drop=True) if group_by \
+            else result.reset_index(drop=True)
+
+    def save(self, path=CUBE_PATH):
+        table = pa.Table.from_pandas(self.table, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                               b"cube_version": self.version.encode()})
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        # Unique temporary name: two sessions rebuilding at once must not share one file
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".rfm_cube_", suffix=".tmp")
+        os.close(fd)
+        try:
+            feather.write_feather(table, tmp_path, compression="uncompressed")
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path=CUBE_PATH):
+        table = feather.read_table(path, memory_map=True)
+        version = (table.schema.metadata or {}).get(b"cube_version", b"").decode()
+        return cls(table.to_pandas(), version)
+
+
+def cube_version(model_version, path=REFERENCE_PATH, csv_path=REFERENCE_CSV_PATH):
+    """
+    Key of the cube: reference data content hash + model version + ``CUBE_FORMAT``.
+
+    The CSV hash is cached by path, mtime and size (see ``lib.reference_data``), so
+    reruns of an unchanged file do not read it again.
+    """
+    data_version = reference_version(path, csv_path)
+    return hashlib.sha256(f"{data_version}:{model_version}:{CUBE_FORMAT}".encode()).hexdigest()[:12]
+
+
+def build_reference_cube(core, version=""):
+    """
+    Score the reference customers with ``core`` and aggregate their transactions.
+
+    Exact duplicate rows of the reference file (all columns compared) are dropped
+    once; the customers' transactions are then only cleaned of invalid dates / sales,
+    not deduplicated again on CustomerID / InvoiceDate / TotalSales, which would merge
+    different products bought on one day for the same total.
+
+    Args:
+        core (SegmentationCore): Model used to assign each Member_number a cluster.
+        version (str): Stored with the cube.
+
+    Returns:
+        AggregateCube
+    """
+    ref = load_reference_rows(['Member_number', 'Date', 'weekday', 'Category', 'items',
+                               'Total_Revenue'])
+    transactions = clean_transactions(reference_transactions(ref), drop_duplicates=False,
+                                      compact=core.compact)
+    rfm_df = core.assign_clusters(core.calculate_rfm(transactions))
+    clusters = pd.Series(rfm_df['Cluster'].to_numpy(), index=rfm_df['CustomerID'].to_numpy())
+    ref = ref.assign(Cluster=clusters.reindex(ref['Member_number'].to_numpy()).fillna(-1)
+                     .astype(np.int8).to_numpy())
+    return AggregateCube.build(ref, version)
+
+
+def load_or_build_cube(core, model_version, path=CUBE_PATH):
+    """
+    Load the cached cube, rebuilding it when the reference data or model changed.
+
+    Returns:
+        AggregateCube
+    """
+    version = cube_version(model_version)
+    if os.path.exists(path):
+        cube = AggregateCube.load(path)
+        if cube.version == version:
+            return cube
+    cube = build_reference_cube(core, version)
+    cube.save(path)
+    return cube
@@ -0,0 +1,90 @@
+import numpy as np
+
+
+# ------------------------------
+# Row-position indexes over a scored RFM frame, built once per segmentation so
+# table lookups and pages never scan the whole frame.
+# ------------------------------
+class CustomerIndex:
+    """
+    Sorted CustomerID index plus row positions grouped by Cluster.
+
+    A CustomerID lookup is a binary search (O(log n)); the rows of one cluster are a
+    contiguous slice of a cluster-sorted position array (O(1)), in the frame's own
+    row order. A page of either is one ``iloc`` gather of at most ``page_size`` rows.
+
+    Attributes:
+        sorted_ids (np.ndarray): CustomerIDs in ascending order.
+        id_rows (np.ndarray): Row position of each entry of ``sorted_ids``.
+        cluster_rows (np.ndarray): Row positions sorted by Cluster (stable).
+        clusters (np.ndarray): Clusters present, ascending.
+        offsets (np.ndarray): ``cluster_rows[offsets[i]:offsets[i + 1]]`` are the rows
+            of ``clusters[i]``.
+        row_clusters (np.ndarray): Cluster of every row (the frame's column, not copied).
+    """
+
+    def __init__(self, sorted_ids, id_rows, cluster_rows, clusters, offsets, row_clusters):
+        self.sorted_ids = sorted_ids
+        self.id_rows = id_rows
+        self.cluster_rows = cluster_rows
+        self.clusters = clusters
+        self.offsets = offsets
+        self.row_clusters = row_clusters
+
+    def __len__(self):
+        return len(self.sorted_ids)
+
+    @classmethod
+    def from_rfm(cls, rfm_df):
+        """
+        Args:
+            rfm_df (pd.DataFrame): Scored customers with CustomerID and Cluster.
+        """
+        position_dtype = np.int32 if len(rfm_df) < np.iinfo(np.int32).max else np.int64
+        ids = rfm_df['CustomerID'].to_numpy()
+        id_rows = np.argsort(ids, kind='stable').astype(position_dtype)
+        codes = rfm_df['Cluster'].to_numpy()
+        cluster_rows = np.argsort(codes, kind='stable').astype(position_dtype)
+        clusters, counts = np.unique(codes, return_counts=True)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        return cls(ids[id_rows], id_rows, cluster_rows, clusters, offsets, codes)
+
+    def lookup(self, customer_id):
+        """
+        Row positions of ``customer_id`` (empty if absent).
+        """
+        lo = np.searchsorted(self.sorted_ids, customer_id, side='left')
+        hi = np.searchsorted(self.sorted_ids, customer_id, side='right')
+        return self.id_rows[lo:hi]
+
+    def rows(self, cluster=None):
+        """
+        Row positions of one cluster, or of every row when ``cluster`` is None
+        (a ``range``, so nothing is allocated).
+        """
+        if cluster is None:
+            return range(len(self))
+        i = np.searchsorted(self.clusters, cluster)
+        if i == len(self.clusters) or self.clusters[i] != cluster:
+            return self.cluster_rows[:0]
+        return self.cluster_rows[self.offsets[i]:self.offsets[i + 1]]
+
+    def select(self, cluster=None, customer_id=None):
+        """
+        Row positions matching both filters (None means no filter).
+        """
+        if customer_id is None:
+            return self.rows(cluster)
+        rows = self.lookup(customer_id)
+        if cluster is not None:
+            rows = rows[self.row_clusters[rows] == cluster]
+        return rows
+
+
+def page_rows(rows, page, page_size):
+    """
+    Slice of ``rows`` for 1-based ``page`` and the number of pages.
+    """
+    n_pages = max(1, -(-len(rows) // page_size))
+    page = min(max(page, 1), n_pages)
+    return rows[(page - 1) * page_size:page * page_size], n_pages
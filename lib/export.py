@@ -0,0 +1,116 @@
+import gzip
+import os
+from io import BytesIO
+
+import pyarrow as pa
+import pyarrow.csv as pcsv
+import pyarrow.parquet as pq
+
+
+# ------------------------------
+# Chunked export of scored customers: gzip CSV or Parquet written one row group at a
+# time, so no whole-file CSV string (or whole-frame Arrow table) is ever built.
+# ------------------------------
+EXPORT_CHUNK_ROWS = 100_000
+# Level 1 compresses about 3x faster than the default 6 for ~10% larger files
+CSV_GZIP_LEVEL = 1
+PARQUET_COMPRESSION = "zstd"
+EXPORT_FORMATS = {
+    "csv.gz": {"label": "CSV nén (.csv.gz)", "mime": "application/gzip"},
+    "parquet": {"label": "Parquet (.parquet)", "mime": "application/vnd.apache.parquet"},
+}
+
+
+def iter_chunks(df, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Consecutive row slices of ``df`` (views, not copies) of at most ``chunk_rows`` rows.
+    """
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def arrow_schema(df, decode_dictionaries=False):
+    """
+    Arrow schema of ``df``'s columns; categorical columns become plain values when
+    ``decode_dictionaries`` is set (CSV has no dictionary encoding).
+    """
+    schema = pa.Schema.from_pandas(df.iloc[:0], preserve_index=False)
+    if not decode_dictionaries:
+        return schema
+    return pa.schema([field.with_type(field.type.value_type) if pa.types.is_dictionary(field.type)
+                      else field for field in schema.remove_metadata()])
+
+
+def write_csv(df, fileobj, chunk_rows=EXPORT_CHUNK_ROWS, compresslevel=CSV_GZIP_LEVEL):
+    """
+    Write ``df`` as CSV (gzip-compressed unless ``compresslevel`` is None) to a binary file.
+
+    Chunks are formatted by Arrow's CSV writer (several times faster than
+    ``DataFrame.to_csv``) and compressed as they are written, so the text held at any
+    time is one chunk's CSV; the header is written once.
+    """
+    schema = arrow_schema(df, decode_dictionaries=True)
+    out = gzip.GzipFile(fileobj=fileobj, mode="wb", compresslevel=compresslevel, mtime=0) \
+        if compresslevel is not None else fileobj
+    try:
+        with pcsv.CSVWriter(out, schema) as writer:
+            for chunk in iter_chunks(df, chunk_rows):
+                writer.write_table(pa.Table.from_pandas(chunk, preserve_index=False).cast(schema))
+    finally:
+        if out is not fileobj:
+            out.close()
+
+
+def write_parquet(df, fileobj, chunk_rows=EXPORT_CHUNK_ROWS, compression=PARQUET_COMPRESSION):
+    """
+    Write ``df`` as Parquet to a binary file, one row group per chunk.
+
+    The schema comes from the frame's dtypes (compact int32 / float32 columns and the
+    categorical Segment stay narrow in the file).
+    """
+    schema = arrow_schema(df)
+    with pq.ParquetWriter(fileobj, schema, compression=compression) as writer:
+        for chunk in iter_chunks(df, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False),
+                               row_group_size=chunk_rows)
+
+
+def write_export(df, fileobj, fmt, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Write ``df`` in ``fmt`` (a key of ``EXPORT_FORMATS``) to a binary file.
+    """
+    if fmt == "csv.gz":
+        write_csv(df, fileobj, chunk_rows)
+    elif fmt == "parquet":
+        write_parquet(df, fileobj, chunk_rows)
+    else:
+        raise ValueError(f"Unknown export format '{fmt}'; expected one of {list(EXPORT_FORMATS)}.")
+
+
+def export_bytes(df, fmt, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    The compressed export of ``df`` in memory: only the compressed output and one
+    chunk are held while writing.
+
+    Returns:
+        BytesIO: Rewound buffer.
+    """
+    buffer = BytesIO()
+    write_export(df, buffer, fmt, chunk_rows)
+    buffer.seek(0)
+    return buffer
+
+
+def export_path(df, path, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Write ``df`` to ``path``; the format follows the extension (``.parquet``,
+    ``.csv.gz`` / ``.gz``, otherwise plain CSV). The file is written next to its
+    target and renamed into place.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        if path.endswith(".parquet"):
+            write_parquet(df, f, chunk_rows)
+        else:
+            write_csv(df, f, chunk_rows, CSV_GZIP_LEVEL if path.endswith(".gz") else None)
+    os.replace(tmp_path, path)
@@ -0,0 +1,127 @@
+import contextvars
+import functools
+import json
+import logging
+import resource
+import sys
+import time
+from contextlib import contextmanager
+
+
+# ------------------------------
+# Lightweight per-stage instrumentation: wall time, rows in/out, memory delta.
+# Hooks are no-ops unless a StageRecorder is active (see ``recording``).
+# ------------------------------
+logger = logging.getLogger("rfm.diagnostics")
+
+_active_recorder = contextvars.ContextVar("rfm_stage_recorder", default=None)
+
+
+def current_rss_mb():
+    """
+    Resident set size of this process in MB (peak RSS where the current value is unavailable).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize() / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _rows(obj):
+    try:
+        return len(obj) if hasattr(obj, "columns") else None
+    except TypeError:
+        return None
+
+
+class StageRecorder:
+    """
+    Collects one record per instrumented stage.
+
+    Each record has ``stage``, ``seconds``, ``rows_in``, ``rows_out``, ``rss_mb`` (after
+    the stage) and ``mem_delta_mb`` (RSS change across the stage; negative when memory
+    was released).
+    """
+
+    def __init__(self):
+        self.records = []
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        record = {"stage": name, "rows_in": rows_in, "rows_out": None}
+        rss_before = current_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = round(time.perf_counter() - start, 6)
+            rss_after = current_rss_mb()
+            record["rss_mb"] = round(rss_after, 1)
+            record["mem_delta_mb"] = round(rss_after - rss_before, 1)
+            self.records.append(record)
+
+    def extend(self, records):
+        self.records.extend(records)
+
+    def total_seconds(self):
+        return round(sum(r["seconds"] for r in self.records), 6)
+
+    def to_json(self, **meta):
+        return json.dumps({**meta, "total_seconds": self.total_seconds(), "stages": self.records},
+                          ensure_ascii=False, indent=2)
+
+    def log(self, **meta):
+        """
+        Emit one structured JSON line per stage on the ``rfm.diagnostics`` logger.
+        """
+        for record in self.records:
+            logger.info(json.dumps({**meta, **record}, ensure_ascii=False))
+
+
+@contextmanager
+def recording(recorder=None):
+    """
+    Activate a recorder for the enclosed code; instrumented calls inside append to it.
+    """
+    recorder = recorder or StageRecorder()
+    token = _active_recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _active_recorder.reset(token)
+
+
+@contextmanager
+def stage(name, rows_in=None):
+    """
+    Time a block on the active recorder (no-op record when none is active).
+    """
+    recorder = _active_recorder.get()
+    if recorder is None:
+        yield {}
+        return
+    with recorder.stage(name, rows_in) as record:
+        yield record
+
+
+def instrumented(name):
+    """
+    Decorator recording a function as a stage; rows are taken from the first DataFrame
+    argument and from the DataFrame result.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            recorder = _active_recorder.get()
+            if recorder is None:
+                return func(*args, **kwargs)
+            rows_in = next((n for n in map(_rows, args) if n is not None), None)
+            with recorder.stage(name, rows_in) as record:
+                result = func(*args, **kwargs)
+                record["rows_out"] = _rows(result)
+            return result
+        return wrapper
+    return decorator
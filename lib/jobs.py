@@ -0,0 +1,200 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+# ------------------------------
+# Background jobs: heavy segmentations run on a bounded, process-wide pool instead of
+# inside the script run, with per-stage progress and cooperative cancellation.
+# ------------------------------
+MAX_CONCURRENT_JOBS = 2
+MAX_QUEUED_JOBS = 8
+MAX_FINISHED_JOBS = 8
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job at its next progress report after ``Job.cancel``."""
+
+
+class JobQueueFull(RuntimeError):
+    """Raised by ``JobExecutor.submit`` when ``max_queued`` jobs are already waiting."""
+
+
+class Job:
+    """
+    One background computation, shared by every session that submits the same key.
+
+    The job function receives the Job and calls ``report`` between stages (or chunks);
+    that is where progress is published and where a pending cancellation stops the
+    job. Readers take ``snapshot()`` for a consistent view from another thread.
+
+    Attributes:
+        key: Identity of the work (equal keys share one job).
+        state (str): ``queued``, ``running``, ``done``, ``failed`` or ``cancelled``.
+        result: Return value of the job function once ``done``.
+        error (Exception | None): Failure once ``failed``.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.state = QUEUED
+        self.stage = None
+        self.fraction = 0.0
+        self.counts = {}
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.state in FINISHED_STATES
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def report(self, stage, fraction=None, **counts):
+        """
+        Publish progress (``fraction`` in [0, 1], named counts) and honour cancellation.
+
+        Raises:
+            JobCancelled: If ``cancel`` was called.
+        """
+        self.check_cancelled()
+        with self._lock:
+            self.stage = stage
+            if fraction is not None:
+                self.fraction = min(max(float(fraction), self.fraction), 1.0)
+            self.counts.update(counts)
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def cancel(self):
+        """
+        Request cancellation; a queued job never starts, a running one stops at its next report.
+        """
+        self._cancel.set()
+        if self.future is not None and self.future.cancel():
+            self._finish(CANCELLED)
+
+    def snapshot(self):
+        with self._lock:
+            now = self.finished_at or time.time()
+            return {"key": self.key, "state": self.state, "stage": self.stage,
+                    "fraction": self.fraction, "counts": dict(self.counts),
+                    "cancel_requested": self._cancel.is_set(),
+                    "elapsed": round(now - (self.started_at or now), 1),
+                    "waiting": round((self.started_at or now) - self.submitted_at, 1)}
+
+    def _start(self):
+        with self._lock:
+            self.state = RUNNING
+            self.started_at = time.time()
+
+    def _finish(self, state, result=None, error=None):
+        with self._lock:
+            self.state = state
+            self.result = result
+            self.error = error
+            self.finished_at = time.time()
+            if state == DONE:
+                self.fraction = 1.0
+
+
+class JobExecutor:
+    """
+    Bounded thread pool plus a registry of jobs by key.
+
+    At most ``max_workers`` jobs run at once, so one large upload occupies one worker
+    and cannot take the whole server; further jobs wait in FIFO order, and beyond
+    ``max_queued`` waiting jobs ``submit`` refuses new work. Threads rather than
+    processes keep the results (large DataFrames) in memory without pickling them
+    back; the heavy pandas / NumPy kernels release the GIL.
+
+    Finished jobs stay in the registry (most recently used last, at most
+    ``max_finished``) so reruns and other sessions pick up the result by key.
+    """
+
+    def __init__(self, max_workers=MAX_CONCURRENT_JOBS, max_queued=MAX_QUEUED_JOBS,
+                 max_finished=MAX_FINISHED_JOBS):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.max_finished = max_finished
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rfm-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, key, func, *args, retry=False, **kwargs):
+        """
+        Return the job for ``key``, starting ``func(job, *args, **kwargs)`` if there is none.
+
+        A failed or cancelled job is returned as is (so a cancelled upload does not
+        restart on the next rerun) unless ``retry`` is set, which replaces it.
+
+        Raises:
+            JobQueueFull: If ``max_queued`` jobs are already waiting.
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and not (retry and job.state in (FAILED, CANCELLED)):
+                self._jobs.move_to_end(key)
+                return job
+            if self.count(QUEUED) >= self.max_queued:
+                raise JobQueueFull(f"{self.max_queued} jobs are already waiting.")
+            job = Job(key)
+            self._jobs[key] = job
+            job.future = self._pool.submit(self._run, job, func, args, kwargs)
+            self._evict()
+            return job
+
+    def get(self, key):
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                self._jobs.move_to_end(key)
+            return job
+
+    def count(self, state):
+        return sum(job.state == state for job in list(self._jobs.values()))
+
+    def shutdown(self, cancel=True):
+        if cancel:
+            for job in list(self._jobs.values()):
+                job.cancel()
+        self._pool.shutdown(wait=True)
+
+    def _evict(self):
+        finished = [key for key, job in self._jobs.items() if job.finished]
+        for key in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[key]
+
+    def _run(self, job, func, args, kwargs):
+        if job.cancel_requested:
+            job._finish(CANCELLED)
+            return
+        job._start()
+        try:
+            result = func(job, *args, **kwargs)
+        except JobCancelled:
+            job._finish(CANCELLED)
+        except Exception as e:
+            job._finish(FAILED, error=e)
+        else:
+            job._finish(DONE, result=result)
+        with self._lock:
+            self._evict()
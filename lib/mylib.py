@@ -1,41 +1,75 @@
 import streamlit as st
-import joblib
-import json
+import functools
+import hashlib
 import pandas as pd
+from io import BytesIO
 import plotly.express as px
 
+from lib.cluster_stats import ClusterStats, as_cluster_stats
+from lib.core import CLUSTER_MAP, SegmentationCore
+from lib.cube import cube_version, load_or_build_cube
+from lib.customer_index import CustomerIndex, page_rows
+from lib.export import EXPORT_CHUNK_ROWS, EXPORT_FORMATS, export_bytes
+from lib.instrument import StageRecorder, instrumented, recording, stage
+from lib.jobs import CANCELLED, FAILED, MAX_CONCURRENT_JOBS, QUEUED, JobExecutor, JobQueueFull
+from lib.scatter import (SCATTER_MAX_POINTS, SCATTER_WEBGL_THRESHOLD, density_cells,
+                         stratified_sample)
+from lib.registry import DEFAULT_STORE, ModelRegistry
+from lib.snapshots import MonthlySnapshots
+
 
 # ------------------------------
-# Load trained model, scaler, and bins (using cache)
+# Load trained model, scaler, bins and labels per store (registry, reloaded on change)
 # ------------------------------
 @st.cache_resource
-def load_model_and_bins():
+def model_registry():
+    """
+    Process-wide model registry: artifact sets load on first use per store and are
+    reloaded when their files change (see ``lib/registry.py``).
+    """
+    return ModelRegistry()
+
+
+def load_model_set_cached(store=DEFAULT_STORE):
+    """
+    Current ModelSet of ``store`` (model, scaler, bins, 64-cell scorer, labels, version).
+
+    Called on every rerun: the registry only stats the files, so a promoted or
+    retrained set is used from the next rerun on without restarting the app.
+    """
     try:
-        model = joblib.load("models/kmeans_rfm_model.pkl")
-        scaler = joblib.load("models/scaler.pkl")
-        bins = joblib.load("models/rfm_bins.pkl")
-        return model, scaler, bins
+        return model_registry().get(store)
     except Exception as e:
         st.error(f"Lỗi khi tải model/scaler: {e}")
         st.stop()
 
-model, scaler, bins = load_model_and_bins()
-r_bins, f_bins, m_bins = bins["r_bins"], bins["f_bins"], bins["m_bins"]
+
+def list_stores():
+    try:
+        return model_registry().stores()
+    except Exception:
+        return [DEFAULT_STORE]
 
 
 # ------------------------------
-# Read JSON file containing cluster label information
+# Aggregate cube of the reference data for the About page (disk cache + process cache)
 # ------------------------------
-@st.cache_data
-def load_cluster_labels():
+@st.cache_resource(show_spinner="Đang tổng hợp dữ liệu...")
+def load_cube_cached(version, _model_set):
+    # ``version`` keys the cache: a new data file or model builds a new cube
+    return load_or_build_cube(_model_set.core(), _model_set.version)
+
+
+def load_reference_cube():
+    """
+    Month x weekday x Category x Cluster cube of the reference transactions, or None on error.
+    """
     try:
-        with open("data/cluster_labels.json", "r", encoding="utf-8") as f:
-            return json.load(f)
+        model_set = load_model_set_cached()
+        return load_cube_cached(cube_version(model_set.version), model_set)
     except Exception as e:
-        st.error(f"Lỗi đọc file cluster_labels.json: {e}")
-        st.stop()
-
-cluster_labels = load_cluster_labels()
+        st.error(f"Lỗi tổng hợp dữ liệu tham chiếu: {e}")
+        return None
 
 
 def inject_custom_css():
@@ -64,102 +98,232 @@ def inject_custom_css():
 # ------------------------------
 # Customer Segmentation Class: Data processing and clustering from transaction data
 # ------------------------------
-class CustomerSegmentation:
-    def __init__(self):
-        self.model = model
-        self.scaler = scaler
-        self.r_bins = r_bins
-        self.f_bins = f_bins
-        self.m_bins = m_bins
-
-    def clean_data(self, df):
-        try:
-            df['CustomerID'] = pd.to_numeric(df['CustomerID'], errors='coerce').fillna(0).astype(int)
-            df['TotalSales'] = pd.to_numeric(df['TotalSales'], errors='coerce').fillna(0).astype(float)
-            df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'], errors='coerce')
-            df = df.dropna(subset=['CustomerID', 'InvoiceDate', 'TotalSales'])
-            df = df[df['TotalSales'] > 0]
-            df = df.drop_duplicates()
-            return df
-        except Exception as e:
-            st.error(f"Lỗi xử lý dữ liệu: {e}")
-            return pd.DataFrame()
+def report_errors(message):
+    """
+    Wrap a SegmentationCore step so failures show ``st.error`` and yield an empty DataFrame.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                st.error(f"{message}: {e}")
+                return pd.DataFrame()
+        return wrapper
+    return decorator
+
+
+class CustomerSegmentation(SegmentationCore):
+    def __init__(self, compact=False, model_set=None):
+        model_set = model_set or load_model_set_cached()
+        super().__init__(model_set.model, model_set.scaler, model_set.bins, model_set.scorer,
+                         compact=compact, version=model_set.version, segments=model_set.segments)
+
+    clean_data = report_errors("Lỗi xử lý dữ liệu")(SegmentationCore.clean_data)
+    calculate_rfm = report_errors("Lỗi tính toán RFM")(SegmentationCore.calculate_rfm)
+    calculate_rfm_streaming = report_errors("Lỗi tính toán RFM")(SegmentationCore.calculate_rfm_streaming)
+    prepare_rfm_features = report_errors("Lỗi chuẩn bị dữ liệu RFM")(SegmentationCore.prepare_rfm_features)
+    assign_clusters = report_errors("Lỗi phân cụm")(SegmentationCore.assign_clusters)
+    cluster_probabilities = report_errors("Lỗi tính xác suất")(SegmentationCore.cluster_probabilities)
+    summarize_clusters = report_errors("Lỗi tổng hợp nhóm")(SegmentationCore.summarize_clusters)
+    cluster_stats = report_errors("Lỗi tổng hợp nhóm")(SegmentationCore.cluster_stats)
+    monthly_snapshots = report_errors("Lỗi tính RFM theo tháng")(SegmentationCore.monthly_snapshots)
 
-    def calculate_rfm(self, df):
-        try:
-            max_date = df['InvoiceDate'].max().date()
-            rfm_df = df.groupby('CustomerID').agg(
-                Recency=('InvoiceDate', lambda x: (max_date - x.max().date()).days),
-                Frequency=('CustomerID', 'count'),
-                Monetary=('TotalSales', 'sum')
-            ).reset_index()
-            rfm_df['Monetary'] = rfm_df['Monetary'].fillna(0)
-            return rfm_df
-        except Exception as e:
-            st.error(f"Lỗi tính toán RFM: {e}")
-            return pd.DataFrame()
+# ------------------------------
+# Background segmentation jobs: uploaded file bytes + model version + options ->
+# segmentation results, computed off the script run on a bounded, shared pool
+# ------------------------------
+RESULT_CACHE_ENTRIES = 8
+JOB_POLL_SECONDS = 0.5
+JOB_STAGE_LABELS = {
+    "read_csv": "Đọc file",
+    "clean_data": "Làm sạch dữ liệu",
+    "calculate_rfm": "Tính RFM",
+    "assign_clusters": "Phân cụm",
+    "cluster_probabilities": "Tính xác suất",
+    "cluster_stats": "Tổng hợp nhóm",
+    "monthly_snapshots": "Tính RFM theo tháng",
+}
 
-    def prepare_rfm_features(self, rfm_df, r_bins, f_bins, m_bins):
-        try:
-            df_copy = rfm_df.copy()
-            df_copy['Recency'] = df_copy['Recency'].clip(lower=r_bins[0], upper=r_bins[-1])
-            df_copy['Frequency'] = df_copy['Frequency'].clip(lower=f_bins[0], upper=f_bins[-1])
-            df_copy['Monetary'] = df_copy['Monetary'].clip(lower=m_bins[0], upper=m_bins[-1])
-            
-            df_copy['R'] = pd.cut(df_copy['Recency'], bins=r_bins, 
-                                  labels=[4, 3, 2, 1], include_lowest=True).astype(int)
-            df_copy['F'] = pd.cut(df_copy['Frequency'], bins=f_bins, 
-                                  labels=[1, 2, 3, 4], include_lowest=True).astype(int)
-            df_copy['M'] = pd.cut(df_copy['Monetary'], bins=m_bins, 
-                                  labels=[1, 2, 3, 4], include_lowest=True).astype(int)
-    
-            X_RFM = df_copy[['R', 'F', 'M']]
-            return X_RFM
-        except Exception as e:
-            st.error(f"Lỗi chuẩn bị dữ liệu RFM: {e}")
-            return pd.DataFrame()
 
-    def segment_customers(self, df):
-        try:
-            df_clean = self.clean_data(df)
-            if df_clean.empty:
-                return pd.DataFrame()
-            rfm_df = self.calculate_rfm(df_clean)
-            if rfm_df.empty:
-                return pd.DataFrame()
-            X_RFM = self.prepare_rfm_features(rfm_df, self.r_bins, self.f_bins, self.m_bins)
-            # Scale RFM data after qcut
-            X_RFM_scaled = self.scaler.transform(X_RFM)
-            # Dự đoán cluster
-            rfm_df['Cluster'] = self.model.predict(X_RFM_scaled)
-            # Labeling by cluster map
-            cluster_map = {0: 'Loyal', 1: 'Regular', 2: 'At-risk', 3: 'No-Potential'}
-            rfm_df['Segment'] = rfm_df['Cluster'].map(cluster_map)
-            return rfm_df
-        except Exception as e:
-            st.error(f"Lỗi phân cụm: {e}")
-            return pd.DataFrame()
+def hash_bytes(raw_bytes):
+    return hashlib.sha256(raw_bytes).hexdigest()
 
-    def summarize_clusters(self, rfm_df):
-        try:
-            summary = rfm_df.groupby('Cluster').agg({
-                'Recency': 'mean',
-                'Frequency': 'mean',
-                'Monetary': 'mean',
-                'CustomerID': 'count'
-            }).rename(columns={'CustomerID': 'Số khách hàng'}).reset_index()
-            return summary
-        except Exception as e:
-            st.error(f"Lỗi tổng hợp nhóm: {e}")
-            return pd.DataFrame()
+
+@st.cache_resource
+def job_executor():
+    """
+    Process-wide job pool: at most ``MAX_CONCURRENT_JOBS`` segmentations run at once
+    across all sessions, and finished results are kept for ``RESULT_CACHE_ENTRIES`` uploads.
+    """
+    return JobExecutor(max_workers=MAX_CONCURRENT_JOBS, max_finished=RESULT_CACHE_ENTRIES)
+
+
+def run_segmentation(job, model_set, raw_bytes, streaming=False, compact=False, probabilities=False):
+    """
+    Full segmentation of one upload, run as a background job.
+
+    Progress is reported on ``job`` after every stage (and every chunk when
+    streaming), which is also where a cancellation stops the work. Errors propagate
+    to the job instead of being shown with ``st.error``, since no script run is active
+    on the worker thread.
+
+    Args:
+        job (Job): The running job (``lib.jobs``).
+        model_set (ModelSet): Store model to score with (``lib.registry``).
+        raw_bytes (bytes): Raw CSV content.
+        streaming (bool): Read the CSV in chunks into a per-customer accumulator
+            instead of materialising the cleaned transactions (``clean`` is then empty).
+        compact (bool): Low-memory dtypes (int32 ids, float32 sales, int8 scores,
+            categorical Segment); see ``SegmentationCore``.
+        probabilities (bool): Add per-cluster membership probabilities, Confidence and
+            Margin columns to ``rfm``.
+
+    Returns:
+        dict: ``clean`` (cleaned transactions), ``rfm`` (scored customers),
+        ``summary`` (per-cluster averages), ``stats`` (ClusterStats shared by the
+        visualizer), ``index`` (CustomerIndex for the customer table), ``clean_report``
+        (row counts of the cleaning step, including unparseable dates) and
+        ``diagnostics`` (per-stage records of this computation). The frames are shared
+        between reruns and sessions, so callers must treat them as read-only.
+    """
+    segmentor = model_set.core(compact=compact)
+    df_clean = pd.DataFrame()
+    rfm_df = pd.DataFrame()
+    cluster_summary = pd.DataFrame()
+    stats = None
+    index = None
+    clean_report = None
+    with recording() as recorder:
+        if streaming:
+            source = BytesIO(raw_bytes)
+
+            def on_chunk(accumulator):
+                # Bytes consumed by the CSV reader approximate the share of the file read
+                job.report("read_csv", 0.6 * source.tell() / max(len(raw_bytes), 1),
+                           rows_parsed=accumulator.rows_in, rows_kept=accumulator.rows_valid)
+
+            job.report("read_csv", 0.0)
+            rfm_df = segmentor.calculate_rfm_streaming(source, on_chunk=on_chunk)
+            clean_report = rfm_df.attrs.get('clean_report')
+        else:
+            job.report("read_csv", 0.0)
+            with stage("read_csv") as record:
+                df_raw = pd.read_csv(BytesIO(raw_bytes))
+                record["rows_out"] = len(df_raw)
+            job.report("clean_data", 0.3, rows_parsed=len(df_raw))
+            df_clean = segmentor.clean_data(df_raw)
+            del df_raw
+            clean_report = df_clean.attrs.get('clean_report')
+            job.report("calculate_rfm", 0.45, rows_kept=len(df_clean))
+            if not df_clean.empty:
+                rfm_df = segmentor.calculate_rfm(df_clean)
+        job.report("assign_clusters", 0.65, customers=len(rfm_df))
+        if not rfm_df.empty:
+            rfm_df = segmentor.assign_clusters(rfm_df)
+        if probabilities and not rfm_df.empty:
+            job.report("cluster_probabilities", 0.75)
+            rfm_df = segmentor.cluster_probabilities(rfm_df)
+        job.report("cluster_stats", 0.85, scored=len(rfm_df))
+        if not rfm_df.empty:
+            stats = segmentor.cluster_stats(rfm_df)
+            cluster_summary = stats.summary()
+            with stage("customer_index") as record:
+                index = CustomerIndex.from_rfm(rfm_df)
+                record["rows_out"] = len(index)
+    recorder.log(upload=job.key[0][:12], store=model_set.store, model_version=model_set.version)
+    return {"clean": df_clean, "rfm": rfm_df, "summary": cluster_summary, "stats": stats,
+            "index": index, "clean_report": clean_report, "diagnostics": recorder.records}
+
+
+def submit_segmentation(content_hash, model_set, raw_bytes, streaming=False, compact=False,
+                        probabilities=False, retry=False):
+    """
+    Background job segmenting an upload; an existing job for the same upload, store,
+    model version and options is returned instead (running or finished), so reruns
+    and other sessions share it. ``retry`` restarts a cancelled or failed job.
+
+    Raises:
+        JobQueueFull: If too many uploads are already waiting.
+    """
+    key = (content_hash, model_set.store, model_set.version, streaming, compact, probabilities)
+    return job_executor().submit(key, run_segmentation, model_set, raw_bytes, streaming, compact,
+                                 probabilities, retry=retry)
+
+
+def show_job_progress(job):
+    """
+    Progress bar, counters and a cancel button for a queued / running job.
+
+    Renders as a fragment that refreshes every ``JOB_POLL_SECONDS`` without re-running
+    the page, and re-runs the whole page once the job has finished.
+    """
+    @st.fragment(run_every=JOB_POLL_SECONDS)
+    def progress():
+        info = job.snapshot()
+        if job.finished:
+            st.rerun()
+        if info["state"] == QUEUED:
+            st.progress(0.0, text=f"⏳ Đang chờ trong hàng đợi ({info['waiting']:.0f}s) - "
+                                  f"tối đa {MAX_CONCURRENT_JOBS} file được xử lý cùng lúc")
+        else:
+            label = JOB_STAGE_LABELS.get(info["stage"], info["stage"] or "")
+            st.progress(info["fraction"], text=f"🔍 {label}... ({info['elapsed']:.0f}s)")
+        counts = info["counts"]
+        if counts:
+            names = {"rows_parsed": "dòng đã đọc", "rows_kept": "dòng hợp lệ",
+                     "customers": "khách hàng", "scored": "đã phân cụm"}
+            st.caption(" · ".join(f"{counts[k]:,} {v}" for k, v in names.items() if k in counts))
+        if info["cancel_requested"]:
+            st.caption("Đang hủy...")
+        elif st.button("⛔ Hủy xử lý", key=f"cancel_{hash(job.key)}"):
+            job.cancel()
+            st.rerun()
+
+    progress()
+
+
+def run_snapshots(job, model_set, df_clean):
+    """
+    Month-end cluster snapshots of a segmented upload, run as a background job.
+
+    Args:
+        job (Job): The running job (``lib.jobs``).
+        model_set (ModelSet): Store model the upload was segmented with.
+        df_clean (pd.DataFrame): Cleaned transactions from ``run_segmentation`` (read-only).
+
+    Returns:
+        MonthlySnapshots
+    """
+    job.report("monthly_snapshots", 0.0, rows_kept=len(df_clean))
+    with recording() as recorder:
+        snapshots = model_set.core().monthly_snapshots(df_clean)
+    recorder.log(upload=job.key[0][:12], store=model_set.store, model_version=model_set.version)
+    return snapshots
+
+
+def submit_snapshots(content_hash, model_set, df_clean, retry=False):
+    """
+    Background job computing the month-end snapshots of an upload, shared like
+    ``submit_segmentation`` by every rerun and session with the same upload, store and
+    model version.
+
+    Raises:
+        JobQueueFull: If too many jobs are already waiting.
+    """
+    key = (content_hash, model_set.store, model_set.version, "snapshots")
+    return job_executor().submit(key, run_snapshots, model_set, df_clean, retry=retry)
 
 # ------------------------------
 # Segmentation Visualize Class: Handling the display of results
 # ------------------------------
+TABLE_PAGE_SIZES = [50, 100, 500, 1000]
 
 class SegmentationVisualizer:
     @staticmethod
-    def show_summary_info(rfm_df):
+    @instrumented("visualizer.show_summary_info")
+    def show_summary_info(stats):
         """
         Display the summary information of customer segmentation:
         - Number of unique customers and clusters
@@ -167,24 +331,25 @@ class SegmentationVisualizer:
         - Pie and bar charts showing customer distribution by cluster
 
         Args:
-            rfm_df (pd.DataFrame): DataFrame containing RFM metrics and cluster labels.
+            stats (ClusterStats | pd.DataFrame): Precomputed cluster statistics, or the
+                RFM DataFrame with cluster labels to compute them from.
         """
         try:
+            stats = as_cluster_stats(stats)
             st.markdown("### 📌 Cluster Overview")
             col1, col2, col3, col4, col5 = st.columns(5)
             with col1:
-                render_card("Customers", f"{rfm_df['CustomerID'].nunique()}", "👤")
+                render_card("Customers", f"{stats.n_customers}", "👤")
             with col2:
-                render_card("Cluster", f"{rfm_df['Cluster'].nunique()}", "📦")
+                render_card("Cluster", f"{stats.n_clusters}", "📦")
             with col3:
-                render_card("Recency.avg", f"{round(rfm_df['Recency'].mean(), 2)}", "⏰")
+                render_card("Recency.avg", f"{round(stats.means['Recency'], 2)}", "⏰")
             with col4:
-                render_card("Frequency.avg", f"{round(rfm_df['Frequency'].mean(), 2)}", "🔁")
+                render_card("Frequency.avg", f"{round(stats.means['Frequency'], 2)}", "🔁")
             with col5:
-                render_card("Monetary.avg", f"{round(rfm_df['Monetary'].mean(), 2)}", "💰")
+                render_card("Monetary.avg", f"{round(stats.means['Monetary'], 2)}", "💰")
 
-            cluster_counts = rfm_df['Cluster'].value_counts().reset_index()
-            cluster_counts.columns = ['Cluster', 'Số khách hàng']
+            cluster_counts = stats.counts()
 
             col7, col8 = st.columns(2)
             fig_pie = px.pie(cluster_counts, names='Cluster', values='Số khách hàng', hole=0.4, color='Cluster')
@@ -195,14 +360,17 @@ class SegmentationVisualizer:
             st.error(f"Error displaying summary: {e}")
 
     @staticmethod
+    @instrumented("visualizer.plot_rfm_bar")
     def plot_rfm_bar(cluster_summary):
         """
         Create grouped bar chart of RFM metrics per cluster.
 
         Args:
-            cluster_summary (pd.DataFrame): Summary DataFrame with RFM averages per cluster.
+            cluster_summary (pd.DataFrame | ClusterStats): Summary DataFrame with RFM averages per cluster.
         """
         try:
+            if isinstance(cluster_summary, ClusterStats):
+                cluster_summary = cluster_summary.summary()
             st.markdown("### 📉 Chart RFM")
             melted = cluster_summary.rename(columns={'Recency': 'R', 'Frequency': 'F', 'Monetary': 'M'}) \
                                      .melt(id_vars=['Cluster'], var_name='Metric', value_name='Value')
@@ -212,82 +380,143 @@ class SegmentationVisualizer:
             st.error(f"Error generating RFM chart: {e}")
 
     @staticmethod
+    @instrumented("visualizer.plot_cluster_scatter")
     def plot_cluster_scatter(rfm_df):
         """
         Plot scatter chart (Recency vs Frequency), color-coded by Cluster.
 
+        Small frames are drawn point by point. Above ``SCATTER_WEBGL_THRESHOLD``
+        customers the chart renders with WebGL, and above ``SCATTER_MAX_POINTS`` the
+        user picks a stratified per-cluster sample (hover per customer) or density
+        cells (every customer counted), so the payload sent to the browser stays
+        bounded whatever the number of customers.
+
         Args:
             rfm_df (pd.DataFrame): DataFrame containing RFM metrics and cluster labels.
         """
         try:
-            fig_2d = px.scatter(rfm_df, x="Recency", y="Frequency", color="Cluster",
-                                hover_data=["CustomerID", "Monetary"])
+            n_customers = len(rfm_df)
+            if n_customers <= SCATTER_WEBGL_THRESHOLD:
+                fig_2d = px.scatter(rfm_df, x="Recency", y="Frequency", color="Cluster",
+                                    hover_data=["CustomerID", "Monetary"])
+            elif n_customers <= SCATTER_MAX_POINTS or st.radio(
+                    "Cách hiển thị biểu đồ", ["Mẫu phân tầng theo cụm", "Mật độ theo ô"],
+                    horizontal=True, key="scatter_mode") == "Mẫu phân tầng theo cụm":
+                rows = stratified_sample(rfm_df, SCATTER_MAX_POINTS)
+                sample = rfm_df.iloc[rows][["CustomerID", "Recency", "Frequency", "Monetary", "Cluster"]]
+                fig_2d = px.scatter(sample, x="Recency", y="Frequency", color="Cluster",
+                                    hover_data=["CustomerID", "Monetary"], render_mode="webgl")
+                if len(rows) < n_customers:
+                    st.caption(f"Hiển thị mẫu {len(rows):,} / {n_customers:,} khách hàng "
+                               f"(lấy mẫu theo tỷ lệ từng cụm).")
+            else:
+                cells = density_cells(rfm_df)
+                fig_2d = px.scatter(cells, x="Recency", y="Frequency", color="Cluster",
+                                    size="Customers", hover_data=["Customers", "Monetary"],
+                                    render_mode="webgl")
+                st.caption(f"{n_customers:,} khách hàng gộp thành {len(cells):,} ô; "
+                           f"kích thước điểm = số khách hàng trong ô.")
             st.plotly_chart(fig_2d, use_container_width=True)
         except Exception as e:
             st.error(f"Error creating scatter plot: {e}")
 
     @staticmethod
-    def show_cluster_table(rfm_df):
+    @instrumented("visualizer.show_cluster_table")
+    def show_cluster_table(rfm_df, index=None):
         """
         Display an interactive table with filtering by Cluster and CustomerID.
 
+        Filters are answered from a ``CustomerIndex`` (binary search on CustomerID,
+        precomputed row positions per cluster) and only the current page of rows is
+        gathered and sent to the browser, so a search, cluster switch or page turn
+        costs the same for 10k or 10M customers.
+
         Args:
             rfm_df (pd.DataFrame): DataFrame containing RFM metrics and cluster labels.
+            index (CustomerIndex, optional): Index of ``rfm_df`` built with the
+                segmentation; built here if omitted.
         """
         try:
             st.markdown("### 📋 Detailed Report")
-            cluster_options = ['Tất cả'] + sorted(rfm_df['Cluster'].unique().tolist())
+            if index is None:
+                index = CustomerIndex.from_rfm(rfm_df)
+            cluster_options = ['Tất cả'] + index.clusters.tolist()
             selected_cluster = st.selectbox('Chọn nhóm khách hàng', cluster_options)
             search_id = st.text_input("Tìm theo CustomerID")
 
-            filtered_df = rfm_df.copy()
-            if selected_cluster != 'Tất cả':
-                filtered_df = filtered_df[filtered_df['Cluster'] == int(selected_cluster)]
-
+            cluster = None if selected_cluster == 'Tất cả' else int(selected_cluster)
+            customer_id = None
             if search_id:
                 try:
-                    cid = int(search_id)
-                    filtered_df = filtered_df[filtered_df['CustomerID'] == cid]
+                    customer_id = int(search_id)
                 except:
                     st.warning("⚠️ CustomerID must be a number.")
+            rows = index.select(cluster, customer_id)
 
             with st.expander("📋 View detailed data table"):
-                st.dataframe(filtered_df, use_container_width=True)
+                col1, col2 = st.columns(2)
+                page_size = col1.selectbox("Số dòng mỗi trang", TABLE_PAGE_SIZES, key="table_page_size")
+                n_pages = max(1, -(-len(rows) // page_size))
+                # Keyed by the filters so a new filter starts again at page 1
+                page = col2.number_input(f"Trang (1-{n_pages:,})", min_value=1, max_value=n_pages,
+                                         value=1, step=1,
+                                         key=f"table_page_{cluster}_{customer_id}_{page_size}")
+                page_positions, n_pages = page_rows(rows, int(page), page_size)
+                st.dataframe(rfm_df.iloc[page_positions], use_container_width=True)
+                st.caption(f"{len(rows):,} khách hàng · trang {int(page):,}/{n_pages:,}")
         except Exception as e:
             st.error(f"Error displaying data table: {e}")
 
     @staticmethod
-    def show_cluster_summary(rfm_df):
-        try:
-            st.markdown("### 📉 RFM Segments Summary")
-            total = len(rfm_df)
-
-            # Calculate average RFM per cluster
-            summary = rfm_df.groupby('Cluster').agg({
-                'Recency': 'mean',
-                'Frequency': 'mean',
-                'Monetary': 'mean',
-            }).reset_index()
+    @instrumented("visualizer.show_export")
+    def show_export(rfm_df, file_stem="rfm_segments"):
+        """
+        Download button for the full scored table (every column, including probabilities).
 
-            # Count customers per cluster
-            summary['Count'] = rfm_df.groupby('Cluster').size().values
-            summary['(%)'] = round(summary['Count'] / total * 100, 2)
+        The file is only generated when the button is clicked, off the script run, and
+        is written in chunks of ``EXPORT_CHUNK_ROWS`` rows as gzip CSV or Parquet
+        (``lib.export``), so no whole-file CSV string is built.
 
-            # Compute revenue per customer
-            revenue_per_cluster = rfm_df.copy()
-            revenue_per_cluster['Revenue'] = revenue_per_cluster['Frequency'] * revenue_per_cluster['Monetary']
+        Args:
+            rfm_df (pd.DataFrame): Scored customers (the cached segmentation result).
+            file_stem (str): Download file name without extension.
+        """
+        try:
+            st.markdown("### 📦 Xuất kết quả")
+            fmt = st.radio("Định dạng tệp", list(EXPORT_FORMATS), horizontal=True,
+                           format_func=lambda f: EXPORT_FORMATS[f]["label"], key="export_format")
+            st.download_button(
+                label=f"📥 Tải kết quả ({len(rfm_df):,} khách hàng)",
+                data=lambda: export_bytes(rfm_df, fmt),
+                file_name=f"{file_stem}.{fmt}",
+                mime=EXPORT_FORMATS[fmt]["mime"],
+                use_container_width=True
+            )
+            st.caption(f"Tệp được tạo khi bấm tải, ghi theo từng khối {EXPORT_CHUNK_ROWS:,} dòng.")
+        except Exception as e:
+            st.error(f"Error preparing export: {e}")
 
-            # Sum revenue per cluster
-            revenue_summary = revenue_per_cluster.groupby('Cluster')['Revenue'].sum().reset_index()
+    @staticmethod
+    @instrumented("visualizer.show_cluster_summary")
+    def show_cluster_summary(stats):
+        """
+        Display the per-cluster table: RFM averages, customer share and revenue contribution.
 
-            # Merge revenue with summary
-            summary = summary.merge(revenue_summary, on='Cluster')
+        Args:
+            stats (ClusterStats | pd.DataFrame): Precomputed cluster statistics, or the
+                RFM DataFrame with cluster labels to compute them from.
+        """
+        try:
+            stats = as_cluster_stats(stats)
+            st.markdown("### 📉 RFM Segments Summary")
 
-            # Calculate revenue contribution %
-            tong_doanh_thu = summary['Revenue'].sum() if summary['Revenue'].sum() != 0 else 1
-            summary['% Revenue'] = round(summary['Revenue'] / tong_doanh_thu * 100, 2)
+            summary = stats.table[['Cluster', 'Recency', 'Frequency', 'Monetary', 'Count',
+                                   'Share', 'Revenue', 'RevenueShare']]
+            summary = summary.rename(columns={'Share': '(%)', 'RevenueShare': '% Revenue'})
 
             # Format numbers
+            summary['(%)'] = summary['(%)'].round(2)
+            summary['% Revenue'] = summary['% Revenue'].round(2)
             summary['Recency'] = summary['Recency'].round(1)
             summary['Frequency'] = summary['Frequency'].round(1)
             summary['Monetary'] = summary['Monetary'].round(1)
@@ -299,18 +528,19 @@ class SegmentationVisualizer:
         except Exception as e:
             st.error(f"Error in summary table: {e}")
 
-
-
     @staticmethod
+    @instrumented("visualizer.suggest_actions")
     def suggest_actions(cluster_summary, cluster_labels):
         """
         Provide recommended actions and descriptions for each customer cluster.
 
         Args:
-            cluster_summary (pd.DataFrame): Summary data per cluster.
+            cluster_summary (pd.DataFrame | ClusterStats): Summary data per cluster.
             cluster_labels (dict): Dictionary with cluster labels, descriptions, and suggestions.
         """
         try:
+            if isinstance(cluster_summary, ClusterStats):
+                cluster_summary = cluster_summary.summary()
             st.markdown("### 💡 Suggestions")
             for _, row in cluster_summary.iterrows():
                 cluster_id = str(int(row['Cluster']))
@@ -326,6 +556,61 @@ class SegmentationVisualizer:
         except Exception as e:
             st.error(f"Error showing suggestions: {e}")
 
+    @staticmethod
+    @instrumented("visualizer.show_cluster_migration")
+    def show_cluster_migration(snapshots, segments=CLUSTER_MAP):
+        """
+        Display customers per cluster at every month end and the migration matrix
+        into a selected month.
+
+        Args:
+            snapshots (MonthlySnapshots): Month-end snapshots of the transactions.
+            segments (dict): Cluster -> Segment name of the store (``ModelSet.segments``).
+        """
+        try:
+            if not isinstance(snapshots, MonthlySnapshots) or len(snapshots.months) < 2:
+                return
+            st.markdown("### 📆 Cluster Migration by Month")
+            counts = snapshots.cluster_counts(segments).rename_axis('Month').reset_index() \
+                              .melt(id_vars='Month', var_name='Segment', value_name='Customers')
+            fig = px.line(counts, x='Month', y='Customers', color='Segment', markers=True,
+                          title="Number of Customers per Cluster at Month End")
+            st.plotly_chart(fig, use_container_width=True)
+
+            months = [str(m) for m in snapshots.months[1:]][::-1]
+            month = st.selectbox("Chọn tháng (so với cuối tháng trước)", months)
+            matrix = snapshots.migration_matrix(month, segments)
+            fig = px.imshow(matrix, text_auto=True, color_continuous_scale='Blues',
+                            labels=dict(x="To", y="From", color="Customers"),
+                            title=f"Cluster Migration into {month}")
+            st.plotly_chart(fig, use_container_width=True)
+        except Exception as e:
+            st.error(f"Error displaying cluster migration: {e}")
+
+def show_diagnostics(segmentation_records, render_records, report_name="rfm_diagnostics.json",
+                     model_version=None):
+    """
+    Optional diagnostics panel: per-stage wall time, rows in/out and memory delta.
+
+    Args:
+        segmentation_records (list[dict]): Stages of the (cached) segmentation run.
+        render_records (list[dict]): Stages of the current rerun (visualizer methods).
+        report_name (str): File name of the downloadable JSON report.
+        model_version (str, optional): Stored in the report.
+    """
+    st.markdown("### 🩺 Diagnostics")
+    columns = ['stage', 'seconds', 'rows_in', 'rows_out', 'mem_delta_mb', 'rss_mb']
+    st.caption("Segmentation (lần chạy đầu tiên cho file này, kết quả đã được cache)")
+    st.dataframe(pd.DataFrame(segmentation_records, columns=columns), use_container_width=True)
+    st.caption("Hiển thị (lần chạy lại hiện tại)")
+    st.dataframe(pd.DataFrame(render_records, columns=columns), use_container_width=True)
+    report = StageRecorder()
+    report.extend([{**r, "phase": "segmentation"} for r in segmentation_records])
+    report.extend([{**r, "phase": "render"} for r in render_records])
+    st.download_button("📥 Tải báo cáo (.JSON)", data=report.to_json(model_version=model_version),
+                       file_name=report_name, mime="application/json")
+
+
 def render_card(title, value, icon):
     """
     Render a styled metric card with an icon, title, and value.
@@ -347,14 +632,6 @@ def render_card(title, value, icon):
         unsafe_allow_html=True
     )
 
-def prepare_rfm_features(df):
-    df = df.copy()
-    df['Recency'] = df['Recency'].clip(lower=r_bins[0], upper=r_bins[-1])
-    df['Frequency'] = df['Frequency'].clip(lower=f_bins[0], upper=f_bins[-1])
-    df['Monetary'] = df['Monetary'].clip(lower=m_bins[0], upper=m_bins[-1])
-    
-    df['R'] = pd.cut(df['Recency'], bins=r_bins, labels=[4, 3, 2, 1], include_lowest=True).astype(int)
-    df['F'] = pd.cut(df['Frequency'], bins=f_bins, labels=[1, 2, 3, 4], include_lowest=True).astype(int)
-    df['M'] = pd.cut(df['Monetary'], bins=m_bins, labels=[1, 2, 3, 4], include_lowest=True).astype(int)
-    
-    return df[['R', 'F', 'M']]
\ No newline at end of file
+def prepare_rfm_features(df, model_set=None):
+    core = (model_set or load_model_set_cached()).core()
+    return core.prepare_rfm_features(df, core.r_bins, core.f_bins, core.m_bins)
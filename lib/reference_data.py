@@ -0,0 +1,195 @@
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from lib.rfm import parse_dates
+
+
+# ------------------------------
+# Reference dataset (data/rfm_data.csv) in a columnar, memory-mappable file.
+# Uncompressed Arrow IPC (Feather v2): string columns are dictionary-encoded, Date
+# is stored as a timestamp, and only the requested columns are mapped and converted.
+# The file is generated (not committed): it is built from the CSV on first load, or
+# with ``python -m lib.cli convert-reference``.
+# ------------------------------
+REFERENCE_CSV_PATH = "data/rfm_data.csv"
+REFERENCE_PATH = "data/rfm_data.feather"
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+REFERENCE_DTYPES = {
+    'productId': np.int16,
+    'price': np.float64,
+    'Member_number': np.int32,
+    'items': np.int16,
+    'Total_Revenue': np.float64,
+    'month': np.int8,
+}
+CATEGORY_COLUMNS = ['productName', 'Category']
+# Content hashes by (path, mtime_ns, size): an unchanged file is hashed once per process
+_FILE_VERSIONS = {}
+
+
+def _file_version(path):
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    if key not in _FILE_VERSIONS:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            digest.update(f.read())
+        _FILE_VERSIONS[key] = digest.hexdigest()[:12]
+    return _FILE_VERSIONS[key]
+
+
+def read_reference_csv(csv_path=REFERENCE_CSV_PATH, columns=None):
+    """
+    Parse the reference CSV into compact dtypes (the layout of the columnar file).
+
+    Returns:
+        pd.DataFrame: Integer columns narrowed, productName / Category / weekday as
+        categoricals (weekday ordered Monday..Sunday), Date as ``datetime64[s]``.
+    """
+    df = pd.read_csv(csv_path, usecols=columns)
+    for column, dtype in REFERENCE_DTYPES.items():
+        if column in df:
+            df[column] = df[column].astype(dtype)
+    for column in CATEGORY_COLUMNS:
+        if column in df:
+            df[column] = df[column].astype('category')
+    if 'weekday' in df:
+        df['weekday'] = pd.Categorical(df['weekday'], categories=WEEKDAYS, ordered=True)
+    if 'Date' in df:
+        df['Date'] = parse_dates(df['Date'])[0].astype('datetime64[s]')
+    return df
+
+
+def convert_reference_data(csv_path=REFERENCE_CSV_PATH, path=REFERENCE_PATH):
+    """
+    Write the columnar copy of the reference CSV.
+
+    The file is uncompressed so it can be memory-mapped; the CSV content hash, size
+    and mtime are kept in the schema metadata so a stale copy is detected on load.
+
+    Returns:
+        str: Content hash of the source CSV.
+    """
+    source_version = _file_version(csv_path)
+    stat = os.stat(csv_path)
+    table = pa.Table.from_pandas(read_reference_csv(csv_path), preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b"source_version": source_version.encode(),
+        b"source_size": str(stat.st_size).encode(),
+        b"source_mtime_ns": str(stat.st_mtime_ns).encode(),
+    })
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    # A unique temporary name: concurrent first loads must not write the same file
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".rfm_data_", suffix=".tmp")
+    os.close(fd)
+    try:
+        feather.write_feather(table, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return source_version
+
+
+def _source_metadata(path):
+    with pa.memory_map(path) as source:
+        metadata = pa.ipc.open_file(source).schema.metadata or {}
+    return {key.decode(): value.decode() for key, value in metadata.items()
+            if key.startswith(b"source_")}
+
+
+def reference_source_version(path=REFERENCE_PATH):
+    """
+    CSV hash the columnar file was built from (None if the file is missing).
+    """
+    if not os.path.exists(path):
+        return None
+    return _source_metadata(path).get("source_version")
+
+
+def reference_version(path=REFERENCE_PATH, csv_path=REFERENCE_CSV_PATH):
+    """
+    Content hash of the reference data (the CSV's, or the one recorded in the columnar file).
+    """
+    if os.path.exists(csv_path):
+        return _file_version(csv_path)
+    return reference_source_version(path)
+
+
+def reference_is_current(path=REFERENCE_PATH, csv_path=REFERENCE_CSV_PATH):
+    """
+    True if the columnar file exists and matches the CSV (or the CSV is absent).
+
+    An unchanged CSV size and mtime is trusted; otherwise (e.g. after a fresh
+    checkout) the CSV content hash is compared.
+    """
+    if not os.path.exists(path):
+        return False
+    if not os.path.exists(csv_path):
+        return True
+    meta = _source_metadata(path)
+    stat = os.stat(csv_path)
+    if (meta.get("source_size") == str(stat.st_size)
+            and meta.get("source_mtime_ns") == str(stat.st_mtime_ns)):
+        return True
+    return meta.get("source_version") == _file_version(csv_path)
+
+
+def load_reference_data(columns=None, path=REFERENCE_PATH, csv_path=REFERENCE_CSV_PATH):
+    """
+    Load the reference dataset, reading only ``columns``.
+
+    The columnar file is memory-mapped, so unrequested columns are never read and
+    the requested ones come straight from the page cache. When the file is missing
+    or was built from a different CSV it is (re)built from the CSV first; if it cannot
+    be written (e.g. a read-only checkout) the CSV is parsed into the same dtypes instead.
+
+    Args:
+        columns (list, optional): Columns to load; all columns if omitted.
+        path (str): Columnar (Feather) file.
+        csv_path (str): Source CSV, used for the staleness check and as fallback.
+
+    Returns:
+        pd.DataFrame: Reference rows with the ``read_reference_csv`` dtypes.
+    """
+    if not reference_is_current(path, csv_path):
+        try:
+            convert_reference_data(csv_path, path)
+        except OSError:
+            df = read_reference_csv(csv_path, columns)
+            return df[columns] if columns is not None else df
+    table = feather.read_table(path, columns=columns, memory_map=True)
+    return table.to_pandas()
+
+
+def load_reference_rows(columns=None, path=REFERENCE_PATH, csv_path=REFERENCE_CSV_PATH):
+    """
+    Reference rows without exact duplicates, then only ``columns``.
+
+    Duplicates are compared on every column of the file: two purchases of different
+    products by one customer on one day for the same total are different rows, so
+    deduplicating a projection (e.g. Member_number / Date / Total_Revenue) would
+    undercount Frequency and Monetary.
+    """
+    df = load_reference_data(path=path, csv_path=csv_path)
+    df = df[~df.duplicated()]
+    return df[columns] if columns is not None else df
+
+
+def reference_transactions(ref):
+    """
+    Member_number / Date / Total_Revenue of reference rows as CustomerID / InvoiceDate /
+    TotalSales transactions (the input of ``clean_transactions``).
+    """
+    return pd.DataFrame({'CustomerID': ref['Member_number'].astype(np.int64),
+                         'InvoiceDate': ref['Date'],
+                         'TotalSales': ref['Total_Revenue']})
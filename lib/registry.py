@@ -0,0 +1,284 @@
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from lib.artifact import ARTIFACT_PATH
+from lib.core import (BINS_PATH, CLUSTER_LABELS_PATH, MODEL_PATH, SCALER_PATH, SegmentationCore,
+                      load_cluster_labels, load_model_set, segment_map)
+from lib.scoring import LookupScorer, RoutedScorer
+
+
+# ------------------------------
+# Model registry: one artifact set per store / region (and per trained version),
+# loaded lazily, kept in a size-bounded LRU cache and reloaded when a file changes.
+#
+#   models/                      default store (active set), labels in data/cluster_labels.json
+#   models/versions/<version>/   versioned sets written by ``lib.cli train``
+#   models/stores/<store>/       another store: same file names + optional cluster_labels.json
+#   models/stores/<store>/versions/<version>/
+#   <active set directory>/active.json   version being promoted (``lib.training.promote``);
+#                                        remove it when replacing the files by hand
+#
+# cluster_labels.json maps each cluster number (as a string key) to its labels:
+#
+#   {"0": {"name": "...", "desc": "...", "traits": "...", "segment": "Loyal"}, ...}
+#
+# ``name``, ``desc`` and ``traits`` are the texts the app shows. ``segment`` is optional.
+# It is the Segment value written for the cluster (and the P_<segment> probability
+# column); without it the cluster keeps its ``CLUSTER_MAP`` name. The app, the CLI and
+# ``ModelRegistry.assign_clusters`` all take Segment names from the same map.
+# ------------------------------
+DEFAULT_STORE = "default"
+STORES_DIR = "models/stores"
+VERSIONS_DIRNAME = "versions"
+LABELS_FILE = "cluster_labels.json"
+ACTIVE_MANIFEST = "active.json"
+REGISTRY_MAX_ENTRIES = 8
+REGISTRY_MAX_BYTES = 256 * 1024 * 1024
+# Store and version names become path components (and the sets are unpickled), so a
+# name taken from input data must not be able to point outside ``stores_dir``
+NAME_PATTERN = re.compile(r"[A-Za-z0-9_-]+")
+
+
+def check_name(name, kind="store"):
+    """
+    Return ``name`` if it is a valid store / version name (letters, digits, ``_``, ``-``).
+
+    Raises:
+        ValueError: For any other name, e.g. one containing a path separator or ``..``.
+    """
+    if not isinstance(name, str) or not NAME_PATTERN.fullmatch(name):
+        raise ValueError(f"Invalid {kind} name {name!r}: only letters, digits, '_' and '-' are allowed.")
+    return name
+
+
+def read_active_manifest(directory):
+    """
+    The ``active.json`` written by ``lib.training.promote`` in ``directory`` (None if absent).
+
+    Returns:
+        dict | None: ``version`` (content hash of the promoted pickles) and ``source``
+        (the version directory, resolved against ``directory``).
+    """
+    try:
+        with open(os.path.join(directory, ACTIVE_MANIFEST), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return {**manifest, "source": os.path.normpath(os.path.join(directory, manifest["source"]))}
+
+
+def write_active_manifest(directory, version, source):
+    """
+    Atomically record that ``source`` (a version directory) with content hash ``version``
+    is being made the active set of ``directory``.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".active_", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"version": version, "source": os.path.relpath(source, directory)}, f)
+        os.replace(tmp_path, os.path.join(directory, ACTIVE_MANIFEST))
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+class ModelSet:
+    """
+    Loaded artifacts of one store / version: model, scaler, bins, 64-cell scorer and labels.
+
+    Attributes:
+        store (str), version (str): Registry key; ``version`` is the artifacts' content hash.
+        requested_version (str | None): Version directory asked for (None = active set).
+        labels (dict): ``cluster_labels.json`` content of the store.
+        segments (dict): Cluster -> segment name (``segment_map``).
+        signature (tuple): (path, mtime, size) of every file, for change detection.
+        nbytes (int): Size of the files on disk, the cache's memory estimate.
+    """
+
+    def __init__(self, store, requested_version, model, scaler, bins, version, labels, signature):
+        self.store = store
+        self.requested_version = requested_version
+        self.model = model
+        self.scaler = scaler
+        self.bins = bins
+        self.version = version
+        self.labels = labels
+        self.segments = segment_map(labels)
+        self.scorer = LookupScorer(model, scaler, bins)
+        self.signature = signature
+        self.nbytes = sum(size for _, _, size in signature)
+
+    def core(self, compact=False):
+        return SegmentationCore(self.model, self.scaler, self.bins, self.scorer, compact=compact,
+                                version=self.version, segments=self.segments)
+
+
+def _signature(paths):
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        signature.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+class ModelRegistry:
+    """
+    Artifact sets by (store, version), loaded on first use.
+
+    ``get`` stats the set's files on every call (a few microseconds) and reloads the
+    set when any of them changed, so retrained or promoted files are picked up
+    without restarting the process. Loaded sets are kept most recently used last and
+    evicted beyond ``max_entries`` sets or ``max_bytes`` of artifact files (the most
+    recent set is always kept). Thread-safe.
+
+    Args:
+        models_dir (str): Directory of the default store's active set.
+        stores_dir (str): One sub-directory per additional store.
+        labels_path (str): Labels of the default store (and fallback for the others).
+    """
+
+    def __init__(self, models_dir=os.path.dirname(MODEL_PATH), stores_dir=STORES_DIR,
+                 labels_path=CLUSTER_LABELS_PATH, max_entries=REGISTRY_MAX_ENTRIES,
+                 max_bytes=REGISTRY_MAX_BYTES):
+        self.models_dir = models_dir
+        self.stores_dir = stores_dir
+        self.labels_path = labels_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def stores(self):
+        """
+        Store names with an artifact set, the default store first.
+        """
+        stores = []
+        if os.path.isdir(self.stores_dir):
+            stores = sorted(name for name in os.listdir(self.stores_dir)
+                            if NAME_PATTERN.fullmatch(name) and os.path.exists(os.path.join(self.stores_dir, name,
+                                                           os.path.basename(BINS_PATH))))
+        return [DEFAULT_STORE] + [s for s in stores if s != DEFAULT_STORE]
+
+    def store_dir(self, store=DEFAULT_STORE):
+        """
+        Directory of ``store``'s active set.
+
+        Raises:
+            ValueError: If ``store`` is not a valid name (see ``check_name``).
+        """
+        check_name(store)
+        return self.models_dir if store == DEFAULT_STORE else os.path.join(self.stores_dir, store)
+
+    def paths(self, store=DEFAULT_STORE, version=None):
+        """
+        Files of one set: ``model``, ``scaler``, ``bins``, ``artifact``, ``labels`` and the
+        ``manifest`` of the last promote.
+
+        Raises:
+            ValueError: If ``store`` or ``version`` is not a valid name (see ``check_name``).
+        """
+        directory = self.store_dir(store)
+        if version is not None:
+            directory = os.path.join(directory, VERSIONS_DIRNAME, check_name(version, "version"))
+        labels = os.path.join(self.store_dir(store), LABELS_FILE)
+        return {
+            "model": os.path.join(directory, os.path.basename(MODEL_PATH)),
+            "scaler": os.path.join(directory, os.path.basename(SCALER_PATH)),
+            "bins": os.path.join(directory, os.path.basename(BINS_PATH)),
+            "artifact": os.path.join(directory, os.path.basename(ARTIFACT_PATH)),
+            "labels": labels if os.path.exists(labels) else self.labels_path,
+            "manifest": os.path.join(directory, ACTIVE_MANIFEST),
+        }
+
+    def get(self, store=DEFAULT_STORE, version=None):
+        """
+        The set of ``store`` (``version`` directory, or the active set when None).
+
+        ``lib.training.promote`` replaces the active files one at a time after writing
+        ``active.json``. When the loaded files' content hash differs from the manifest's
+        version the files are a mix of two sets (a promote is in progress), and the
+        complete set is loaded from the manifest's version directory instead. The
+        manifest is read after the files, so a promote that starts during the load is
+        always detected.
+
+        Raises:
+            ValueError: If ``store`` or ``version`` is not a valid name.
+            KeyError: If the store / version has no artifacts.
+        """
+        paths = self.paths(store, version)
+        if not os.path.exists(paths["bins"]) and not os.path.exists(paths["artifact"]):
+            raise KeyError(f"No model artifacts for store '{store}'"
+                           f"{f' version {version}' if version else ''}.")
+        signature = _signature(paths.values())
+        key = (store, version)
+        with self._lock:
+            model_set = self._sets.get(key)
+            if model_set is not None and model_set.signature == signature:
+                self._sets.move_to_end(key)
+                return model_set
+            files = (paths["artifact"], paths["model"], paths["scaler"], paths["bins"])
+            model, scaler, bins, loaded_version = load_model_set(*files)
+            manifest = read_active_manifest(os.path.dirname(paths["model"])) if version is None else None
+            if (manifest is not None and manifest["version"] != loaded_version
+                    and os.path.isdir(manifest["source"])):
+                model, scaler, bins, loaded_version = load_model_set(
+                    *(os.path.join(manifest["source"], os.path.basename(f)) for f in files))
+            labels = load_cluster_labels(paths["labels"]) if os.path.exists(paths["labels"]) else {}
+            model_set = ModelSet(store, version, model, scaler, bins, loaded_version, labels, signature)
+            self._sets[key] = model_set
+            self._sets.move_to_end(key)
+            self._evict()
+            return model_set
+
+    def loaded(self):
+        """
+        Keys of the cached sets, least recently used first.
+        """
+        with self._lock:
+            return list(self._sets)
+
+    def clear(self):
+        with self._lock:
+            self._sets.clear()
+
+    def _evict(self):
+        while len(self._sets) > 1 and (len(self._sets) > self.max_entries
+                                       or sum(s.nbytes for s in self._sets.values()) > self.max_bytes):
+            self._sets.popitem(last=False)
+
+    def assign_clusters(self, rfm_df, store_column='Store', version=None):
+        """
+        Cluster and Segment of customers from several stores, each under its own model.
+
+        Rows are routed by ``store_column`` (missing -> default store) and scored in
+        one vectorized pass (``RoutedScorer``); segment names come from each store's
+        labels. Store values are validated with ``check_name`` before any file is opened.
+
+        Raises:
+            ValueError: If a store value is not a valid name.
+            KeyError: If a store has no artifacts.
+
+        Returns:
+            pd.DataFrame: ``rfm_df`` with Cluster and Segment columns.
+        """
+        stores = rfm_df[store_column].astype('string').fillna(DEFAULT_STORE).to_numpy(dtype=object)
+        codes, names = pd.factorize(stores)
+        model_sets = [self.get(store, version) for store in names]
+        clusters = RoutedScorer([m.scorer for m in model_sets]).predict(rfm_df, codes)
+        n_clusters = max(int(clusters.max()) + 1 if len(clusters) else 0,
+                         max(len(m.segments) for m in model_sets))
+        segment_table = np.array([[m.segments.get(k) for k in range(n_clusters)] for m in model_sets],
+                                 dtype=object)
+        rfm_df['Cluster'] = clusters
+        rfm_df['Segment'] = segment_table[codes, clusters]
+        return rfm_df
@@ -0,0 +1,569 @@
+import glob
+import os
+import shutil
+import tempfile
+import warnings
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+
+# ------------------------------
+# Date parsing: detect one format from a sample, parse each distinct string once
+# ------------------------------
+DATE_FORMATS = [
+    '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M:%S', '%Y/%m/%d',
+    '%m/%d/%Y', '%m/%d/%Y %H:%M', '%m/%d/%Y %H:%M:%S',
+    '%d/%m/%Y', '%d/%m/%Y %H:%M', '%d/%m/%Y %H:%M:%S',
+    '%d-%m-%Y', '%d.%m.%Y', '%Y%m%d',
+]
+DATE_SAMPLE_SIZE = 500
+
+
+def detect_date_format(values, sample_size=DATE_SAMPLE_SIZE):
+    """
+    Pick the format that parses the most values of an evenly spaced sample.
+
+    The format pandas would infer from the first value is tried first, then
+    ``DATE_FORMATS`` in order (month-first before day-first, like ``dayfirst=False``).
+
+    Args:
+        values (array-like): Distinct date strings (missing values are ignored).
+        sample_size (int): Number of values tested against each candidate.
+
+    Returns:
+        str | None: The best format, or None when no candidate parses any sampled value.
+    """
+    values = pd.Series(values, dtype=object).dropna()
+    if values.empty:
+        return None
+    step = max(1, len(values) // sample_size)
+    sample = values.iloc[::step].iloc[:sample_size].astype(str)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)
+        guessed = guess_datetime_format(sample.iloc[0])
+    candidates = ([guessed] if guessed else []) + [f for f in DATE_FORMATS if f != guessed]
+
+    best, best_parsed = None, 0
+    for fmt in candidates:
+        parsed = pd.to_datetime(sample, format=fmt, errors='coerce').notna().sum()
+        if parsed > best_parsed:
+            best, best_parsed = fmt, parsed
+            if parsed == len(sample):
+                break
+    return best
+
+
+def sample_date_format(source, column='InvoiceDate', sample_size=DATE_SAMPLE_SIZE):
+    """
+    Detect the date format of a CSV from lines spread evenly over the whole file.
+
+    Chunks or byte ranges of a file sorted by date can each hold only ambiguous
+    dates (every day <= 12 also parses month-first), so detecting per slice can
+    pick different formats for different slices. Detect once here and pass the
+    format to every slice instead. Lines are found by seeking to evenly spaced
+    byte offsets, so quoted fields must not contain newlines.
+
+    Args:
+        source (str | file-like): CSV path, or a seekable buffer (its position is restored).
+        column (str): Date column.
+        sample_size (int): Number of lines sampled.
+
+    Returns:
+        str | None: The detected format, or None when the sample has no parseable date.
+    """
+    f = open(source, 'rb') if isinstance(source, (str, os.PathLike)) else source
+    start = f.tell()
+    try:
+        f.seek(0)
+        header = f.readline()
+        data_start = f.tell()
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        lines = []
+        for i in range(sample_size):
+            offset = data_start + (size - data_start) * i // sample_size
+            f.seek(offset)
+            if offset > data_start:
+                f.readline()  # finish the line that straddles ``offset``
+            line = f.readline()
+            if line:
+                lines.append(line)
+    finally:
+        if f is source:
+            f.seek(start)
+        else:
+            f.close()
+    text = [line.decode('utf-8', errors='replace') if isinstance(line, bytes) else line
+            for line in [header] + lines]
+    text = [line if line.endswith('\n') else line + '\n' for line in text]
+    try:
+        sample = pd.read_csv(StringIO(''.join(text)), dtype=str, usecols=[column])[column]
+    except (ValueError, pd.errors.ParserError):
+        return None
+    return detect_date_format(sample.dropna().unique(), sample_size)
+
+
+def parse_dates(values, date_format=None):
+    """
+    Convert a column of date strings, parsing every distinct string only once.
+
+    Transaction files repeat a few hundred to a few thousand distinct dates over
+    millions of rows, so the column is factorized, the uniques are parsed with a
+    single explicit format and the result is mapped back through the codes.
+    Already-datetime columns are returned unchanged.
+
+    Args:
+        values (pd.Series): Raw date column.
+        date_format (str, optional): Skip detection and use this format.
+
+    Returns:
+        tuple: (parsed Series, number of rows that are missing or failed to parse,
+        format used or None)
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values, int(values.isna().sum()), None
+    if not (pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values)):
+        parsed = pd.to_datetime(values, errors='coerce')
+        return parsed, int(parsed.isna().sum()), None
+
+    codes, uniques = pd.factorize(values)
+    if date_format is None:
+        date_format = detect_date_format(uniques)
+    if date_format is None:
+        parsed_uniques = pd.to_datetime(uniques, errors='coerce')
+    else:
+        parsed_uniques = pd.to_datetime(uniques, format=date_format, errors='coerce')
+    parsed = pd.Series(parsed_uniques.array.take(codes, allow_fill=True),
+                       index=values.index, name=values.name)
+    return parsed, int(parsed.isna().sum()), date_format
+
+
+# ------------------------------
+# Transaction cleaning
+# ------------------------------
+INT32_MAX = np.iinfo(np.int32).max
+
+
+def _customer_ids(values, compact=False):
+    ids = pd.to_numeric(values, errors='coerce').fillna(0)
+    if compact and len(ids) and ids.min() >= -INT32_MAX and ids.max() <= INT32_MAX:
+        return ids.astype(np.int32)
+    return ids.astype(int)
+
+
+def duplicated_rows(df):
+    """
+    Exact ``df.duplicated()`` (keep first) with a smaller working set.
+
+    Rows are first hashed to 64 bits; only rows whose hash occurs more than once
+    (the duplicates plus their first occurrences, and any hash collisions) go
+    through the full multi-column comparison. The full comparison builds a hash
+    table over every row and column, which is the peak of the cleaning step.
+
+    Returns:
+        np.ndarray: Boolean mask, True for rows repeating an earlier row.
+    """
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    candidates = np.flatnonzero(pd.Series(hashes).duplicated(keep=False).to_numpy())
+    del hashes
+    duplicated = np.zeros(len(df), dtype=bool)
+    if len(candidates):
+        duplicated[candidates] = df.take(candidates).duplicated().to_numpy()
+    return duplicated
+
+
+def clean_transactions(df, drop_duplicates=True, compact=False, date_format=None):
+    """
+    Coerce the CustomerID / InvoiceDate / TotalSales columns and drop unusable rows.
+
+    Rows with an unparseable date or non-positive sales are removed, then exact
+    duplicate rows (across all columns) are dropped. Row counts of each step are
+    stored in ``result.attrs['clean_report']``: rows_in, invalid_dates,
+    invalid_sales, duplicates, rows_out and the detected date_format.
+
+    Both filters are combined into one row mask and applied with a single take, and
+    when no row is dropped the input frame itself is returned without a copy.
+    Exact duplicates share their validity, so flagging duplicates before filtering
+    keeps the same rows as ``drop_duplicates`` after it. In compact mode sales are
+    narrowed to float32 after duplicates are flagged (rows that differ below float32
+    precision are not merged) and before the take, which then copies the narrow column.
+
+    Args:
+        df (pd.DataFrame): Raw transactions; the three key columns are converted in place.
+        drop_duplicates (bool): Set to False when duplicates are handled by the caller.
+        compact (bool): Store CustomerID as int32 (when the ids fit) and TotalSales as float32.
+        date_format (str, optional): InvoiceDate format; detected from ``df`` when None.
+            Pass it when ``df`` is one chunk of a larger file (see ``sample_date_format``).
+
+    Returns:
+        pd.DataFrame: Cleaned transactions.
+    """
+    rows_in = len(df)
+    df['CustomerID'] = _customer_ids(df['CustomerID'], compact)
+    df['TotalSales'] = pd.to_numeric(df['TotalSales'], errors='coerce').fillna(0).astype(float)
+    df['InvoiceDate'], invalid_dates, date_format = parse_dates(df['InvoiceDate'], date_format)
+
+    dated = df['InvoiceDate'].notna().to_numpy()
+    keep = dated & (df['TotalSales'] > 0).to_numpy()
+    rows_valid = int(keep.sum())
+    if drop_duplicates:
+        keep &= ~duplicated_rows(df)
+    if compact:
+        df['TotalSales'] = df['TotalSales'].astype(np.float32)
+    if not keep.all():
+        df = df[keep]
+    df.attrs['clean_report'] = {
+        'rows_in': rows_in,
+        'invalid_dates': invalid_dates,
+        'invalid_sales': int(dated.sum()) - rows_valid,
+        'duplicates': rows_valid - len(df),
+        'rows_out': len(df),
+        'date_format': date_format,
+    }
+    return df
+
+
+# ------------------------------
+# RFM aggregation engine: vectorized per-customer Recency / Frequency / Monetary
+# ------------------------------
+RFM_COLUMNS = ['CustomerID', 'Recency', 'Frequency', 'Monetary']
+
+
+def aggregate_customers(df):
+    """
+    Collapse cleaned transactions into one row per customer in a single groupby pass.
+
+    Args:
+        df (pd.DataFrame): Cleaned transactions with CustomerID, InvoiceDate, TotalSales.
+
+    Returns:
+        pd.DataFrame: CustomerID, LastPurchase, Frequency, Monetary (sorted by CustomerID).
+    """
+    state = df.groupby('CustomerID', sort=True).agg(
+        LastPurchase=('InvoiceDate', 'max'),
+        Frequency=('InvoiceDate', 'size'),
+        Monetary=('TotalSales', 'sum')
+    ).reset_index()
+    # float32 sales (compact mode) are still totalled as float64
+    state['Monetary'] = state['Monetary'].fillna(0).astype(np.float64)
+    return state
+
+
+def rfm_from_state(state, reference_date):
+    """
+    Turn per-customer state into RFM metrics relative to a reference date.
+
+    Recency is counted in whole calendar days, i.e. both timestamps are truncated
+    to midnight before subtracting, the same as comparing ``.date()`` values.
+
+    Args:
+        state (pd.DataFrame): Output of ``aggregate_customers``.
+        reference_date (datetime-like): Date Recency is measured from.
+
+    Returns:
+        pd.DataFrame: CustomerID, Recency, Frequency, Monetary.
+    """
+    reference_date = pd.Timestamp(reference_date).normalize()
+    rfm_df = state[['CustomerID', 'Frequency', 'Monetary']].copy()
+    rfm_df.insert(1, 'Recency', (reference_date - state['LastPurchase'].dt.normalize()).dt.days)
+    return rfm_df
+
+
+def aggregate_rfm(df, reference_date=None):
+    """
+    Compute RFM metrics for every customer without any per-group Python code.
+
+    Args:
+        df (pd.DataFrame): Cleaned transactions with CustomerID, InvoiceDate, TotalSales.
+        reference_date (datetime-like, optional): Defaults to the latest InvoiceDate in ``df``.
+
+    Returns:
+        pd.DataFrame: CustomerID, Recency, Frequency, Monetary.
+    """
+    if reference_date is None:
+        reference_date = df['InvoiceDate'].max()
+    return rfm_from_state(aggregate_customers(df), reference_date)
+
+
+def compact_rfm(rfm_df):
+    """
+    Downcast Recency and Frequency to int32 in place (Monetary stays float64).
+    """
+    for column in ('Recency', 'Frequency'):
+        rfm_df[column] = rfm_df[column].astype(np.int32)
+    return rfm_df
+
+
+# ------------------------------
+# Streaming ingestion: chunked CSV -> per-customer accumulator
+# ------------------------------
+DEFAULT_CHUNKSIZE = 200_000
+DEFAULT_SPILL_PARTITIONS = 16
+# Most rows ``RFMAccumulator.finish`` loads at once; larger partitions are split again
+DEFAULT_PARTITION_ROWS = 1_000_000
+MAX_SPLIT_DEPTH = 4
+
+
+def merge_customer_states(*states):
+    """
+    Combine partial per-customer states (LastPurchase max, Frequency/Monetary sums).
+
+    Args:
+        *states (pd.DataFrame): Outputs of ``aggregate_customers``.
+
+    Returns:
+        pd.DataFrame: One row per CustomerID, sorted by CustomerID.
+    """
+    states = [s for s in states if s is not None and not s.empty]
+    if not states:
+        return pd.DataFrame({
+            'CustomerID': pd.Series(dtype='int64'),
+            'LastPurchase': pd.Series(dtype='datetime64[ns]'),
+            'Frequency': pd.Series(dtype='int64'),
+            'Monetary': pd.Series(dtype='float64'),
+        })
+    if len(states) == 1:
+        return states[0]
+    return pd.concat(states, ignore_index=True).groupby('CustomerID', sort=True).agg(
+        LastPurchase=('LastPurchase', 'max'),
+        Frequency=('Frequency', 'sum'),
+        Monetary=('Monetary', 'sum')
+    ).reset_index()
+
+
+class RFMAccumulator:
+    """
+    Running per-customer state fed one cleaned chunk at a time.
+
+    Without duplicate removal every chunk is folded straight into one row per
+    customer (last purchase, count, sum), so memory grows with customers only.
+
+    With ``drop_duplicates=True`` (the default) a duplicate can arrive in any later
+    chunk, so cleaned chunks are first spilled to ``n_partitions`` temporary files
+    chosen by a hash of CustomerID, as ``lib.cli score`` does. All rows of a customer,
+    and hence all copies of a row, land in the same partition; ``finish`` then runs
+    ``DataFrame.drop_duplicates`` (a full comparison of every column, no hashing
+    shortcut) on one partition at a time and aggregates it. The result is exactly
+    ``drop_duplicates`` on the whole file.
+
+    A partition holding more than ``partition_rows`` rows is split before it is
+    loaded: its spill files are read in batches of about ``partition_rows`` rows and
+    re-spilled into ``n_partitions`` sub-partitions by the next digits of the
+    CustomerID hash, recursively (at most ``MAX_SPLIT_DEPTH`` levels). Peak memory of
+    ``finish`` is therefore about ``partition_rows`` rows (plus one spilled chunk
+    slice) and the per-customer state, however long the file. Limits: a single customer's rows cannot be split, so a
+    customer with more than ``partition_rows`` rows is still loaded whole; the spill
+    files take about as much disk as the cleaned rows, and each split level rewrites
+    the rows of the partitions it splits once.
+
+    Every chunk is parsed with one InvoiceDate format: ``date_format`` if given
+    (``stream_rfm`` samples it from the whole file), else the format detected in
+    the first chunk.
+
+    With ``compact=True`` chunks are cleaned as in ``clean_transactions(compact=True)``
+    (int32 CustomerID when the ids fit, float32 TotalSales). Sales are narrowed before
+    the spilled rows are compared, so rows that differ only below float32 precision
+    count as duplicates here.
+
+    Attributes:
+        rows_in (int): Raw rows seen.
+        rows_valid (int): Rows left after cleaning, before duplicate removal.
+        rows_kept (int): Rows aggregated; with ``drop_duplicates`` only final after ``finish``.
+        invalid_dates (int): Rows whose InvoiceDate was missing or unparseable.
+        date_format (str | None): InvoiceDate format used for every chunk.
+        max_partition_rows (int): Most rows ``finish`` deduplicated at once.
+    """
+
+    def __init__(self, drop_duplicates=True, n_partitions=DEFAULT_SPILL_PARTITIONS, spill_dir=None,
+                 date_format=None, compact=False, partition_rows=DEFAULT_PARTITION_ROWS):
+        self.drop_duplicates = drop_duplicates
+        self.compact = compact
+        self.date_format = date_format
+        self.n_partitions = n_partitions
+        self.partition_rows = partition_rows
+        self.max_partition_rows = 0
+        self.rows_in = 0
+        self.rows_valid = 0
+        self.rows_kept = 0
+        self.invalid_dates = 0
+        self._state = merge_customer_states()
+        self._spill_parent = spill_dir
+        self._spill_dir = None
+        self._n_spilled = 0
+        self._partition_sizes = {}
+        self._finished = not drop_duplicates
+
+    def _spill(self, chunk, prefix="p", depth=0):
+        """
+        Write ``chunk`` to the files of partitions ``<prefix><i>`` and count their rows;
+        ``i`` is base-``n_partitions`` digit ``depth`` of the 64-bit CustomerID hash, so
+        each split level partitions by bits the levels above did not use.
+        """
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="rfm_stream_", dir=self._spill_parent)
+        # Hash int64 ids: a chunk narrowed to int32 must map a customer to the same partition
+        ids = chunk['CustomerID'].to_numpy(np.int64)
+        n = np.uint64(self.n_partitions)
+        part = pd.util.hash_array(ids) // n ** np.uint64(depth) % n
+        for p in np.unique(part):
+            name = f"{prefix}{int(p)}"
+            rows = chunk[part == p]
+            rows.to_pickle(os.path.join(self._spill_dir, f"{name}_c{self._n_spilled}.pkl"))
+            self._partition_sizes[name] = self._partition_sizes.get(name, 0) + len(rows)
+        self._n_spilled += 1
+
+    def _split(self, name, depth):
+        # Spill files are batched up to ``partition_rows`` rows, so the sub-partitions
+        # ``<name>.<i>`` get few, larger files and memory stays within the budget
+        batch, rows = [], 0
+        for path in sorted(glob.glob(os.path.join(self._spill_dir, f"{name}_c*.pkl"))):
+            batch.append(pd.read_pickle(path))
+            rows += len(batch[-1])
+            os.remove(path)
+            if rows >= self.partition_rows:
+                self._spill(pd.concat(batch, ignore_index=True), f"{name}.", depth)
+                batch, rows = [], 0
+        if batch:
+            self._spill(pd.concat(batch, ignore_index=True), f"{name}.", depth)
+        return [f"{name}.{i}" for i in range(self.n_partitions)]
+
+    def update(self, chunk):
+        """
+        Clean a raw chunk and fold it into the running state (or spill it).
+
+        Args:
+            chunk (pd.DataFrame): Raw transactions (same columns for every chunk).
+        """
+        if self._finished and self.drop_duplicates:
+            raise RuntimeError("RFMAccumulator.update called after finish().")
+        self.rows_in += len(chunk)
+        chunk = clean_transactions(chunk, drop_duplicates=False, compact=self.compact,
+                                   date_format=self.date_format)
+        if self.date_format is None:
+            self.date_format = chunk.attrs['clean_report']['date_format']
+        self.invalid_dates += chunk.attrs['clean_report']['invalid_dates']
+        self.rows_valid += len(chunk)
+        if chunk.empty:
+            return
+        if self.drop_duplicates:
+            self._spill(chunk)
+        else:
+            self.rows_kept += len(chunk)
+            self._state = merge_customer_states(self._state, aggregate_customers(chunk))
+
+    def finish(self):
+        """
+        Deduplicate and aggregate the spilled partitions (once), then remove the spill files.
+        """
+        if self._finished:
+            return self
+        try:
+            states = []
+            pending = [(f"p{p}", 0) for p in reversed(range(self.n_partitions))]
+            while pending:
+                name, depth = pending.pop()
+                size = self._partition_sizes.get(name, 0)
+                if not size:
+                    continue
+                if size > self.partition_rows and depth < MAX_SPLIT_DEPTH:
+                    children = self._split(name, depth + 1)
+                    # A partition that did not split (one customer) is loaded as it is
+                    next_depth = MAX_SPLIT_DEPTH if size in map(self._partition_sizes.get, children) \
+                        else depth + 1
+                    pending.extend((child, next_depth) for child in reversed(children))
+                    continue
+                parts = sorted(glob.glob(os.path.join(self._spill_dir, f"{name}_c*.pkl")))
+                df = pd.concat([pd.read_pickle(f) for f in parts], ignore_index=True)
+                self.max_partition_rows = max(self.max_partition_rows, len(df))
+                df = df.drop_duplicates()
+                self.rows_kept += len(df)
+                states.append(aggregate_customers(df))
+            # Partitions hold disjoint customers: concatenating their states is the merge
+            self._state = (pd.concat(states, ignore_index=True).sort_values('CustomerID', ignore_index=True)
+                           if states else merge_customer_states())
+            self._finished = True
+        finally:
+            self.close()
+        return self
+
+    def close(self):
+        """
+        Remove the spill files (also after an error or a cancelled read).
+        """
+        if self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+
+    def state(self):
+        return self.finish()._state
+
+    def report(self):
+        """
+        Row counts in the ``clean_transactions`` report layout, over all chunks so far.
+        """
+        return {'rows_in': self.rows_in, 'invalid_dates': self.invalid_dates,
+                'invalid_sales': self.rows_in - self.invalid_dates - self.rows_valid,
+                'duplicates': self.rows_valid - self.rows_kept, 'rows_out': self.rows_kept,
+                'date_format': self.date_format}
+
+    def rfm(self, reference_date=None):
+        """
+        RFM metrics for every customer seen so far.
+
+        Args:
+            reference_date (datetime-like, optional): Defaults to the latest purchase seen.
+        """
+        state = self.state()
+        if reference_date is None:
+            reference_date = state['LastPurchase'].max()
+        rfm_df = rfm_from_state(state, reference_date)
+        if self.compact:
+            # Chunks narrow their ids independently; narrow the combined column once
+            rfm_df['CustomerID'] = _customer_ids(rfm_df['CustomerID'], compact=True)
+        return rfm_df
+
+
+def stream_rfm(source, chunksize=DEFAULT_CHUNKSIZE, drop_duplicates=True, on_chunk=None,
+               date_format=None, compact=False):
+    """
+    Compute RFM from a CSV without loading the whole file.
+
+    Columns other than CustomerID and TotalSales are read as text so that duplicate
+    detection compares the same representation in every chunk (the two numeric key
+    columns are coerced to int/float by ``clean_transactions`` anyway).
+
+    Args:
+        source (str | file-like): CSV path or buffer.
+        chunksize (int): Rows per chunk.
+        drop_duplicates (bool): Remove duplicate rows across the whole file (spills the
+            cleaned rows to temporary files; see ``RFMAccumulator``).
+        on_chunk (callable, optional): Called with the accumulator after every chunk
+            (progress reporting; an exception raised there stops the read).
+        date_format (str, optional): InvoiceDate format of the whole file; sampled from
+            paths and seekable buffers with ``sample_date_format`` when None.
+        compact (bool): Clean chunks with ``compact=True`` (see ``RFMAccumulator``).
+
+    Returns:
+        tuple: (rfm_df, accumulator) - the accumulator exposes row counts and state.
+    """
+    header = pd.read_csv(source, nrows=0).columns
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    seekable = isinstance(source, (str, os.PathLike)) or (hasattr(source, 'seekable') and source.seekable())
+    if date_format is None and seekable and 'InvoiceDate' in header:
+        date_format = sample_date_format(source)
+    text_columns = {c: str for c in header if c not in ('CustomerID', 'TotalSales')}
+    accumulator = RFMAccumulator(drop_duplicates=drop_duplicates, date_format=date_format,
+                                 compact=compact)
+    try:
+        for chunk in pd.read_csv(source, chunksize=chunksize, dtype=text_columns):
+            accumulator.update(chunk)
+            if on_chunk is not None:
+                on_chunk(accumulator)
+        return accumulator.rfm(), accumulator
+    finally:
+        accumulator.close()
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+
+# ------------------------------
+# Bounded-size scatter data for large customer frames: a stratified per-cluster
+# sample (point-level hover) or per-cluster density cells (every customer counted).
+# ------------------------------
+SCATTER_WEBGL_THRESHOLD = 5_000
+SCATTER_MAX_POINTS = 50_000
+SCATTER_MIN_PER_CLUSTER = 500
+SCATTER_DENSITY_BINS = 60
+
+
+def stratified_sample(rfm_df, n=SCATTER_MAX_POINTS, by='Cluster',
+                      min_per_group=SCATTER_MIN_PER_CLUSTER, random_state=0):
+    """
+    Row positions of a per-group sample of about ``n`` rows.
+
+    Each group keeps its share of ``n`` (at least ``min_per_group`` rows, or the
+    whole group if smaller), so small clusters stay visible next to large ones.
+    Frames with at most ``n`` rows are returned whole.
+
+    Returns:
+        np.ndarray: Sorted row positions into ``rfm_df``.
+    """
+    n_rows = len(rfm_df)
+    if n_rows <= n:
+        return np.arange(n_rows)
+    codes, _ = pd.factorize(rfm_df[by].to_numpy())
+    counts = np.bincount(codes)
+    quota = np.minimum(counts, np.maximum(min_per_group, n * counts // n_rows))
+
+    # Shuffle once, then keep the first ``quota`` rows of every group in shuffled order
+    order = np.random.default_rng(random_state).permutation(n_rows)
+    grouped = order[np.argsort(codes[order], kind='stable')]
+    group = codes[grouped]
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    rank = np.arange(n_rows) - starts[group]
+    return np.sort(grouped[rank < quota[group]])
+
+
+def _bin_index(values, n_bins):
+    lo, hi = values.min(), values.max()
+    width = (hi - lo) / n_bins if hi > lo else 1.0
+    index = np.minimum(((values - lo) / width).astype(np.int64), n_bins - 1)
+    return index, lo + (index + 0.5) * width
+
+
+def density_cells(rfm_df, x='Recency', y='Frequency', by='Cluster', n_bins=SCATTER_DENSITY_BINS):
+    """
+    Customers per (group, x bin, y bin) cell over an ``n_bins`` x ``n_bins`` grid.
+
+    The result has at most groups x ``n_bins``**2 rows whatever the number of
+    customers; x / y are the cell centres.
+
+    Returns:
+        pd.DataFrame: ``by``, ``x``, ``y``, Customers, Monetary (mean per cell).
+    """
+    if rfm_df.empty:
+        return pd.DataFrame(columns=[by, x, y, 'Customers', 'Monetary'])
+    codes, groups = pd.factorize(rfm_df[by].to_numpy(), sort=True)
+    ix, x_centre = _bin_index(rfm_df[x].to_numpy(np.float64), n_bins)
+    iy, y_centre = _bin_index(rfm_df[y].to_numpy(np.float64), n_bins)
+    cell = (codes * n_bins + ix) * n_bins + iy
+    cells, first, inverse, counts = np.unique(cell, return_index=True, return_inverse=True,
+                                              return_counts=True)
+    monetary = np.bincount(inverse, weights=rfm_df['Monetary'].to_numpy(np.float64))
+    return pd.DataFrame({
+        by: np.asarray(groups)[cells // (n_bins * n_bins)],
+        x: x_centre[first],
+        y: y_centre[first],
+        'Customers': counts,
+        'Monetary': monetary / counts,
+    })
@@ -0,0 +1,192 @@
+import numpy as np
+import pandas as pd
+
+
+# ------------------------------
+# Lookup-table scorer: after binning every customer is one of 4 x 4 x 4 (R, F, M) cells,
+# so cluster and membership probabilities are computed once per cell and gathered.
+# ------------------------------
+R_LABELS = np.array([4, 3, 2, 1])
+F_LABELS = np.array([1, 2, 3, 4])
+M_LABELS = np.array([1, 2, 3, 4])
+N_CELLS = 64
+DEFAULT_PROBA_CHUNK = 262_144
+
+
+def bin_positions(values, bins):
+    """
+    0-based bin of every value, the same intervals as ``clip`` + ``pd.cut(include_lowest=True)``.
+
+    Intervals are right-closed, ``(b[i], b[i+1]]``, with the first one also including
+    ``b[0]``; values outside ``[b[0], b[-1]]`` fall into the first / last bin as if
+    clipped. That is ``searchsorted(side='left') - 1`` bounded to ``[0, 3]``.
+
+    Args:
+        values (array-like): Raw Recency, Frequency or Monetary values.
+        bins (array-like): Five increasing bin edges.
+
+    Returns:
+        np.ndarray: intp positions in ``0..3``.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if np.isnan(values).any():
+        raise ValueError("Cannot score missing RFM values.")
+    idx = np.searchsorted(np.asarray(bins, dtype=np.float64), values, side='left')
+    idx -= 1
+    return np.clip(idx, 0, 3, out=idx)
+
+
+def bin_scores(values, bins, labels, dtype=np.int64):
+    """
+    Vectorized equivalent of ``clip`` + ``pd.cut(bins, labels, include_lowest=True)``.
+
+    Returns:
+        np.ndarray: Scores taken from ``labels`` (int64 unless ``dtype`` is given).
+    """
+    return labels[bin_positions(values, bins)].astype(dtype)
+
+
+def inverse_distance_probabilities(centers, x_scaled):
+    """
+    Approximate cluster membership from inverse distance to each center (manual mode formula).
+    """
+    distances = np.linalg.norm(centers - x_scaled, axis=1)
+    inv_distances = 1 / (distances + 1e-6)  # tránh chia cho 0
+    return inv_distances / inv_distances.sum()
+
+
+class LookupScorer:
+    """
+    Cluster and probability tables for all 64 (R, F, M) cells, built when artifacts load.
+
+    Cell index is ``(R - 1) * 16 + (F - 1) * 4 + (M - 1)``. The tables are filled with the
+    same ``scaler.transform`` / ``model.predict`` / inverse-distance computations used
+    per customer, so gathered labels and probabilities are identical.
+
+    Args:
+        model: Fitted KMeans model.
+        scaler: Fitted StandardScaler.
+        bins (dict): ``r_bins``, ``f_bins``, ``m_bins`` quartile edges.
+    """
+
+    def __init__(self, model, scaler, bins):
+        self.r_bins = np.asarray(bins["r_bins"], dtype=np.float64)
+        self.f_bins = np.asarray(bins["f_bins"], dtype=np.float64)
+        self.m_bins = np.asarray(bins["m_bins"], dtype=np.float64)
+
+        grid = np.array([(r, f, m) for r in range(1, 5) for f in range(1, 5) for m in range(1, 5)])
+        cells = pd.DataFrame(grid, columns=['R', 'F', 'M'])
+        self.cells = cells
+        cells_scaled = scaler.transform(cells)
+        self.cluster_table = model.predict(cells_scaled)
+        self.proba_table = np.vstack([
+            inverse_distance_probabilities(model.cluster_centers_, cells_scaled[i:i + 1])
+            for i in range(N_CELLS)
+        ])
+        # Confidence = top probability, margin = top minus runner-up, also per cell
+        top2 = np.sort(self.proba_table, axis=1)[:, ::-1][:, :2]
+        self.confidence_table = top2[:, 0]
+        self.margin_table = top2[:, 0] - (top2[:, 1] if top2.shape[1] > 1 else 0)
+
+    @property
+    def n_clusters(self):
+        return self.proba_table.shape[1]
+
+    def features(self, recency, frequency, monetary):
+        """
+        R, F, M scores as three int64 arrays.
+        """
+        return (bin_scores(recency, self.r_bins, R_LABELS),
+                bin_scores(frequency, self.f_bins, F_LABELS),
+                bin_scores(monetary, self.m_bins, M_LABELS))
+
+    def cell_index(self, rfm_df):
+        """
+        Table row for every customer of an RFM frame.
+        """
+        # R labels run 4..1 over the bins, F and M run 1..4
+        cell = 3 - bin_positions(rfm_df['Recency'], self.r_bins)
+        cell *= 16
+        cell += 4 * bin_positions(rfm_df['Frequency'], self.f_bins)
+        cell += bin_positions(rfm_df['Monetary'], self.m_bins)
+        return cell
+
+    def predict(self, rfm_df):
+        return self.cluster_table[self.cell_index(rfm_df)]
+
+    def predict_proba(self, rfm_df):
+        return self.proba_table[self.cell_index(rfm_df)]
+
+    def cell_codes(self, rfm_df, chunk_size=DEFAULT_PROBA_CHUNK):
+        """
+        Table row of every customer as int8, binned ``chunk_size`` customers at a time.
+
+        Binning allocates several intp temporaries per customer; doing it in chunks
+        bounds them, and the result itself costs one byte per customer.
+        """
+        n = len(rfm_df)
+        cell = np.empty(n, dtype=np.int8)
+        for start in range(0, n, chunk_size):
+            stop = min(start + chunk_size, n)
+            cell[start:stop] = self.cell_index(rfm_df.iloc[start:stop])
+        return cell
+
+    def proba_columns(self, rfm_df, chunk_size=DEFAULT_PROBA_CHUNK, dtype=np.float64):
+        """
+        Membership probability of every cluster, then confidence and margin, one column at a time.
+
+        Values are the manual-mode inverse-distance probabilities of each customer's
+        cell; confidence is the top probability and margin its gap to the runner-up.
+        Each column is a single gather from a 64-entry table through ``cell_codes``,
+        so no N x K matrix (let alone N x K distance temporaries) is ever built and
+        the caller can store or write every column before the next one is made.
+
+        Yields:
+            tuple: (cluster number, or ``'Confidence'`` / ``'Margin'``; N values of ``dtype``)
+        """
+        cell = self.cell_codes(rfm_df, chunk_size)
+        for k in range(self.n_clusters):
+            yield k, self.proba_table[:, k].astype(dtype)[cell]
+        yield 'Confidence', self.confidence_table.astype(dtype)[cell]
+        yield 'Margin', self.margin_table.astype(dtype)[cell]
+
+
+class RoutedScorer:
+    """
+    Cluster lookup for rows scored by different models (stores), in one vectorized pass.
+
+    The bin edges and 64-cell cluster tables of every ``LookupScorer`` are stacked,
+    each row gathers the edges and table of its own model by code, and binning is
+    three comparisons per column against the gathered inner edges - the same
+    intervals as ``bin_positions`` (the count of inner edges below the value).
+
+    Args:
+        scorers (list[LookupScorer]): One scorer per model code.
+    """
+
+    def __init__(self, scorers):
+        # models x (R, F, M) x inner edges b[1..3]
+        self.inner_edges = np.stack([np.stack([s.r_bins[1:4], s.f_bins[1:4], s.m_bins[1:4]])
+                                     for s in scorers])
+        self.cluster_table = np.stack([s.cluster_table for s in scorers])
+
+    def cell_index(self, rfm_df, codes):
+        """
+        Table row of every customer under the model ``codes[i]``.
+        """
+        codes = np.asarray(codes, dtype=np.intp)
+        cell = np.zeros(len(codes), dtype=np.intp)
+        for j, (column, weight) in enumerate((('Recency', 16), ('Frequency', 4), ('Monetary', 1))):
+            values = rfm_df[column].to_numpy(np.float64)
+            if np.isnan(values).any():
+                raise ValueError("Cannot score missing RFM values.")
+            pos = np.zeros(len(codes), dtype=np.intp)
+            for e in range(3):
+                pos += values > self.inner_edges[codes, j, e]
+            # R labels run 4..1 over the bins, F and M run 1..4
+            cell += weight * (3 - pos if column == 'Recency' else pos)
+        return cell
+
+    def predict(self, rfm_df, codes):
+        codes = np.asarray(codes, dtype=np.intp)
+        return self.cluster_table[codes, self.cell_index(rfm_df, codes)]
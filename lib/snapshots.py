@@ -0,0 +1,180 @@
+import numpy as np
+import pandas as pd
+
+
+# ------------------------------
+# Month-end RFM snapshots: running per-customer aggregates in one pass over the
+# transactions, every snapshot scored with a single lookup-table gather.
+# ------------------------------
+NEW_CUSTOMER = -1
+EPOCH = np.datetime64('1970-01-01', 'D')
+
+
+class MonthlySnapshots:
+    """
+    Cluster of every customer at every month end, plus month-to-month migrations.
+
+    Snapshot ``s`` is the RFM of the transactions up to the end of month ``s``, with
+    Recency measured from the latest InvoiceDate in that range - the same result as
+    ``aggregate_rfm(df[df['InvoiceDate'] <= month_end])``.
+
+    Transactions are ordered by month once; each month's rows are then scattered
+    into per-customer count, spend and latest-day vectors that are added into running
+    totals, scored with one lookup-table gather and stored as one grid column. The
+    cost is one pass over the transactions plus O(customers x months) array work,
+    instead of one full RFM run per snapshot.
+
+    The running totals are int64 / float64 vectors (one month at a time), so every
+    snapshot is scored from exact values; only the stored grids are narrowed to
+    int32 Recency / Frequency and float32 Monetary (13 bytes per cell with the
+    clusters, about 310 MB for 1M customers x 24 months).
+
+    Attributes:
+        months (pd.PeriodIndex): Snapshot months, first to last month of the data.
+        customer_ids (np.ndarray): Sorted CustomerIDs (matrix rows).
+        recency, frequency (np.ndarray): int32 customers x months; Recency is -1 and
+            Frequency 0 before a customer's first purchase.
+        monetary (np.ndarray): float32 customers x months (0 before the first purchase).
+        clusters (np.ndarray): int8 customers x months, ``NEW_CUSTOMER`` before the
+            first purchase.
+    """
+
+    def __init__(self, months, customer_ids, recency, frequency, monetary, clusters):
+        self.months = months
+        self.customer_ids = customer_ids
+        self.recency = recency
+        self.frequency = frequency
+        self.monetary = monetary
+        self.clusters = clusters
+
+    @classmethod
+    def from_transactions(cls, df, scorer):
+        """
+        Args:
+            df (pd.DataFrame): Cleaned transactions with CustomerID, InvoiceDate, TotalSales.
+            scorer (LookupScorer): Bins and 64-cell cluster table of the current model.
+        """
+        days = df['InvoiceDate'].to_numpy().astype('datetime64[D]')
+        months = days.astype('datetime64[M]')
+        first_month, last_month = months.min(), months.max()
+        n_months = int((last_month - first_month).astype(int)) + 1
+        day_num = (days - EPOCH).astype(np.int64)
+        month_num = (months - first_month).astype(np.int64)
+
+        customer_codes, customer_ids = pd.factorize(df['CustomerID'].to_numpy(), sort=True)
+        n_customers = len(customer_ids)
+        sales = df['TotalSales'].to_numpy(np.float64)
+        # Rows of month s are order[bounds[s]:bounds[s + 1]]
+        order = np.argsort(month_num, kind='stable')
+        bounds = np.searchsorted(month_num[order], np.arange(n_months + 1))
+
+        shape = (n_customers, n_months)
+        recency = np.empty(shape, dtype=np.int32)
+        frequency = np.empty(shape, dtype=np.int32)
+        monetary = np.empty(shape, dtype=np.float32)
+        clusters = np.full(shape, NEW_CUSTOMER, dtype=np.int8)
+        # Running per-customer state at the current month end, at full precision
+        count = np.zeros(n_customers, dtype=np.int64)
+        spend = np.zeros(n_customers, dtype=np.float64)
+        last_day = np.full(n_customers, np.iinfo(np.int64).min)
+        reference_day = np.iinfo(np.int64).min
+        for s in range(n_months):
+            rows = order[bounds[s]:bounds[s + 1]]
+            codes = customer_codes[rows]
+            count += np.bincount(codes, minlength=n_customers)
+            spend += np.bincount(codes, weights=sales[rows], minlength=n_customers)
+            np.maximum.at(last_day, codes, day_num[rows])
+            if len(rows):
+                reference_day = max(reference_day, int(day_num[rows].max()))
+            active = count > 0
+            days_since = reference_day - last_day[active]
+            frequency[:, s] = count
+            monetary[:, s] = spend
+            recency[:, s] = -1
+            recency[active, s] = days_since
+            clusters[active, s] = scorer.predict({'Recency': days_since, 'Frequency': count[active],
+                                                  'Monetary': spend[active]})
+        periods = pd.period_range(pd.Period(str(first_month), 'M'), periods=n_months, freq='M')
+        return cls(periods, np.asarray(customer_ids), recency, frequency, monetary, clusters)
+
+    def snapshot(self, month):
+        """
+        RFM frame (CustomerID, Recency, Frequency, Monetary, Cluster) at one month end.
+        """
+        s = self.months.get_loc(pd.Period(month, 'M'))
+        active = self.clusters[:, s] != NEW_CUSTOMER
+        return pd.DataFrame({
+            'CustomerID': self.customer_ids[active],
+            'Recency': self.recency[active, s],
+            'Frequency': self.frequency[active, s],
+            'Monetary': self.monetary[active, s],
+            'Cluster': self.clusters[active, s],
+        })
+
+    def segment_matrix(self, cluster_map):
+        """
+        Customers x months table of segment names (missing before the first purchase).
+        """
+        categories = [cluster_map[k] for k in sorted(cluster_map)]
+        codes = np.where(self.clusters < len(categories), self.clusters, NEW_CUSTOMER)
+        columns = {str(month): pd.Categorical.from_codes(codes[:, s], categories)
+                   for s, month in enumerate(self.months)}
+        return pd.DataFrame(columns, index=pd.Index(self.customer_ids, name='CustomerID'))
+
+    def migration_counts(self, cluster_map=None):
+        """
+        Customers moving between clusters from each month end to the next.
+
+        Customers without history at the earlier month end are counted with
+        ``From`` = ``NEW_CUSTOMER`` (labelled 'New' when ``cluster_map`` is given).
+
+        Returns:
+            pd.DataFrame: Month (the later month), From, To, Customers; one row per
+            non-empty transition.
+        """
+        n_clusters = int(self.clusters.max()) + 1 if self.clusters.size else 0
+        width = n_clusters + 1  # state 0 is NEW_CUSTOMER
+        frames = []
+        for s in range(1, len(self.months)):
+            before = self.clusters[:, s - 1].astype(np.int64) + 1
+            after = self.clusters[:, s].astype(np.int64) + 1
+            moved = after > 0
+            counts = np.bincount(before[moved] * width + after[moved], minlength=width * width)
+            pairs = np.flatnonzero(counts)
+            frames.append(pd.DataFrame({
+                'Month': str(self.months[s]),
+                'From': pairs // width - 1,
+                'To': pairs % width - 1,
+                'Customers': counts[pairs],
+            }))
+        if not frames:
+            return pd.DataFrame(columns=['Month', 'From', 'To', 'Customers'])
+        result = pd.concat(frames, ignore_index=True)
+        if cluster_map is not None:
+            labels = {NEW_CUSTOMER: 'New', **cluster_map}
+            result['From'] = result['From'].map(labels)
+            result['To'] = result['To'].map(labels)
+        return result
+
+    def migration_matrix(self, month, cluster_map=None):
+        """
+        From x To customer counts into ``month`` from the previous month end.
+        """
+        counts = self.migration_counts(cluster_map)
+        counts = counts[counts['Month'] == str(pd.Period(month, 'M'))]
+        return counts.pivot_table(index='From', columns='To', values='Customers', aggfunc='sum',
+                                  fill_value=0)
+
+    def cluster_counts(self, cluster_map=None):
+        """
+        Customers per cluster at every month end (months x clusters).
+        """
+        n_clusters = int(self.clusters.max()) + 1 if self.clusters.size else 0
+        counts = np.stack([np.bincount(self.clusters[:, s][self.clusters[:, s] >= 0],
+                                       minlength=n_clusters)
+                           for s in range(len(self.months))]) if len(self.months) else \
+            np.zeros((0, n_clusters), dtype=np.int64)
+        columns = [cluster_map.get(k, k) for k in range(n_clusters)] if cluster_map \
+            else list(range(n_clusters))
+        return pd.DataFrame(counts, index=self.months.astype(str), columns=columns)
+
@@ -0,0 +1,235 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from lib.rfm import aggregate_customers
+
+
+# ------------------------------
+# Incremental RFM state: persisted per-customer aggregates for daily appends
+# ------------------------------
+DEFAULT_STATE_PATH = "data/rfm_state.npz"
+
+
+class RFMStateStore:
+    """
+    Per-customer RFM state kept as sorted column arrays and saved as one ``.npz`` file.
+
+    Stored per CustomerID: last purchase day, frequency, monetary, plus the last
+    (R, F, M) scores and cluster, and once for the store the version (content hash)
+    of the model, scaler and bins those clusters came from. Recency is not stored;
+    it is derived from a single ``reference_date``, so moving the reference date
+    shifts Recency for every customer without rewriting any row.
+
+    Customers first seen in a batch are buffered and inserted into the sorted arrays
+    in one pass the next time the store is read (``rfm``, ``rescore``, ``save``), so
+    several merges before a rescore copy the arrays once, not once per batch.
+
+    Typical daily run::
+
+        store = RFMStateStore.load()
+        store.merge(clean_transactions(new_batch_df))
+        store.rescore(CustomerSegmentation())
+        store.save()
+    """
+
+    def __init__(self, path=DEFAULT_STATE_PATH):
+        self.path = path
+        self.customer_id = np.empty(0, dtype=np.int64)
+        self.last_day = np.empty(0, dtype=np.int32)      # days since 1970-01-01
+        self.frequency = np.empty(0, dtype=np.int32)
+        self.monetary = np.empty(0, dtype=np.float64)
+        self.scores = np.zeros((0, 3), dtype=np.int8)     # R, F, M of the last scoring
+        self.cluster = np.empty(0, dtype=np.int8)         # -1 = not scored yet
+        self.reference_day = None
+        self.model_version = None                         # artifacts ``cluster`` came from
+        self._pending = []                                # new customers, not inserted yet
+
+    def __len__(self):
+        self._insert_pending()
+        return len(self.customer_id)
+
+    @classmethod
+    def load(cls, path=DEFAULT_STATE_PATH):
+        """
+        Load the store from ``path``; returns an empty store if the file does not exist yet.
+        """
+        store = cls(path)
+        if not os.path.exists(path):
+            return store
+        with np.load(path) as data:
+            store.customer_id = data["customer_id"]
+            store.last_day = data["last_day"]
+            store.frequency = data["frequency"]
+            store.monetary = data["monetary"]
+            store.scores = data["scores"]
+            store.cluster = data["cluster"]
+            if data["reference_day"].size:
+                store.reference_day = int(data["reference_day"][0])
+            # Files written before the version was stored: clusters of unknown origin
+            if "model_version" in data.files and data["model_version"].size:
+                store.model_version = str(data["model_version"][0])
+        return store
+
+    def save(self, path=None):
+        """
+        Write the store atomically (temporary file + rename).
+        """
+        path = path or self.path
+        self._insert_pending()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        reference = [] if self.reference_day is None else [self.reference_day]
+        model_version = [] if self.model_version is None else [self.model_version]
+        np.savez(tmp_path,
+                 customer_id=self.customer_id,
+                 last_day=self.last_day,
+                 frequency=self.frequency,
+                 monetary=self.monetary,
+                 scores=self.scores,
+                 cluster=self.cluster,
+                 reference_day=np.asarray(reference, dtype=np.int32),
+                 model_version=np.asarray(model_version, dtype=str))
+        os.replace(tmp_path, path)
+
+    @property
+    def reference_date(self):
+        if self.reference_day is None:
+            return None
+        return pd.Timestamp(np.datetime64(self.reference_day, "D"))
+
+    def set_reference_date(self, date=None):
+        """
+        Move the date Recency is measured from (defaults to the latest purchase in the store).
+        """
+        if date is None:
+            self._insert_pending()
+            self.reference_day = int(self.last_day.max()) if len(self) else None
+        else:
+            self.reference_day = int(np.datetime64(pd.Timestamp(date).normalize(), "D").astype(np.int64))
+
+    def merge(self, df):
+        """
+        Fold a batch of cleaned transactions into the state.
+
+        The batch is aggregated per customer first, so the work is one groupby over the
+        batch plus a binary search per batch customer: existing customers are updated in
+        place and new ones are buffered (see the class docstring), so a merge costs
+        O(batch log N) whatever the size of the store. The reference date advances to
+        the batch's latest purchase if that is later. Batches are assumed not to repeat
+        transactions already merged (duplicates are only dropped within a batch).
+
+        Args:
+            df (pd.DataFrame): Cleaned transactions (see ``clean_transactions``).
+
+        Returns:
+            int: Number of customers whose state changed.
+        """
+        if df.empty:
+            return 0
+        batch = aggregate_customers(df)
+        ids = batch["CustomerID"].to_numpy(dtype=np.int64)
+        days = batch["LastPurchase"].to_numpy().astype("datetime64[D]").astype(np.int32)
+        counts = batch["Frequency"].to_numpy(dtype=np.int32)
+        sums = batch["Monetary"].to_numpy(dtype=np.float64)
+
+        pos = np.searchsorted(self.customer_id, ids)
+        found = np.zeros(len(ids), dtype=bool)
+        in_range = pos < len(self.customer_id)
+        found[in_range] = self.customer_id[pos[in_range]] == ids[in_range]
+
+        existing = pos[found]
+        self.last_day[existing] = np.maximum(self.last_day[existing], days[found])
+        self.frequency[existing] += counts[found]
+        self.monetary[existing] += sums[found]
+
+        new = ~found
+        if new.any():
+            self._pending.append((ids[new], days[new], counts[new], sums[new]))
+
+        batch_latest = int(days.max())
+        if self.reference_day is None or batch_latest > self.reference_day:
+            self.reference_day = batch_latest
+        return len(ids)
+
+    def _insert_pending(self):
+        """
+        Insert the buffered new customers with one copy of each column array.
+
+        A customer new in several batches is combined first (latest day, summed
+        frequency and monetary), then every new id is placed by one binary search.
+        """
+        if not self._pending:
+            return
+        ids, days, counts, sums = (np.concatenate(column) for column in zip(*self._pending))
+        self._pending = []
+        new_ids, first, inverse = np.unique(ids, return_index=True, return_inverse=True)
+        if len(new_ids) < len(ids):
+            last_day = np.full(len(new_ids), np.iinfo(np.int32).min, dtype=np.int32)
+            np.maximum.at(last_day, inverse, days)
+            days = last_day
+            counts = np.bincount(inverse, weights=counts).astype(np.int32)
+            sums = np.bincount(inverse, weights=sums)
+        else:
+            days, counts, sums = days[first], counts[first], sums[first]
+        at = np.searchsorted(self.customer_id, new_ids)
+        self.customer_id = np.insert(self.customer_id, at, new_ids)
+        self.last_day = np.insert(self.last_day, at, days)
+        self.frequency = np.insert(self.frequency, at, counts)
+        self.monetary = np.insert(self.monetary, at, sums)
+        self.scores = np.insert(self.scores, at, 0, axis=0)
+        self.cluster = np.insert(self.cluster, at, -1)
+
+    def rfm(self):
+        """
+        RFM metrics for all customers relative to the current reference date.
+
+        Returns:
+            pd.DataFrame: CustomerID, Recency, Frequency, Monetary, Cluster.
+        """
+        self._insert_pending()
+        reference_day = self.reference_day if self.reference_day is not None else 0
+        return pd.DataFrame({
+            "CustomerID": self.customer_id,
+            "Recency": (reference_day - self.last_day).astype(np.int64),
+            "Frequency": self.frequency.astype(np.int64),
+            "Monetary": self.monetary,
+            "Cluster": self.cluster,
+        })
+
+    def rescore(self, segmentor):
+        """
+        Re-run the model only for customers whose (R, F, M) scores changed.
+
+        For a fixed model, scaler and bins the cluster depends on the binned scores
+        alone, so binning every customer (vectorized) and predicting only rows whose
+        scores moved - new customers, customers with new purchases that crossed a bin
+        edge, or customers whose Recency crossed an edge after the reference date
+        moved - gives the same labels as scoring everyone. When ``segmentor.version``
+        differs from the version the stored clusters came from (a promoted or
+        reloaded model), or either is unknown, every customer is re-scored.
+
+        Args:
+            segmentor: Object with ``prepare_rfm_features``, ``scaler``, ``model``,
+                ``r_bins``/``f_bins``/``m_bins`` and ``version`` (e.g. ``SegmentationCore``).
+
+        Returns:
+            int: Number of customers sent to the model.
+        """
+        if not len(self):
+            return 0
+        X_RFM = segmentor.prepare_rfm_features(self.rfm(), segmentor.r_bins,
+                                               segmentor.f_bins, segmentor.m_bins)
+        scores = X_RFM.to_numpy(dtype=np.int8)
+        version = getattr(segmentor, "version", None)
+        if version is None or version != self.model_version:
+            dirty = np.ones(len(self), dtype=bool)
+        else:
+            dirty = (self.cluster < 0) | (scores != self.scores).any(axis=1)
+        self.model_version = version
+        if dirty.any():
+            X_scaled = segmentor.scaler.transform(X_RFM[dirty])
+            self.cluster[dirty] = segmentor.model.predict(X_scaled)
+            self.scores[dirty] = scores[dirty]
+        return int(dirty.sum())
@@ -0,0 +1,303 @@
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy.optimize import linear_sum_assignment
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+from sklearn.preprocessing import StandardScaler
+from threadpoolctl import threadpool_limits
+
+from lib.artifact import export_artifact
+from lib.core import artifact_version
+from lib.registry import write_active_manifest
+from lib.scoring import F_LABELS, M_LABELS, R_LABELS, bin_scores
+
+
+# ------------------------------
+# Retraining: quartile bins -> R/F/M scores -> StandardScaler -> KMeans for a range of K,
+# evaluated in parallel, written as a versioned artifact set.
+# ------------------------------
+VERSIONS_DIR = "models/versions"
+QUARTILES = [0, 0.25, 0.5, 0.75, 1]
+DEFAULT_K_VALUES = list(range(2, 11))
+DEFAULT_SAMPLE_SIZE = 10_000
+DEFAULT_N_INIT = 20
+DEFAULT_RANDOM_STATE = 42
+ARTIFACT_FILES = {"model": "kmeans_rfm_model.pkl", "scaler": "scaler.pkl", "bins": "rfm_bins.pkl",
+                  "artifact": "rfm_model.npz", "report": "training.json"}
+
+
+def quartile_bins(rfm_df):
+    """
+    Quartile edges of Recency / Frequency / Monetary in the ``rfm_bins.pkl`` layout.
+    """
+    return {
+        "r_bins": np.quantile(rfm_df['Recency'].to_numpy(np.float64), QUARTILES),
+        "f_bins": np.quantile(rfm_df['Frequency'].to_numpy(np.float64), QUARTILES),
+        "m_bins": np.quantile(rfm_df['Monetary'].to_numpy(np.float64), QUARTILES),
+    }
+
+
+def rfm_scores(rfm_df, bins):
+    """
+    R, F, M scores (1-4) as the float frame the scaler is fitted on.
+    """
+    return pd.DataFrame({
+        'R': bin_scores(rfm_df['Recency'], bins["r_bins"], R_LABELS),
+        'F': bin_scores(rfm_df['Frequency'], bins["f_bins"], F_LABELS),
+        'M': bin_scores(rfm_df['Monetary'], bins["m_bins"], M_LABELS),
+    }).astype(np.float64)
+
+
+def make_model(k, minibatch=False, random_state=DEFAULT_RANDOM_STATE, n_init=DEFAULT_N_INIT):
+    if minibatch:
+        return MiniBatchKMeans(n_clusters=k, random_state=random_state, n_init=n_init,
+                               batch_size=4096)
+    return KMeans(n_clusters=k, random_state=random_state, n_init=n_init)
+
+
+# ------------------------------
+# K evaluation across a process pool
+# ------------------------------
+_X = None
+_sample = None
+
+
+def _init_worker(X, sample):
+    global _X, _sample
+    _X, _sample = X, sample
+
+
+def _evaluate_k(task):
+    k, minibatch, random_state, n_init = task
+    # One BLAS/OpenMP thread per worker; the pool provides the parallelism
+    with threadpool_limits(1):
+        model = make_model(k, minibatch, random_state, n_init).fit(_X)
+        labels = model.predict(_X[_sample])
+        silhouette = (float(silhouette_score(_X[_sample], labels))
+                      if 1 < len(np.unique(labels)) < len(_sample) else float("nan"))
+    return {"k": k, "inertia": float(model.inertia_), "silhouette": silhouette}, model
+
+
+def evaluate_k(X_scaled, k_values=DEFAULT_K_VALUES, workers=None, sample_size=DEFAULT_SAMPLE_SIZE,
+               minibatch=False, random_state=DEFAULT_RANDOM_STATE, n_init=DEFAULT_N_INIT):
+    """
+    Fit one model per K in parallel; inertia on all rows, silhouette on a sample.
+
+    Args:
+        X_scaled (np.ndarray): Scaled R/F/M scores.
+        k_values (list[int]): Cluster counts to try.
+        workers (int, optional): Worker processes (default: CPU count, capped at len(k_values)).
+        sample_size (int): Rows used for the silhouette score (O(n^2) in the sample).
+        minibatch (bool): Fit MiniBatchKMeans instead of KMeans (large data).
+
+    Returns:
+        tuple: (metrics list of dicts sorted by k, {k: fitted model})
+    """
+    X_scaled = np.ascontiguousarray(X_scaled, dtype=np.float64)
+    rng = np.random.default_rng(random_state)
+    sample = np.sort(rng.choice(len(X_scaled), min(sample_size, len(X_scaled)), replace=False))
+    tasks = [(k, minibatch, random_state, n_init) for k in k_values if k < len(X_scaled)]
+    workers = min(workers or os.cpu_count() or 1, len(tasks)) or 1
+
+    if workers == 1:
+        _init_worker(X_scaled, sample)
+        results = [_evaluate_k(task) for task in tasks]
+    else:
+        # spawn, not fork: forking a parent that already ran sklearn/OpenMP can deadlock
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(X_scaled, sample)) as pool:
+            results = list(pool.map(_evaluate_k, tasks))
+    metrics = [m for m, _ in results]
+    models = {m["k"]: model for m, model in results}
+    return metrics, models
+
+
+def elbow_k(metrics):
+    """
+    Elbow of the inertia curve: the K farthest below the chord from the first to the
+    last K, with both axes normalised to [0, 1] (the "kneedle" rule).
+    """
+    k = np.array([m["k"] for m in metrics], dtype=np.float64)
+    inertia = np.array([m["inertia"] for m in metrics], dtype=np.float64)
+    if len(k) < 3:
+        return int(k[0])
+    x = (k - k[0]) / (k[-1] - k[0])
+    y = (inertia - inertia[-1]) / (inertia[0] - inertia[-1] or 1)
+    # Chord runs from (0, 1) to (1, 0); distance below it is 1 - x - y
+    return int(k[np.argmax(1 - x - y)])
+
+
+def select_k(metrics, method="elbow"):
+    """
+    Choose K from the sweep.
+
+    Args:
+        metrics (list[dict]): Output of ``evaluate_k``.
+        method (str): ``"elbow"`` (inertia curve, how the shipped model was chosen) or
+            ``"silhouette"`` (best sampled silhouette; ties go to the smaller K).
+    """
+    if method == "elbow":
+        return elbow_k(metrics)
+    scored = [m for m in metrics if not np.isnan(m["silhouette"])]
+    if not scored:
+        raise ValueError("No K produced a valid silhouette score.")
+    return max(scored, key=lambda m: (m["silhouette"], -m["k"]))["k"]
+
+
+def align_clusters(model, scaler, reference_model, reference_scaler):
+    """
+    Renumber ``model``'s clusters to match the closest centers of the current model.
+
+    Cluster numbers index ``CLUSTER_MAP`` and ``cluster_labels.json``, so a retrained
+    model with the same K keeps each segment's name. Centers are matched in unscaled
+    R/F/M score space with the Hungarian algorithm. Models with a different K are
+    returned unchanged.
+
+    Returns:
+        np.ndarray | None: New position of every old cluster, or None if not aligned.
+    """
+    if reference_model is None or len(reference_model.cluster_centers_) != len(model.cluster_centers_):
+        return None
+    centers = scaler.inverse_transform(model.cluster_centers_)
+    reference = reference_scaler.inverse_transform(reference_model.cluster_centers_)
+    cost = ((reference[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+    _, order = linear_sum_assignment(cost)
+    # Reference cluster i takes the centre ``order[i]`` of the new model
+    model.cluster_centers_ = model.cluster_centers_[order]
+    if hasattr(model, "labels_"):
+        model.labels_ = np.argsort(order)[model.labels_].astype(model.labels_.dtype)
+    return order
+
+
+class TrainingResult:
+    """
+    Output of ``train``: the chosen model, its scaler and bins, and the K sweep.
+    """
+
+    def __init__(self, model, scaler, bins, k, metrics, n_customers, aligned, select=None):
+        self.model = model
+        self.scaler = scaler
+        self.bins = bins
+        self.k = k
+        self.metrics = metrics
+        self.n_customers = n_customers
+        self.aligned = aligned
+        self.select = select
+
+    def report(self, **meta):
+        return {
+            **meta,
+            "trained_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "k": self.k,
+            "k_selection": self.select,
+            "n_customers": self.n_customers,
+            "aligned_to_current_model": self.aligned,
+            "bins": {name: [float(v) for v in edges] for name, edges in self.bins.items()},
+            "k_metrics": self.metrics,
+        }
+
+
+def train(rfm_df, k_values=DEFAULT_K_VALUES, k=None, workers=None, sample_size=DEFAULT_SAMPLE_SIZE,
+          minibatch=False, random_state=DEFAULT_RANDOM_STATE, n_init=DEFAULT_N_INIT,
+          select="elbow", reference_model=None, reference_scaler=None):
+    """
+    Recompute bins and scaler from ``rfm_df`` and fit KMeans for every K in ``k_values``.
+
+    Args:
+        rfm_df (pd.DataFrame): Recency, Frequency, Monetary per customer.
+        k (int, optional): Use this K instead of choosing one with ``select_k``.
+        select (str): ``select_k`` method, ``"elbow"`` or ``"silhouette"``.
+        reference_model, reference_scaler: Current model, used to keep cluster numbers.
+
+    Returns:
+        TrainingResult
+    """
+    k_fixed = k is not None
+    k_values = sorted(set(k_values) | ({k} if k else set()))
+    bins = quartile_bins(rfm_df)
+    X = rfm_scores(rfm_df, bins)
+    scaler = StandardScaler().fit(X)
+    X_scaled = scaler.transform(X)
+    metrics, models = evaluate_k(X_scaled, k_values, workers, sample_size, minibatch,
+                                 random_state, n_init)
+    k = k or select_k(metrics, select)
+    if k not in models:
+        raise ValueError(f"K={k} could not be fitted on {len(X_scaled)} customers.")
+    model = models[k]
+    aligned = align_clusters(model, scaler, reference_model, reference_scaler) is not None
+    return TrainingResult(model, scaler, bins, k, metrics, len(rfm_df), aligned,
+                          select=None if k_fixed else select)
+
+
+# ------------------------------
+# Versioned artifact sets
+# ------------------------------
+def write_versioned_artifacts(result, versions_dir=VERSIONS_DIR, **meta):
+    """
+    Write model / scaler / bins pickles, the compact artifact and a training report.
+
+    The set goes to ``<versions_dir>/<version>/`` with the file names of ``models/``,
+    where ``version`` is the ``artifact_version`` of the three pickles (the same key
+    the app uses for cached results).
+
+    Returns:
+        tuple: (version, directory)
+    """
+    os.makedirs(versions_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".training_", dir=versions_dir)
+    try:
+        paths = {name: os.path.join(tmp_dir, file) for name, file in ARTIFACT_FILES.items()}
+        joblib.dump(result.model, paths["model"])
+        joblib.dump(result.scaler, paths["scaler"])
+        joblib.dump(result.bins, paths["bins"])
+        version = artifact_version((paths["model"], paths["scaler"], paths["bins"]))
+        export_artifact(result.model, result.scaler, result.bins, paths["artifact"], version)
+        with open(paths["report"], "w", encoding="utf-8") as f:
+            json.dump(result.report(version=version, **meta), f, indent=2)
+        version_dir = os.path.join(versions_dir, version)
+        if os.path.exists(version_dir):
+            shutil.rmtree(version_dir)
+        os.replace(tmp_dir, version_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return version, version_dir
+
+
+def promote(version_dir, models_dir="models"):
+    """
+    Copy a versioned artifact set over the active files in ``models_dir``.
+
+    ``active.json`` naming the set is written first; then each file is copied to a
+    unique temporary name next to its target and renamed into place. Four renames
+    cannot be one atomic step, so while they run ``ModelRegistry.get`` sees files
+    whose content hash differs from the manifest and loads ``version_dir`` instead:
+    a running app never mixes files of two sets.
+
+    Returns:
+        str: Version (pickle content hash) of the promoted set.
+    """
+    os.makedirs(models_dir, exist_ok=True)
+    version = artifact_version([os.path.join(version_dir, ARTIFACT_FILES[name])
+                                for name in ("model", "scaler", "bins")])
+    write_active_manifest(models_dir, version, version_dir)
+    for name in ("model", "scaler", "bins", "artifact"):
+        file = ARTIFACT_FILES[name]
+        fd, tmp_path = tempfile.mkstemp(dir=models_dir, prefix=f".{file}.", suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copyfile(os.path.join(version_dir, file), tmp_path)
+            os.replace(tmp_path, os.path.join(models_dir, file))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    return version
@@ -1,7 +1,10 @@
 import streamlit as st
 import pandas as pd
+import plotly.express as px
 from PIL import Image
 
+from lib.mylib import load_model_set_cached, load_reference_cube
+
 # --- Cấu hình giao diện chính ---
 st.set_page_config(page_title="🎯 Project Overview", layout="centered", page_icon="📊")
 
@@ -50,18 +53,45 @@ Các bước xử lý gồm:
 # --- 4. TRỰC QUAN HÓA DỮ LIỆU ---
 st.header("4. Data visualization")
 
+st.subheader("📈 Phân bố các biến")
 col1, col2 = st.columns(2)
 
 with col1:
-    st.subheader("📈 Phân bố các biến")
     st.image("images/price_distribution.jpg", caption="Phân bố giá sản phẩm")
-    st.image("images/total_revenue_distribution.jpg", caption="Phân bố tổng doanh thu")
 
 with col2:
+    st.image("images/total_revenue_distribution.jpg", caption="Phân bố tổng doanh thu")
+
+# Live charts: every query reads one precomputed grouping set of the aggregate cube
+cube = load_reference_cube()
+# Segment names of the model the cube was clustered with (its store's labels file)
+segments = load_model_set_cached().segments
+MEASURE_LABELS = {'Revenue': 'Doanh thu', 'Items': 'Số sản phẩm', 'Transactions': 'Số giao dịch',
+                  'Customers': 'Số khách hàng'}
+
+if cube is not None:
     st.subheader("📊 Biểu đồ tần suất & xu hướng")
-    st.image("images/product_category_bar.jpg", caption="Giao dịch theo danh mục sản phẩm")
-    st.image("images/monthly_sales_trend.jpg", caption="Doanh số theo tháng")
-    st.image("images/weekday_sales_trend.jpg", caption="Doanh số theo ngày trong tuần")
+    f1, f2, f3 = st.columns(3)
+    category = f1.selectbox("Danh mục", ['Tất cả'] + cube.values('Category'))
+    weekday = f2.selectbox("Ngày trong tuần", ['Tất cả'] + cube.values('weekday'))
+    cluster = f3.selectbox("Nhóm khách hàng", ['Tất cả'] + cube.values('Cluster'),
+                           format_func=lambda c: segments.get(c, c) if c != 'Tất cả' else c)
+    measure = st.radio("Chỉ số", list(MEASURE_LABELS), format_func=MEASURE_LABELS.get, horizontal=True)
+
+    filters = {'Category': None if category == 'Tất cả' else category,
+               'weekday': None if weekday == 'Tất cả' else weekday,
+               'Cluster': None if cluster == 'Tất cả' else cluster}
+    labels = {measure: MEASURE_LABELS[measure]}
+
+    by_category = cube.query(['Category'], **{**filters, 'Category': None})
+    st.plotly_chart(px.bar(by_category.sort_values(measure), x=measure, y='Category', orientation='h',
+                           labels=labels, title="Theo danh mục sản phẩm"), use_container_width=True)
+    by_month = cube.query(['Month'], **filters)
+    st.plotly_chart(px.line(by_month, x='Month', y=measure, markers=True, labels=labels,
+                            title="Theo tháng"), use_container_width=True)
+    by_weekday = cube.query(['weekday'], **{**filters, 'weekday': None})
+    st.plotly_chart(px.bar(by_weekday, x='weekday', y=measure, labels=labels,
+                           title="Theo ngày trong tuần"), use_container_width=True)
 
 st.subheader("🔍 Mối quan hệ giữa các biến số")
 st.image("images/scatter_revenue_vs_member.jpg", caption="Tổng doanh thu vs số thành viên")
@@ -80,7 +110,12 @@ st.subheader("📊 Trực quan cụm khách hàng")
 
 st.image("images/customer_segments_treemap.jpg", caption="Treemap: Kích thước từng cụm KMeans")
 st.image("images/rfm_cluster_distributions.png", caption="rfm cluster distributions")
-st.image("images/rfm_cluster_trend_by_month.png", caption="rfm cluster trend by_month")
+if cube is not None:
+    cluster_trend = cube.query(['Month', 'Cluster'], Category=filters['Category'],
+                               weekday=filters['weekday'])
+    cluster_trend['Segment'] = cluster_trend['Cluster'].map(segments)
+    st.plotly_chart(px.line(cluster_trend, x='Month', y=measure, color='Segment', labels=labels,
+                            title="RFM cluster trend by month"), use_container_width=True)
 
 # --- Kết thúc ---
 st.markdown("---")
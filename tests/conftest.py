@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# ``lib`` is a plain directory (no package install); tests import it from the repo root
+# and read the model / data files by their repo-relative paths
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+
+@pytest.fixture(scope="session")
+def reference_transactions():
+    """
+    data/rfm_data.csv as raw CustomerID / InvoiceDate / TotalSales transactions.
+    """
+    import pandas as pd
+
+    ref = pd.read_csv(os.path.join(ROOT, "data", "rfm_data.csv"))
+    return pd.DataFrame({'CustomerID': ref['Member_number'], 'InvoiceDate': ref['Date'],
+                         'TotalSales': ref['Total_Revenue']})
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from lib.cluster_stats import ClusterStats
+from lib.core import SegmentationCore
+
+
+@pytest.fixture(scope="module", params=[False, True], ids=["default", "compact"])
+def rfm_df(request, reference_transactions):
+    return SegmentationCore.from_paths(compact=request.param).segment_customers(reference_transactions)
+
+
+def baseline_summary(rfm_df):
+    """
+    ``summarize_clusters`` as the app computed it before ClusterStats (one groupby).
+    """
+    return rfm_df.groupby('Cluster').agg({
+        'Recency': 'mean',
+        'Frequency': 'mean',
+        'Monetary': 'mean',
+        'CustomerID': 'count'
+    }).rename(columns={'CustomerID': 'Số khách hàng'}).reset_index()
+
+
+def test_summary_matches_groupby(rfm_df):
+    summary = ClusterStats.from_rfm(rfm_df).summary()
+    pd.testing.assert_frame_equal(summary, baseline_summary(rfm_df), check_dtype=False, rtol=1e-9)
+
+
+def test_revenue_shares_and_means_match_groupby(rfm_df):
+    stats = ClusterStats.from_rfm(rfm_df)
+    revenue = (rfm_df['Frequency'].astype(np.float64) * rfm_df['Monetary']).groupby(rfm_df['Cluster']).sum()
+    counts = rfm_df.groupby('Cluster').size()
+
+    assert stats.n_customers == len(rfm_df)
+    assert stats.n_clusters == rfm_df['Cluster'].nunique()
+    np.testing.assert_allclose(stats.table['Revenue'], revenue, rtol=1e-9)
+    np.testing.assert_allclose(stats.table['RevenueShare'], revenue / revenue.sum() * 100, rtol=1e-9)
+    np.testing.assert_allclose(stats.table['Share'], counts / len(rfm_df) * 100, rtol=1e-12)
+    assert stats.table['Share'].sum() == pytest.approx(100)
+    for column in ('Recency', 'Frequency', 'Monetary'):
+        assert stats.means[column] == pytest.approx(rfm_df[column].astype(np.float64).mean(), rel=1e-9)
+
+
+def test_missing_clusters_are_skipped():
+    rfm_df = pd.DataFrame({'CustomerID': [1, 2, 3], 'Recency': [10, 20, 30], 'Frequency': [1, 2, 3],
+                           'Monetary': [5.0, 6.0, 7.0], 'Cluster': [3, 0, 3]})
+    pd.testing.assert_frame_equal(ClusterStats.from_rfm(rfm_df).summary(), baseline_summary(rfm_df),
+                                  check_dtype=False)
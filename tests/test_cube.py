@@ -0,0 +1,69 @@
+import builtins
+import os
+
+import pandas as pd
+
+import lib.reference_data as reference_data
+from lib.core import SegmentationCore
+from lib.cube import AggregateCube, build_reference_cube, cube_version
+from lib.reference_data import REFERENCE_CSV_PATH
+
+
+def test_cube_version_hashes_an_unchanged_csv_once(tmp_path, monkeypatch):
+    csv_path = tmp_path / "rfm_data.csv"
+    csv_path.write_text("Member_number,Date\n1,2024-01-01\n")
+    opened = []
+
+    def spy_open(path, *args, **kwargs):
+        opened.append(path)
+        return builtins.open(path, *args, **kwargs)
+
+    monkeypatch.setattr(reference_data, "open", spy_open, raising=False)
+    missing = str(tmp_path / "missing.feather")
+
+    first = cube_version("v1", missing, str(csv_path))
+    assert cube_version("v1", missing, str(csv_path)) == first
+    assert len(opened) == 1
+    assert cube_version("v2", missing, str(csv_path)) != first
+
+    csv_path.write_text("Member_number,Date\n2,2024-01-01\n")
+    os.utime(csv_path, ns=(0, 1))
+    assert cube_version("v1", missing, str(csv_path)) != first
+    assert len(opened) == 2
+
+
+def test_save_writes_through_a_unique_temporary_file(tmp_path):
+    cube = AggregateCube(pd.DataFrame({'grouping': [0], 'Revenue': [1.0]}), "abc")
+    path = str(tmp_path / "cube.feather")
+
+    cube.save(path)
+    cube.save(path)
+
+    assert os.listdir(tmp_path) == ["cube.feather"]
+    assert AggregateCube.load(path).version == "abc"
+
+
+def test_reference_cube_matches_a_groupby_on_the_deduplicated_rows():
+    core = SegmentationCore.from_paths()
+    cube = build_reference_cube(core)
+
+    ref = pd.read_csv(REFERENCE_CSV_PATH)
+    ref = ref[~ref.duplicated()]
+    ref['Date'] = pd.to_datetime(ref['Date'])
+    rfm_df = ref.groupby('Member_number').agg(LastPurchase=('Date', 'max'),
+                                              Frequency=('Date', 'size'),
+                                              Monetary=('Total_Revenue', 'sum')).reset_index()
+    rfm_df = pd.DataFrame({'CustomerID': rfm_df['Member_number'],
+                           'Recency': (ref['Date'].max() - rfm_df['LastPurchase']).dt.days,
+                           'Frequency': rfm_df['Frequency'], 'Monetary': rfm_df['Monetary']})
+    rfm_df = core.assign_clusters(rfm_df)
+    ref['Cluster'] = ref['Member_number'].map(rfm_df.set_index('CustomerID')['Cluster'])
+    expected = ref.groupby(['Cluster', 'Category']).agg(
+        Revenue=('Total_Revenue', 'sum'), Items=('items', 'sum'),
+        Transactions=('Total_Revenue', 'size'), Customers=('Member_number', 'nunique')).reset_index()
+
+    result = cube.query(['Cluster', 'Category'])
+    result['Category'] = result['Category'].astype(str)
+    result = result.sort_values(['Cluster', 'Category'], ignore_index=True)
+    assert result['Transactions'].sum() == len(ref)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from lib.customer_index import CustomerIndex, page_rows
+
+
+@pytest.fixture(scope="module")
+def rfm_df():
+    # Unsorted, with a repeated CustomerID (e.g. one customer in two stores)
+    rng = np.random.default_rng(0)
+    ids = rng.permutation(np.arange(1000, 6000))
+    ids[10] = ids[20]
+    return pd.DataFrame({'CustomerID': ids, 'Cluster': rng.integers(0, 4, len(ids)),
+                         'Monetary': rng.random(len(ids))})
+
+
+def _filtered(rfm_df, cluster=None, customer_id=None):
+    mask = pd.Series(True, index=rfm_df.index)
+    if cluster is not None:
+        mask &= rfm_df['Cluster'] == cluster
+    if customer_id is not None:
+        mask &= rfm_df['CustomerID'] == customer_id
+    return rfm_df[mask]
+
+
+@pytest.mark.parametrize("cluster", [None, 0, 1, 2, 3, 7])
+def test_select_matches_dataframe_filter(rfm_df, cluster):
+    index = CustomerIndex.from_rfm(rfm_df)
+    ids = rfm_df['CustomerID'].to_numpy()
+    for customer_id in [None, ids[0], ids[10], ids[-1], 999, 6000]:
+        expected = _filtered(rfm_df, cluster, customer_id)
+        actual = rfm_df.iloc[np.asarray(index.select(cluster, customer_id))]
+        # Rows come back in the frame's own order
+        pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_lookup_finds_every_customer(rfm_df):
+    index = CustomerIndex.from_rfm(rfm_df)
+    assert len(index) == len(rfm_df)
+    for customer_id, rows in rfm_df.groupby('CustomerID').indices.items():
+        np.testing.assert_array_equal(np.sort(index.lookup(customer_id)), rows)
+
+
+@pytest.mark.parametrize("page_size", [1, 7, 100, 5000, 10000])
+def test_pages_cover_the_filtered_rows_once(rfm_df, page_size):
+    index = CustomerIndex.from_rfm(rfm_df)
+    rows = index.rows(2)
+    _, n_pages = page_rows(rows, 1, page_size)
+    assert n_pages == max(1, -(-len(rows) // page_size))
+
+    pages = [page_rows(rows, page, page_size)[0] for page in range(1, n_pages + 1)]
+    assert all(len(page) <= page_size for page in pages)
+    pd.testing.assert_frame_equal(rfm_df.iloc[np.concatenate(pages)], _filtered(rfm_df, cluster=2))
+    # Out-of-range pages are clamped to the first / last page
+    np.testing.assert_array_equal(page_rows(rows, 0, page_size)[0], pages[0])
+    np.testing.assert_array_equal(page_rows(rows, n_pages + 5, page_size)[0], pages[-1])
+
+
+def test_empty_frame():
+    index = CustomerIndex.from_rfm(pd.DataFrame({'CustomerID': np.array([], dtype=np.int64),
+                                                 'Cluster': np.array([], dtype=np.int64)}))
+    assert len(index.select(0, 5)) == 0
+    assert len(index.select(0)) == 0
+    page, n_pages = page_rows(index.select(), 3, 10)
+    assert len(page) == 0 and n_pages == 1
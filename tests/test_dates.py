@@ -0,0 +1,62 @@
+from io import BytesIO, StringIO
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from lib import cli
+from lib.rfm import aggregate_rfm, clean_transactions, sample_date_format, stream_rfm
+
+
+def _dayfirst_csv(n=20000, seed=0):
+    # Sorted by date, so the first chunks / byte ranges hold only days <= 12
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp('2023-01-01') + pd.to_timedelta(np.sort(rng.integers(0, 730, n)), unit='D')
+    return pd.DataFrame({
+        'CustomerID': rng.integers(1, 2000, n),
+        'InvoiceDate': dates.strftime('%d/%m/%Y'),
+        'TotalSales': rng.integers(1, 100, n) / 2,
+    }).to_csv(index=False)
+
+
+def _sorted(rfm_df):
+    return rfm_df.sort_values('CustomerID', ignore_index=True)
+
+
+@pytest.fixture(scope="module")
+def dayfirst():
+    csv = _dayfirst_csv()
+    return csv, aggregate_rfm(clean_transactions(pd.read_csv(StringIO(csv))))
+
+
+def test_sample_date_format_whole_file(dayfirst, tmp_path):
+    csv, _ = dayfirst
+    path = tmp_path / "dayfirst.csv"
+    path.write_text(csv)
+    buffer = StringIO(csv)
+    buffer.seek(10)
+
+    assert sample_date_format(str(path)) == '%d/%m/%Y'
+    assert sample_date_format(BytesIO(csv.encode())) == '%d/%m/%Y'
+    assert sample_date_format(buffer) == '%d/%m/%Y'
+    assert buffer.tell() == 10
+
+
+@pytest.mark.parametrize("make_source", [StringIO, lambda csv: BytesIO(csv.encode())])
+def test_stream_rfm_dayfirst_chunks(dayfirst, make_source):
+    csv, expected = dayfirst
+    rfm_df, accumulator = stream_rfm(make_source(csv), chunksize=500)
+
+    assert accumulator.report()['date_format'] == '%d/%m/%Y'
+    pd.testing.assert_frame_equal(_sorted(rfm_df), _sorted(expected), check_dtype=False)
+
+
+def test_score_files_dayfirst_ranges(dayfirst, tmp_path):
+    csv, expected = dayfirst
+    path = tmp_path / "dayfirst.csv"
+    path.write_text(csv)
+
+    rfm_df = cli.score_files([str(path)], workers=1, n_partitions=4, split_bytes=16 * 1024)
+
+    pd.testing.assert_frame_equal(_sorted(rfm_df)[['CustomerID', 'Recency', 'Frequency', 'Monetary']],
+                                  _sorted(expected), check_dtype=False)
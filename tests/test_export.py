@@ -0,0 +1,56 @@
+import gzip
+from io import BytesIO
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from lib.core import SegmentationCore
+from lib.export import export_bytes, export_path
+
+
+@pytest.fixture(scope="module", params=[False, True], ids=["default", "compact"])
+def scored(request, reference_transactions):
+    core = SegmentationCore.from_paths(compact=request.param)
+    return core.cluster_probabilities(core.segment_customers(reference_transactions))
+
+
+def _check_csv(data, like):
+    # CSV has no dtypes: values come back as int64 / float64 (float32 columns are
+    # written with float32 precision) and Segment as strings
+    df = pd.read_csv(data)
+    expected = like.astype({'Segment': str}).reset_index(drop=True)
+    pd.testing.assert_frame_equal(df, expected, check_dtype=False, rtol=1e-6)
+
+
+def test_parquet_round_trip(scored):
+    # A chunk size that does not divide the row count: several row groups
+    buffer = export_bytes(scored, "parquet", chunk_rows=1000)
+    table = pq.read_table(buffer)
+    assert pq.ParquetFile(buffer).num_row_groups == -(-len(scored) // 1000)
+    pd.testing.assert_frame_equal(table.to_pandas(), scored.reset_index(drop=True))
+
+
+def test_csv_gz_round_trip(scored):
+    buffer = export_bytes(scored, "csv.gz", chunk_rows=1000)
+    with gzip.open(buffer, "rt") as f:
+        text = f.read()
+    # One header, not one per chunk
+    assert text.count("CustomerID") == 1
+    _check_csv(BytesIO(text.encode()), scored)
+
+
+@pytest.mark.parametrize("name", ["out.csv", "out.csv.gz", "out.parquet"])
+def test_export_path_round_trip(scored, tmp_path, name):
+    path = str(tmp_path / name)
+    export_path(scored, path, chunk_rows=1000)
+    assert not (tmp_path / f"{name}.tmp").exists()
+    if name.endswith(".parquet"):
+        pd.testing.assert_frame_equal(pd.read_parquet(path), scored.reset_index(drop=True))
+        return
+    _check_csv(path, scored)
+
+
+def test_unknown_format(scored):
+    with pytest.raises(ValueError, match="Unknown export format"):
+        export_bytes(scored, "xlsx")
@@ -0,0 +1,108 @@
+import threading
+
+import pytest
+
+from lib.jobs import CANCELLED, DONE, FAILED, QUEUED, RUNNING, JobExecutor, JobQueueFull
+
+TIMEOUT = 10
+
+
+def blocking(job, started, release, result="ok"):
+    # Reports in a loop like a chunked read, so a cancellation is seen promptly
+    started.set()
+    while not release.wait(0.01):
+        job.report("wait", 0.5, ticks=1)
+    return result
+
+
+def failing(job, calls):
+    calls.append(job.key)
+    if len(calls) == 1:
+        raise RuntimeError("boom")
+    return "recovered"
+
+
+@pytest.fixture
+def executor():
+    executor = JobExecutor(max_workers=1, max_queued=1, max_finished=2)
+    yield executor
+    executor.shutdown(cancel=True)
+
+
+def test_same_key_shares_one_job(executor):
+    started, release = threading.Event(), threading.Event()
+    job = executor.submit("a", blocking, started, release)
+    assert started.wait(TIMEOUT)
+
+    assert executor.submit("a", blocking, started, release) is job
+    assert job.state == RUNNING
+    release.set()
+    job.future.result(TIMEOUT)
+    assert (job.state, job.result, job.fraction) == (DONE, "ok", 1.0)
+
+
+def test_cancel_running_and_queued_jobs(executor):
+    started, release = threading.Event(), threading.Event()
+    running = executor.submit("running", blocking, started, release)
+    assert started.wait(TIMEOUT)
+    queued_started = threading.Event()
+    queued = executor.submit("queued", blocking, queued_started, release)
+    assert queued.state == QUEUED
+
+    queued.cancel()
+    assert queued.state == CANCELLED
+    running.cancel()
+    running.future.result(TIMEOUT)
+
+    assert running.state == CANCELLED and running.snapshot()["cancel_requested"]
+    assert not queued_started.is_set()
+    # A cancelled job is returned as is on the next submit, not restarted
+    assert executor.submit("running", blocking, started, release) is running
+
+
+def test_queue_full(executor):
+    started, release = threading.Event(), threading.Event()
+    executor.submit("a", blocking, started, release)
+    assert started.wait(TIMEOUT)
+    executor.submit("b", blocking, threading.Event(), release)
+
+    with pytest.raises(JobQueueFull):
+        executor.submit("c", blocking, threading.Event(), release)
+    release.set()
+
+
+def test_retry_replaces_a_failed_or_cancelled_job(executor):
+    calls = []
+    failed = executor.submit("a", failing, calls)
+    failed.future.result(TIMEOUT)
+    assert failed.state == FAILED and str(failed.error) == "boom"
+    assert executor.submit("a", failing, calls) is failed
+
+    retried = executor.submit("a", failing, calls, retry=True)
+    retried.future.result(TIMEOUT)
+
+    assert retried is not failed
+    assert (retried.state, retried.result, len(calls)) == (DONE, "recovered", 2)
+    assert executor.get("a") is retried
+
+    started, release = threading.Event(), threading.Event()
+    cancelled = executor.submit("b", blocking, started, release)
+    assert started.wait(TIMEOUT)
+    cancelled.cancel()
+    cancelled.future.result(TIMEOUT)
+    release.set()
+    again = executor.submit("b", blocking, threading.Event(), release, retry=True)
+    again.future.result(TIMEOUT)
+    assert (cancelled.state, again.state) == (CANCELLED, DONE)
+
+
+def test_finished_jobs_are_evicted_oldest_first(executor):
+    release = threading.Event()
+    release.set()
+    for key in ("a", "b", "c"):
+        executor.submit(key, blocking, threading.Event(), release).future.result(TIMEOUT)
+    executor.get("b")
+    executor.submit("d", blocking, threading.Event(), release).future.result(TIMEOUT)
+
+    assert executor.get("a") is None and executor.get("c") is None
+    assert executor.get("b").state == DONE and executor.get("d").state == DONE
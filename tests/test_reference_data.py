@@ -0,0 +1,31 @@
+import os
+
+import pandas as pd
+
+from lib.reference_data import (REFERENCE_CSV_PATH, load_reference_data, read_reference_csv,
+                                reference_is_current)
+
+
+def test_columnar_copy_is_built_on_first_load(tmp_path):
+    path = str(tmp_path / "rfm_data.feather")
+    columns = ['Member_number', 'Date', 'Total_Revenue']
+
+    df = load_reference_data(columns, path=path)
+
+    assert reference_is_current(path)
+    assert [f for f in os.listdir(tmp_path) if f.endswith(".tmp")] == []
+    expected = read_reference_csv(REFERENCE_CSV_PATH, columns)
+    pd.testing.assert_frame_equal(df, expected)
+    pd.testing.assert_frame_equal(load_reference_data(columns, path=path), expected)
+
+
+def test_unwritable_location_falls_back_to_the_csv(tmp_path):
+    blocker = tmp_path / "not_a_dir"
+    blocker.write_text("")
+    path = str(blocker / "rfm_data.feather")
+
+    df = load_reference_data(['Member_number', 'Total_Revenue'], path=path)
+
+    assert not os.path.exists(path)
+    pd.testing.assert_frame_equal(df, read_reference_csv(REFERENCE_CSV_PATH,
+                                                         ['Member_number', 'Total_Revenue']))
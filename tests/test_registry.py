@@ -0,0 +1,159 @@
+import json
+import os
+import shutil
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+from lib import cli
+from lib.core import CLUSTER_MAP, load_cluster_labels
+from lib.registry import DEFAULT_STORE, ModelRegistry
+from lib.rfm import aggregate_rfm, clean_transactions
+
+
+@pytest.mark.parametrize("store", ["../../x", "..", "north/../../models", "/etc", "a b", ""])
+def test_invalid_store_names_are_rejected(tmp_path, store):
+    registry = ModelRegistry(stores_dir=str(tmp_path))
+
+    with pytest.raises(ValueError, match="Invalid store name"):
+        registry.get(store)
+    with pytest.raises(ValueError, match="Invalid version name"):
+        registry.paths(DEFAULT_STORE, version=store or "..")
+
+
+def test_store_values_from_data_are_validated_before_loading(tmp_path):
+    os.makedirs(tmp_path / "evil")
+    registry = ModelRegistry(stores_dir=str(tmp_path / "stores"))
+    rfm_df = pd.DataFrame({'CustomerID': [1, 2], 'Recency': [10, 200], 'Frequency': [5, 1],
+                           'Monetary': [100.0, 5.0], 'Store': [DEFAULT_STORE, "../evil"]})
+
+    with pytest.raises(ValueError, match="Invalid store name '../evil'"):
+        registry.assign_clusters(rfm_df)
+    with pytest.raises(KeyError):
+        registry.assign_clusters(rfm_df.assign(Store=[DEFAULT_STORE, "north"]))
+    assert registry.stores() == [DEFAULT_STORE]
+
+
+def _north_store(tmp_path):
+    store_dir = tmp_path / "stores" / "north"
+    os.makedirs(store_dir)
+    for name in ("kmeans_rfm_model.pkl", "scaler.pkl", "rfm_bins.pkl"):
+        shutil.copy(os.path.join("models", name), store_dir / name)
+    labels = load_cluster_labels()
+    for k, segment in enumerate(["Champions", "Steady", "Slipping", "Lost"]):
+        labels[str(k)]["segment"] = segment
+    (store_dir / "cluster_labels.json").write_text(json.dumps(labels), encoding="utf-8")
+    return ModelRegistry(stores_dir=str(tmp_path / "stores"))
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_store_segment_names_match_between_core_and_registry(tmp_path, reference_transactions,
+                                                              compact):
+    registry = _north_store(tmp_path)
+    core = registry.get("north").core(compact=compact)
+    rfm_df = core.calculate_rfm(core.clean_data(reference_transactions.copy()))
+
+    from_core = core.cluster_probabilities(core.assign_clusters(rfm_df.copy()))
+    from_registry = registry.assign_clusters(rfm_df.assign(Store="north"))
+
+    assert set(from_core['Segment'].astype(str)) <= {"Champions", "Steady", "Slipping", "Lost"}
+    assert (from_core['Segment'].astype(str).to_numpy() == from_registry['Segment'].to_numpy()).all()
+    assert [c for c in from_core if c.startswith("P_")] == \
+        ["P_Champions", "P_Steady", "P_Slipping", "P_Lost"]
+    default = registry.get().core(compact=compact).assign_clusters(rfm_df.copy())
+    assert set(default['Segment'].astype(str)) <= set(CLUSTER_MAP.values())
+
+
+def test_cli_snapshots_use_the_default_store_segment_names(tmp_path, reference_transactions):
+    models_dir = tmp_path / "models"
+    os.makedirs(models_dir)
+    for name in ("kmeans_rfm_model.pkl", "scaler.pkl", "rfm_bins.pkl"):
+        shutil.copy(os.path.join("models", name), models_dir / name)
+    labels = load_cluster_labels()
+    for k, segment in enumerate(["Champions", "Steady", "Slipping", "Lost"]):
+        labels[str(k)]["segment"] = segment
+    (models_dir / "cluster_labels.json").write_text(json.dumps(labels), encoding="utf-8")
+    source = tmp_path / "transactions.csv"
+    reference_transactions.to_csv(source, index=False)
+    output = tmp_path / "matrix.csv"
+
+    cli.main(["--model", str(models_dir / "kmeans_rfm_model.pkl"),
+              "--scaler", str(models_dir / "scaler.pkl"), "--bins", str(models_dir / "rfm_bins.pkl"),
+              "snapshots", str(source), "-o", str(output)])
+
+    values = set(pd.read_csv(output, index_col=0).stack().dropna())
+    assert values and values <= {"Champions", "Steady", "Slipping", "Lost"}
+
+
+def _stores(tmp_path, names):
+    for name in names:
+        store_dir = tmp_path / "stores" / name
+        os.makedirs(store_dir)
+        for file in ("kmeans_rfm_model.pkl", "scaler.pkl", "rfm_bins.pkl"):
+            shutil.copy(os.path.join("models", file), store_dir / file)
+    return str(tmp_path / "stores")
+
+
+def test_lru_eviction_by_entries_and_bytes(tmp_path):
+    stores_dir = _stores(tmp_path, ["a", "b", "c"])
+    registry = ModelRegistry(stores_dir=stores_dir, max_entries=2)
+    registry.get("a")
+    registry.get("b")
+    registry.get("a")
+    registry.get("c")
+    assert registry.loaded() == [("a", None), ("c", None)]
+
+    one_set = registry.get("a").nbytes
+    registry = ModelRegistry(stores_dir=stores_dir, max_bytes=int(one_set * 1.5))
+    registry.get("a")
+    registry.get("b")
+    assert registry.loaded() == [("b", None)]
+    # The most recent set is kept even when it alone is over budget
+    registry = ModelRegistry(stores_dir=stores_dir, max_bytes=1)
+    assert registry.get("c") is registry.get("c")
+    assert registry.loaded() == [("c", None)]
+
+
+def test_get_reloads_when_a_file_changes(tmp_path):
+    stores_dir = _stores(tmp_path, ["a"])
+    registry = ModelRegistry(stores_dir=stores_dir)
+    first = registry.get("a")
+    assert registry.get("a") is first
+
+    bins_path = os.path.join(stores_dir, "a", "rfm_bins.pkl")
+    stat = os.stat(bins_path)
+    os.utime(bins_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    second = registry.get("a")
+    assert second is not first
+    assert registry.get("a") is second
+
+    bins = joblib.load(bins_path)
+    bins["m_bins"] = bins["m_bins"] * 2
+    joblib.dump(bins, bins_path)
+    third = registry.get("a")
+    assert third is not second and third.version != second.version
+    np.testing.assert_array_equal(third.bins["m_bins"], bins["m_bins"])
+
+
+def test_assign_clusters_routes_each_store_to_its_own_bins(tmp_path, reference_transactions):
+    stores_dir = _stores(tmp_path, ["north", "south"])
+    bins_path = os.path.join(stores_dir, "south", "rfm_bins.pkl")
+    bins = joblib.load(bins_path)
+    bins["r_bins"] = bins["r_bins"] * 0.5
+    bins["m_bins"] = bins["m_bins"] * 3
+    joblib.dump(bins, bins_path)
+    registry = ModelRegistry(stores_dir=stores_dir)
+    rfm_df = aggregate_rfm(clean_transactions(reference_transactions.copy()))
+    stores = np.array(["north", "south", None], dtype=object)[np.arange(len(rfm_df)) % 3]
+
+    result = registry.assign_clusters(rfm_df.assign(Store=stores))
+
+    for store in ("north", "south", DEFAULT_STORE):
+        rows = (stores == store) if store != DEFAULT_STORE else pd.isna(stores)
+        expected = registry.get(store).scorer.predict(rfm_df[rows])
+        np.testing.assert_array_equal(result['Cluster'].to_numpy()[rows], expected)
+    north = registry.get("north").scorer.predict(rfm_df)
+    south = registry.get("south").scorer.predict(rfm_df)
+    assert (north != south).any()
@@ -0,0 +1,88 @@
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+from lib.core import BINS_PATH, CLUSTER_MAP, MODEL_PATH, SCALER_PATH, SegmentationCore
+
+
+# ------------------------------
+# Baseline implementation (lib/mylib.py before the vectorized RFM), kept verbatim
+# ------------------------------
+def baseline_clean_data(df):
+    df['CustomerID'] = pd.to_numeric(df['CustomerID'], errors='coerce').fillna(0).astype(int)
+    df['TotalSales'] = pd.to_numeric(df['TotalSales'], errors='coerce').fillna(0).astype(float)
+    df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'], errors='coerce')
+    df = df.dropna(subset=['CustomerID', 'InvoiceDate', 'TotalSales'])
+    df = df[df['TotalSales'] > 0]
+    df = df.drop_duplicates()
+    return df
+
+
+def baseline_calculate_rfm(df):
+    max_date = df['InvoiceDate'].max().date()
+    rfm_df = df.groupby('CustomerID').agg(
+        Recency=('InvoiceDate', lambda x: (max_date - x.max().date()).days),
+        Frequency=('CustomerID', 'count'),
+        Monetary=('TotalSales', 'sum')
+    ).reset_index()
+    rfm_df['Monetary'] = rfm_df['Monetary'].fillna(0)
+    return rfm_df
+
+
+def baseline_segment_customers(df, model, scaler, bins):
+    rfm_df = baseline_calculate_rfm(baseline_clean_data(df))
+    r_bins, f_bins, m_bins = bins["r_bins"], bins["f_bins"], bins["m_bins"]
+    df_copy = rfm_df.copy()
+    df_copy['Recency'] = df_copy['Recency'].clip(lower=r_bins[0], upper=r_bins[-1])
+    df_copy['Frequency'] = df_copy['Frequency'].clip(lower=f_bins[0], upper=f_bins[-1])
+    df_copy['Monetary'] = df_copy['Monetary'].clip(lower=m_bins[0], upper=m_bins[-1])
+    df_copy['R'] = pd.cut(df_copy['Recency'], bins=r_bins, labels=[4, 3, 2, 1], include_lowest=True).astype(int)
+    df_copy['F'] = pd.cut(df_copy['Frequency'], bins=f_bins, labels=[1, 2, 3, 4], include_lowest=True).astype(int)
+    df_copy['M'] = pd.cut(df_copy['Monetary'], bins=m_bins, labels=[1, 2, 3, 4], include_lowest=True).astype(int)
+    rfm_df['Cluster'] = model.predict(scaler.transform(df_copy[['R', 'F', 'M']]))
+    rfm_df['Segment'] = rfm_df['Cluster'].map(CLUSTER_MAP)
+    return rfm_df
+
+
+@pytest.fixture(scope="module")
+def artifacts():
+    return joblib.load(MODEL_PATH), joblib.load(SCALER_PATH), joblib.load(BINS_PATH)
+
+
+def test_calculate_rfm_matches_baseline(reference_transactions):
+    expected = baseline_calculate_rfm(baseline_clean_data(reference_transactions.copy()))
+    core = SegmentationCore.from_paths()
+    result = core.calculate_rfm(core.clean_data(reference_transactions.copy()))
+
+    assert len(result) == len(expected)
+    result = result.sort_values('CustomerID', ignore_index=True)
+    expected = expected.sort_values('CustomerID', ignore_index=True)
+    np.testing.assert_array_equal(result['CustomerID'].to_numpy(), expected['CustomerID'].to_numpy())
+    np.testing.assert_array_equal(result['Recency'].to_numpy(), expected['Recency'].to_numpy())
+    np.testing.assert_array_equal(result['Frequency'].to_numpy(), expected['Frequency'].to_numpy())
+    np.testing.assert_allclose(result['Monetary'].to_numpy(), expected['Monetary'].to_numpy(),
+                               rtol=1e-12)
+
+
+def test_segment_customers_matches_baseline(reference_transactions, artifacts):
+    model, scaler, bins = artifacts
+    expected = baseline_segment_customers(reference_transactions.copy(), model, scaler, bins)
+    result = SegmentationCore(model, scaler, bins).segment_customers(reference_transactions.copy())
+
+    result = result.sort_values('CustomerID', ignore_index=True)
+    expected = expected.sort_values('CustomerID', ignore_index=True)
+    np.testing.assert_array_equal(result['Cluster'].to_numpy(), expected['Cluster'].to_numpy())
+    assert (result['Segment'].astype(str) == expected['Segment'].astype(str)).all()
+
+
+def test_streamlit_wrapper_matches_baseline(reference_transactions):
+    from lib.mylib import CustomerSegmentation
+    from lib.registry import ModelRegistry
+
+    expected = baseline_calculate_rfm(baseline_clean_data(reference_transactions.copy()))
+    segmentor = CustomerSegmentation(model_set=ModelRegistry().get())
+    result = segmentor.calculate_rfm(segmentor.clean_data(reference_transactions.copy()))
+    pd.testing.assert_frame_equal(
+        result.sort_values('CustomerID', ignore_index=True)[list(expected.columns)],
+        expected.sort_values('CustomerID', ignore_index=True), check_dtype=False)
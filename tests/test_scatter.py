@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from lib.scatter import density_cells, stratified_sample
+
+
+@pytest.fixture(scope="module")
+def rfm_df():
+    # One dominant cluster and a tiny one
+    rng = np.random.default_rng(0)
+    sizes = {0: 150_000, 1: 40_000, 2: 2_000, 3: 30}
+    clusters = np.repeat(list(sizes), list(sizes.values()))
+    n = len(clusters)
+    return pd.DataFrame({
+        'CustomerID': np.arange(n),
+        'Recency': rng.integers(0, 700, n),
+        'Frequency': rng.integers(1, 40, n),
+        'Monetary': rng.gamma(2.0, 50.0, n),
+        'Cluster': rng.permutation(clusters),
+    })
+
+
+def test_stratified_sample_keeps_every_cluster(rfm_df):
+    n, min_per_group = 10_000, 500
+    rows = stratified_sample(rfm_df, n=n, min_per_group=min_per_group)
+    sizes = rfm_df['Cluster'].value_counts()
+    sampled = rfm_df['Cluster'].iloc[rows].value_counts()
+
+    assert np.all(np.diff(rows) > 0)
+    assert n <= len(rows) <= n + len(sizes) * min_per_group
+    assert set(sampled.index) == set(sizes.index)
+    for cluster, size in sizes.items():
+        share = max(min_per_group, n * size // len(rfm_df))
+        assert sampled[cluster] == min(size, share), cluster
+    np.testing.assert_array_equal(stratified_sample(rfm_df, n=n, min_per_group=min_per_group), rows)
+
+
+def test_stratified_sample_small_frame_is_whole(rfm_df):
+    small = rfm_df.iloc[:1000]
+    np.testing.assert_array_equal(stratified_sample(small, n=1000), np.arange(1000))
+
+
+def test_density_cells_count_every_customer(rfm_df):
+    n_bins = 20
+    cells = density_cells(rfm_df, n_bins=n_bins)
+
+    assert len(cells) <= rfm_df['Cluster'].nunique() * n_bins ** 2
+    assert not cells.duplicated(['Cluster', 'Recency', 'Frequency']).any()
+    counts = cells.groupby('Cluster')['Customers'].sum()
+    pd.testing.assert_series_equal(counts, rfm_df.groupby('Cluster').size(), check_names=False)
+    spend = (cells['Monetary'] * cells['Customers']).groupby(cells['Cluster']).sum()
+    np.testing.assert_allclose(spend, rfm_df.groupby('Cluster')['Monetary'].sum(), rtol=1e-9)
+    assert cells['Recency'].between(rfm_df['Recency'].min(), rfm_df['Recency'].max()).all()
+    assert cells['Frequency'].between(rfm_df['Frequency'].min(), rfm_df['Frequency'].max()).all()
+
+
+def test_density_cells_single_value_and_empty(rfm_df):
+    flat = rfm_df.assign(Recency=5)
+    cells = density_cells(flat, n_bins=10)
+    assert cells['Recency'].nunique() == 1
+    assert cells['Customers'].sum() == len(flat)
+    assert density_cells(rfm_df.iloc[:0]).empty
@@ -0,0 +1,118 @@
+import itertools
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+from lib.artifact import export_artifact, load_artifact
+from lib.core import BINS_PATH, CLUSTER_MAP, MODEL_PATH, SCALER_PATH, SegmentationCore
+from lib.rfm import aggregate_rfm, clean_transactions
+from lib.scoring import LookupScorer
+
+GRID = [(r, f, m) for r, f, m in itertools.product(range(1, 5), repeat=3)]
+
+
+@pytest.fixture(scope="module")
+def artifacts():
+    return joblib.load(MODEL_PATH), joblib.load(SCALER_PATH), joblib.load(BINS_PATH)
+
+
+def baseline_cell(model, scaler, r, f, m):
+    """
+    Cluster and probabilities of one customer with scores (r, f, m), the way the
+    app computed them before the lookup table (manual mode, one row at a time).
+    """
+    X_scaled = scaler.transform(pd.DataFrame([[r, f, m]], columns=['R', 'F', 'M']))
+    cluster = model.predict(X_scaled)[0]
+    distances = np.linalg.norm(model.cluster_centers_ - X_scaled, axis=1)
+    inv_distances = 1 / (distances + 1e-6)
+    return cluster, inv_distances / inv_distances.sum()
+
+
+def baseline_features(rfm_df, bins):
+    r_bins, f_bins, m_bins = bins["r_bins"], bins["f_bins"], bins["m_bins"]
+    df = rfm_df.copy()
+    df['Recency'] = df['Recency'].clip(lower=r_bins[0], upper=r_bins[-1])
+    df['Frequency'] = df['Frequency'].clip(lower=f_bins[0], upper=f_bins[-1])
+    df['Monetary'] = df['Monetary'].clip(lower=m_bins[0], upper=m_bins[-1])
+    return pd.DataFrame({
+        'R': pd.cut(df['Recency'], bins=r_bins, labels=[4, 3, 2, 1], include_lowest=True).astype(int),
+        'F': pd.cut(df['Frequency'], bins=f_bins, labels=[1, 2, 3, 4], include_lowest=True).astype(int),
+        'M': pd.cut(df['Monetary'], bins=m_bins, labels=[1, 2, 3, 4], include_lowest=True).astype(int),
+    })
+
+
+def edge_values(edges):
+    """
+    Every edge, the midpoints between edges and values just outside the range.
+    """
+    edges = np.asarray(edges, dtype=np.float64)
+    return np.unique(np.concatenate([edges, (edges[:-1] + edges[1:]) / 2,
+                                     [edges[0] - 1, edges[-1] + 1]]))
+
+
+def test_tables_match_model_on_all_64_cells(artifacts):
+    model, scaler, bins = artifacts
+    scorer = LookupScorer(model, scaler, bins)
+
+    for cell, (r, f, m) in enumerate(GRID):
+        assert (r - 1) * 16 + (f - 1) * 4 + (m - 1) == cell
+        cluster, proba = baseline_cell(model, scaler, r, f, m)
+        assert scorer.cluster_table[cell] == cluster, (r, f, m)
+        np.testing.assert_array_equal(scorer.proba_table[cell], proba)
+
+
+def test_predict_matches_model_on_raw_rfm(artifacts):
+    model, scaler, bins = artifacts
+    scorer = LookupScorer(model, scaler, bins)
+    rfm_df = pd.DataFrame(list(itertools.product(edge_values(bins["r_bins"]), edge_values(bins["f_bins"]),
+                                                 edge_values(bins["m_bins"]))),
+                          columns=['Recency', 'Frequency', 'Monetary'])
+    X_RFM = baseline_features(rfm_df, bins)
+    # Every cell is reached by the edge / midpoint grid
+    assert len(X_RFM.drop_duplicates()) == 64
+
+    expected = model.predict(scaler.transform(X_RFM))
+    np.testing.assert_array_equal(scorer.predict(rfm_df), expected)
+
+
+def test_compact_artifact_matches_model_on_all_64_cells(artifacts, tmp_path):
+    model, scaler, bins = artifacts
+    path = str(tmp_path / "rfm_model.npz")
+    export_artifact(model, scaler, bins, path, source_version="test")
+    compact_model, compact_scaler, compact_bins, meta = load_artifact(path)
+    assert meta["source_version"] == "test"
+    for name in ("r_bins", "f_bins", "m_bins"):
+        np.testing.assert_array_equal(compact_bins[name], bins[name])
+
+    reference = LookupScorer(model, scaler, bins)
+    compact = LookupScorer(compact_model, compact_scaler, compact_bins)
+    np.testing.assert_array_equal(compact.cluster_table, reference.cluster_table)
+    np.testing.assert_array_equal(compact.proba_table, reference.proba_table)
+    grid = pd.DataFrame(GRID, columns=['R', 'F', 'M'])
+    np.testing.assert_array_equal(compact_model.predict(compact_scaler.transform(grid)),
+                                  model.predict(scaler.transform(grid)))
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_cluster_probabilities_match_manual_formula(artifacts, reference_transactions, compact):
+    model, scaler, bins = artifacts
+    core = SegmentationCore(model, scaler, bins, compact=compact)
+    rfm_df = aggregate_rfm(clean_transactions(reference_transactions))
+
+    # Manual mode, per customer: inverse distance of the scaled (R, F, M) to every center
+    X_scaled = scaler.transform(baseline_features(rfm_df, bins))
+    distances = np.linalg.norm(model.cluster_centers_[None, :, :] - X_scaled[:, None, :], axis=2)
+    inv_distances = 1 / (distances + 1e-6)
+    expected = inv_distances / inv_distances.sum(axis=1, keepdims=True)
+    top_two = np.sort(expected, axis=1)[:, ::-1][:, :2]
+
+    # A chunk size that does not divide the customer count
+    result = core.cluster_probabilities(rfm_df.copy(), chunk_size=1000)
+    rtol = 1e-6 if compact else 1e-12
+    for k, name in CLUSTER_MAP.items():
+        np.testing.assert_allclose(result[f"P_{name}"], expected[:, k], rtol=rtol)
+    np.testing.assert_allclose(result['Confidence'], top_two[:, 0], rtol=rtol)
+    np.testing.assert_allclose(result['Margin'], top_two[:, 0] - top_two[:, 1], rtol=rtol, atol=rtol)
+    assert result['Confidence'].dtype == (np.float32 if compact else np.float64)
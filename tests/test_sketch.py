@@ -0,0 +1,95 @@
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from lib.sketch import (DEFAULT_K, MIN_CAPACITY, KLLSketch, RFMBinSketch, compare_bins,
+                        normalized_rank_error)
+
+N_CUSTOMERS = 400_000
+
+
+@pytest.fixture(scope="module")
+def rfm_df():
+    # Heavy ties (integer Recency / Frequency) and a long-tailed Monetary
+    rng = np.random.default_rng(7)
+    return pd.DataFrame({
+        'Recency': rng.integers(0, 730, N_CUSTOMERS),
+        'Frequency': rng.geometric(0.3, N_CUSTOMERS),
+        'Monetary': rng.lognormal(4, 1.2, N_CUSTOMERS),
+    })
+
+
+def _chunks(df, n):
+    return [df.iloc[i::n] for i in range(n)]
+
+
+def test_single_sketch_edges_within_the_rank_error(rfm_df):
+    sketch = RFMBinSketch(DEFAULT_K, seed=0)
+    for chunk in _chunks(rfm_df, 40):
+        sketch.update(chunk)
+
+    comparison = compare_bins(sketch.bins(), rfm_df)
+
+    assert len(sketch) == N_CUSTOMERS
+    assert (comparison['rank_error'] <= normalized_rank_error(DEFAULT_K)).all(), comparison
+    # Minimum and maximum edges are exact
+    ends = comparison[comparison['q'].isin([0, 1])]
+    np.testing.assert_array_equal(ends['sketch'], ends['exact'])
+
+
+@pytest.mark.parametrize("k", [DEFAULT_K, 800])
+def test_merged_partition_sketches_within_the_rank_error(rfm_df, k):
+    partitions = _chunks(rfm_df, 16)
+    sketches = [RFMBinSketch(k, seed=p).update(part) for p, part in enumerate(partitions)]
+
+    merged = reduce(RFMBinSketch.merge, sketches)
+    comparison = compare_bins(merged.bins(), rfm_df)
+
+    assert len(merged) == N_CUSTOMERS
+    assert (comparison['rank_error'] <= normalized_rank_error(k)).all(), comparison
+
+
+def test_compaction_bounds_the_retained_items_and_keeps_the_weight():
+    sketch = KLLSketch(k=64, seed=1)
+    rng = np.random.default_rng(1)
+    for _ in range(200):
+        sketch.update(rng.normal(size=1000))
+        assert sketch.n_retained <= sum(sketch._capacity(h) for h in range(len(sketch.levels)))
+
+    _, cum_weight = sketch._weighted_items()
+    assert cum_weight[-1] == sketch.n == 200_000
+    # About 3k items however much was added (small levels are floored at MIN_CAPACITY)
+    assert sketch.n_retained <= 3 * sketch.k + MIN_CAPACITY * len(sketch.levels)
+    assert len(sketch.levels) > 10
+
+
+def test_merge_is_deterministic(rfm_df):
+    def build():
+        sketches = [RFMBinSketch(seed=p).update(part) for p, part in enumerate(_chunks(rfm_df, 8))]
+        return reduce(RFMBinSketch.merge, sketches)
+
+    first, second = build(), build()
+
+    for name in first.sketches:
+        a, b = first.sketches[name], second.sketches[name]
+        assert len(a.levels) == len(b.levels)
+        for level_a, level_b in zip(a.levels, b.levels):
+            np.testing.assert_array_equal(level_a, level_b)
+    for name, edges in first.bins().items():
+        np.testing.assert_array_equal(edges, second.bins()[name])
+
+
+def test_merge_rejects_a_different_k_and_ignores_empty_sketches():
+    sketch = KLLSketch(k=64, seed=0).update(np.arange(1000.0))
+    before = [level.copy() for level in sketch.levels]
+
+    sketch.merge(KLLSketch(k=64, seed=1))
+
+    assert all(np.array_equal(a, b) for a, b in zip(before, sketch.levels))
+    with pytest.raises(ValueError):
+        sketch.merge(KLLSketch(k=128))
+    with pytest.raises(ValueError):
+        KLLSketch(k=4)
+    assert np.isnan(KLLSketch().quantiles([0.5])).all()
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from lib.core import SegmentationCore
+from lib.rfm import aggregate_rfm, clean_transactions
+from lib.snapshots import NEW_CUSTOMER
+
+
+@pytest.fixture(scope="module")
+def core():
+    return SegmentationCore.from_paths()
+
+
+@pytest.fixture(scope="module")
+def transactions(reference_transactions):
+    return clean_transactions(reference_transactions)
+
+
+@pytest.fixture(scope="module")
+def snapshots(core, transactions):
+    return core.monthly_snapshots(transactions)
+
+
+def test_grids_are_narrow(snapshots):
+    assert snapshots.recency.dtype == np.int32
+    assert snapshots.frequency.dtype == np.int32
+    assert snapshots.monetary.dtype == np.float32
+    assert snapshots.clusters.dtype == np.int8
+
+
+def test_every_month_matches_a_full_rfm_run(core, snapshots, transactions):
+    df = transactions
+    assert len(snapshots.months) > 1
+    for month in snapshots.months:
+        expected = aggregate_rfm(df[df['InvoiceDate'] <= month.end_time])
+        expected['Cluster'] = core.assign_clusters(expected)['Cluster'].to_numpy()
+        expected = expected.sort_values('CustomerID', ignore_index=True)
+        actual = snapshots.snapshot(str(month)).sort_values('CustomerID', ignore_index=True)
+
+        cols = ['CustomerID', 'Recency', 'Frequency', 'Cluster']
+        pd.testing.assert_frame_equal(actual[cols], expected[cols], check_dtype=False)
+        np.testing.assert_allclose(actual['Monetary'], expected['Monetary'], rtol=1e-6)
+        assert (snapshots.clusters[:, snapshots.months.get_loc(month)] != NEW_CUSTOMER).sum() == len(expected)
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from lib import cli
+from lib.core import SegmentationCore
+from lib.rfm import aggregate_rfm
+from lib.state_store import RFMStateStore
+
+
+def _batch(day, n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'CustomerID': rng.integers(1, 2000, n),
+        'InvoiceDate': pd.Timestamp('2024-01-01') + pd.to_timedelta(day + rng.integers(0, 30, n), unit='D'),
+        'TotalSales': rng.integers(1, 200, n) / 4,
+    })
+
+
+@pytest.fixture(scope="module")
+def core():
+    return SegmentationCore.from_paths()
+
+
+@pytest.fixture
+def batches():
+    return [_batch(30 * i, seed=i) for i in range(5)]
+
+
+def _fresh_scores(batches, core):
+    rfm_df = aggregate_rfm(pd.concat(batches, ignore_index=True))
+    return core.assign_clusters(rfm_df)
+
+
+def test_incremental_merges_match_one_aggregation(batches, tmp_path):
+    store = RFMStateStore(str(tmp_path / "state.npz"))
+    for batch in batches:
+        store.merge(batch)
+    expected = aggregate_rfm(pd.concat(batches, ignore_index=True))
+
+    result = store.rfm()
+    np.testing.assert_array_equal(result['CustomerID'], expected['CustomerID'])
+    np.testing.assert_array_equal(result['Recency'], expected['Recency'])
+    np.testing.assert_array_equal(result['Frequency'], expected['Frequency'])
+    np.testing.assert_allclose(result['Monetary'], expected['Monetary'])
+
+
+def test_rescore_matches_scoring_everyone(batches, core, tmp_path):
+    store = RFMStateStore(str(tmp_path / "state.npz"))
+    for i, batch in enumerate(batches):
+        store.merge(batch)
+        store.rescore(core)
+        store.save()
+        store = RFMStateStore.load(store.path)
+        expected = _fresh_scores(batches[:i + 1], core)
+        np.testing.assert_array_equal(store.rfm()['Cluster'], expected['Cluster'])
+
+
+def test_model_change_rescores_every_customer(batches, core, tmp_path):
+    store = RFMStateStore(str(tmp_path / "state.npz"))
+    store.merge(batches[0])
+    assert store.rescore(core) == len(store)
+    assert store.rescore(core) == 0
+
+    # Same artifacts under another version, as after a promote or a registry reload
+    promoted = SegmentationCore(core.model, core.scaler, {'r_bins': core.r_bins, 'f_bins': core.f_bins,
+                                                          'm_bins': core.m_bins}, version="other")
+    assert store.rescore(promoted) == len(store)
+    store.save()
+    assert RFMStateStore.load(store.path).model_version == "other"
+    assert RFMStateStore.load(store.path).rescore(core) == len(store)
+
+
+def test_state_without_model_version_is_fully_rescored(batches, core, tmp_path):
+    store = RFMStateStore(str(tmp_path / "state.npz"))
+    store.merge(batches[0])
+    store.rescore(core)
+    store.model_version = None
+    store.save()
+    loaded = RFMStateStore.load(store.path)
+    assert loaded.model_version is None
+    assert loaded.rescore(core) == len(loaded)
+
+
+def test_cli_append_without_valid_rows(tmp_path, capsys):
+    source = tmp_path / "today.csv"
+    pd.DataFrame({'CustomerID': [1, 2], 'InvoiceDate': ['not a date', '2024-01-05'],
+                  'TotalSales': [10.0, -3.0]}).to_csv(source, index=False)
+    state = tmp_path / "state.npz"
+
+    cli.main(["append", str(source), "--state", str(state)])
+
+    assert "0 customers updated, 0 re-scored, 0 in" in capsys.readouterr().out
+    store = RFMStateStore.load(str(state))
+    assert len(store) == 0 and store.reference_date is None
@@ -0,0 +1,121 @@
+import glob
+import os
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from lib.core import SegmentationCore
+from lib.rfm import RFMAccumulator, aggregate_rfm, clean_transactions, compact_rfm, stream_rfm
+
+
+def _transactions(n=6000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'CustomerID': rng.integers(1, 400, n),
+        'InvoiceDate': (pd.Timestamp('2024-01-01')
+                        + pd.to_timedelta(rng.integers(0, 300, n), unit='D')).strftime('%Y-%m-%d'),
+        'TotalSales': rng.integers(1, 50, n) / 2,
+    })
+    # Duplicates spread over the whole file, so most copies fall in other chunks
+    dupes = df.sample(1500, random_state=seed)
+    return pd.concat([df, dupes], ignore_index=True).sample(frac=1, random_state=seed + 1)
+
+
+def _sorted(rfm_df):
+    return rfm_df.sort_values('CustomerID', ignore_index=True)
+
+
+@pytest.mark.parametrize("chunksize", [97, 1000, 100_000])
+def test_stream_matches_in_memory_drop_duplicates(chunksize):
+    csv = _transactions().to_csv(index=False)
+    expected = aggregate_rfm(clean_transactions(pd.read_csv(StringIO(csv))))
+
+    rfm_df, accumulator = stream_rfm(StringIO(csv), chunksize=chunksize)
+
+    pd.testing.assert_frame_equal(_sorted(rfm_df), _sorted(expected), check_dtype=False)
+    report = accumulator.report()
+    assert report['rows_out'] == int(expected['Frequency'].sum())
+    assert report['duplicates'] == report['rows_in'] - report['rows_out']
+
+
+def test_stream_without_drop_duplicates_counts_every_row():
+    csv = _transactions().to_csv(index=False)
+    expected = aggregate_rfm(clean_transactions(pd.read_csv(StringIO(csv)), drop_duplicates=False))
+
+    rfm_df, _ = stream_rfm(StringIO(csv), chunksize=500, drop_duplicates=False)
+
+    pd.testing.assert_frame_equal(_sorted(rfm_df), _sorted(expected), check_dtype=False)
+
+
+def test_spill_files_are_removed(tmp_path):
+    csv = _transactions().to_csv(index=False)
+    accumulator = RFMAccumulator(spill_dir=str(tmp_path))
+    for chunk in pd.read_csv(StringIO(csv), chunksize=1000, dtype={'InvoiceDate': str}):
+        accumulator.update(chunk)
+    assert glob.glob(os.path.join(tmp_path, "*", "*.pkl"))
+    accumulator.finish()
+    assert os.listdir(tmp_path) == []
+    with pytest.raises(RuntimeError):
+        accumulator.update(chunk)
+
+
+def test_spill_files_are_removed_when_the_read_stops(tmp_path, monkeypatch):
+    monkeypatch.setattr("tempfile.tempdir", str(tmp_path))
+    csv = _transactions().to_csv(index=False)
+
+    def stop(accumulator):
+        if accumulator.rows_in > 2000:
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        stream_rfm(StringIO(csv), chunksize=1000, on_chunk=stop)
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("drop_duplicates", [True, False])
+def test_stream_compact_matches_in_memory_compact(drop_duplicates):
+    csv = _transactions().to_csv(index=False)
+    cleaned = clean_transactions(pd.read_csv(StringIO(csv)), drop_duplicates=drop_duplicates,
+                                 compact=True)
+    expected = compact_rfm(aggregate_rfm(cleaned))
+
+    core = SegmentationCore.from_paths(compact=True)
+    rfm_df = core.calculate_rfm_streaming(StringIO(csv), chunksize=700) if drop_duplicates else \
+        compact_rfm(stream_rfm(StringIO(csv), chunksize=700, drop_duplicates=False, compact=True)[0])
+
+    assert cleaned['TotalSales'].dtype == np.float32
+    pd.testing.assert_frame_equal(_sorted(rfm_df), _sorted(expected))
+    assert rfm_df['CustomerID'].dtype == np.int32
+    assert rfm_df['Recency'].dtype == rfm_df['Frequency'].dtype == np.int32
+
+
+def test_finish_splits_partitions_over_the_row_budget(tmp_path):
+    df = _transactions(n=60_000, seed=3)
+    expected = aggregate_rfm(clean_transactions(df.copy()))
+    accumulator = RFMAccumulator(n_partitions=4, partition_rows=2000, spill_dir=str(tmp_path))
+    for start in range(0, len(df), 500):
+        accumulator.update(df.iloc[start:start + 500].astype({'InvoiceDate': str}).copy())
+
+    rfm_df = accumulator.rfm()
+
+    # 4 partitions would hold ~15k rows each; split twice they stay under the budget
+    assert 0 < accumulator.max_partition_rows <= 2000
+    pd.testing.assert_frame_equal(_sorted(rfm_df), _sorted(expected), check_dtype=False)
+    assert accumulator.report()['rows_out'] == int(expected['Frequency'].sum())
+    assert os.listdir(tmp_path) == []
+
+
+def test_finish_loads_an_unsplittable_customer_whole():
+    df = _transactions(n=3000, seed=4)
+    df['CustomerID'] = 7
+    expected = aggregate_rfm(clean_transactions(df.copy()))
+    accumulator = RFMAccumulator(n_partitions=4, partition_rows=100)
+    for start in range(0, len(df), 250):
+        accumulator.update(df.iloc[start:start + 250].astype({'InvoiceDate': str}).copy())
+
+    rfm_df = accumulator.rfm()
+
+    pd.testing.assert_frame_equal(_sorted(rfm_df), _sorted(expected), check_dtype=False)
+    assert accumulator.max_partition_rows == len(df)
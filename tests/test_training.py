@@ -0,0 +1,116 @@
+import copy
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from lib import training
+from lib.cli import training_rfm
+from lib.core import artifact_version
+from lib.reference_data import REFERENCE_CSV_PATH
+from lib.registry import ACTIVE_MANIFEST, ModelRegistry
+
+
+@pytest.fixture(scope="module")
+def rfm_df():
+    return training_rfm()
+
+
+def _train(rfm_df, **kwargs):
+    return training.train(rfm_df, [2, 3, 4], workers=1, sample_size=500, n_init=3, **kwargs)
+
+
+def test_training_rfm_counts_every_distinct_reference_row():
+    ref = pd.read_csv(REFERENCE_CSV_PATH)
+    ref = ref[~ref.duplicated()]
+
+    rfm_df = training_rfm()
+
+    assert len(rfm_df) == ref['Member_number'].nunique()
+    expected = ref.groupby('Member_number').agg(Frequency=('Date', 'size'),
+                                                Monetary=('Total_Revenue', 'sum'))
+    pd.testing.assert_frame_equal(rfm_df.set_index('CustomerID')[['Frequency', 'Monetary']],
+                                  expected.rename_axis('CustomerID'), check_dtype=False)
+
+
+def test_quartile_bins_match_pandas_quantiles(rfm_df):
+    bins = training.quartile_bins(rfm_df)
+
+    for name, column in (("r_bins", 'Recency'), ("f_bins", 'Frequency'), ("m_bins", 'Monetary')):
+        np.testing.assert_allclose(bins[name], rfm_df[column].quantile(training.QUARTILES).to_numpy())
+        assert np.all(np.diff(bins[name]) >= 0)
+
+
+def test_elbow_k_picks_the_knee():
+    inertia = {2: 100.0, 3: 40.0, 4: 30.0, 5: 25.0, 6: 22.0}
+    metrics = [{"k": k, "inertia": v, "silhouette": 0.5} for k, v in inertia.items()]
+
+    assert training.elbow_k(metrics) == 3
+    assert training.elbow_k(metrics[:2]) == 2
+    assert training.select_k(metrics, "silhouette") == 2
+
+
+def test_align_clusters_undoes_a_permutation(rfm_df):
+    result = _train(rfm_df, k=4)
+    permuted = copy.deepcopy(result.model)
+    order = np.array([2, 0, 3, 1])
+    permuted.cluster_centers_ = permuted.cluster_centers_[order]
+    permuted.labels_ = np.argsort(order)[permuted.labels_]
+
+    new_order = training.align_clusters(permuted, result.scaler, result.model, result.scaler)
+
+    np.testing.assert_array_equal(permuted.cluster_centers_, result.model.cluster_centers_)
+    np.testing.assert_array_equal(permuted.labels_, result.model.labels_)
+    assert sorted(new_order) == [0, 1, 2, 3]
+    assert training.align_clusters(permuted, result.scaler, None, None) is None
+
+
+def test_training_is_reproducible(rfm_df, tmp_path):
+    first = _train(rfm_df)
+    second = _train(rfm_df)
+
+    v1, dir1 = training.write_versioned_artifacts(first, str(tmp_path / "a"))
+    v2, dir2 = training.write_versioned_artifacts(second, str(tmp_path / "b"))
+
+    assert v1 == v2
+    assert first.k == second.k and first.metrics == second.metrics
+    for name in ("model", "scaler", "bins", "artifact"):
+        assert open(os.path.join(dir1, training.ARTIFACT_FILES[name]), "rb").read() == \
+            open(os.path.join(dir2, training.ARTIFACT_FILES[name]), "rb").read()
+    with open(os.path.join(dir1, training.ARTIFACT_FILES["report"]), encoding="utf-8") as f:
+        assert json.load(f)["version"] == v1
+    assert sorted(os.listdir(tmp_path / "a")) == [v1]
+
+
+def test_promote_never_exposes_a_mixed_set(rfm_df, tmp_path, monkeypatch):
+    models_dir = tmp_path / "models"
+    os.makedirs(models_dir)
+    for name in ("model", "scaler", "bins"):
+        shutil.copy(os.path.join("models", training.ARTIFACT_FILES[name]), models_dir)
+    old_version = artifact_version([str(models_dir / training.ARTIFACT_FILES[n])
+                                    for n in ("model", "scaler", "bins")])
+    new_version, version_dir = training.write_versioned_artifacts(
+        _train(rfm_df, k=3), str(models_dir / "versions"))
+    registry = ModelRegistry(models_dir=str(models_dir), stores_dir=str(tmp_path / "stores"))
+    assert registry.get().version == old_version
+    seen = []
+    replace = os.replace
+
+    def replace_and_load(src, dst):
+        replace(src, dst)
+        model_set = registry.get()
+        seen.append(model_set.version)
+        # The loaded model, scaler and bins always belong to one set
+        assert len(model_set.model.cluster_centers_) == (3 if model_set.version == new_version else 4)
+        assert model_set.scaler.mean_.shape == (3,)
+
+    monkeypatch.setattr(training.os, "replace", replace_and_load)
+    assert training.promote(version_dir, str(models_dir)) == new_version
+
+    assert set(seen) == {new_version}
+    assert registry.get().version == new_version
+    assert json.loads((models_dir / ACTIVE_MANIFEST).read_text())["version"] == new_version
+    assert not [f for f in os.listdir(models_dir) if f.endswith(".tmp")]